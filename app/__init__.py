@@ -3,68 +3,223 @@ import os
 import sys
 import atexit
 from flask import Flask
-from flask_session import Session
+
+def configure(config):
+    """Fill `config` (app.config, or a dict in the daemon) from the environment."""
+    # Process layout: 'local' runs the hardware in the web process; 'client'
+    # attaches to the acquisition daemon (python -m app.daemon), which owns the
+    # hardware and the database, publishes its state in the DAEMON_SHM_NAME
+    # shared memory and takes commands on the DAEMON_SOCKET Unix socket
+    config['IO_MODE'] = os.environ.get('IO_MODE', 'local')
+    config['DAEMON_SOCKET'] = os.environ.get('DAEMON_SOCKET')
+    config['DAEMON_SHM_NAME'] = os.environ.get('DAEMON_SHM_NAME', 'iati_gn_state')
+
+    # Session
+    config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key_change_in_production')
+    # 'memory' (in-process LRU), 'cookie' (signed, stateless) or 'filesystem'.
+    # Client-mode workers share sessions on disk: a memory session only
+    # exists in the worker that created it.
+    config['SESSION_BACKEND'] = os.environ.get(
+        'SESSION_BACKEND', 'filesystem' if config['IO_MODE'] == 'client' else 'memory')
+    config['SESSION_MAX_SESSIONS'] = int(os.environ.get('SESSION_MAX_SESSIONS', 256))
+    config['SESSION_TTL'] = int(os.environ.get('SESSION_TTL', 12 * 3600))
+    config['SESSION_PERMANENT'] = False
+    config['SESSION_USE_SIGNER'] = True
+    # Filesystem store; also read once by the memory backend to migrate old sessions
+    config['SESSION_FILE_DIR'] = os.path.join(os.getcwd(), 'flask_session')
+
+    # Chips, sensor channels and output pins come from the file named by the
+    # IO_CONFIG environment variable (default app/io_config.json), read once
+    # when app.channels is first imported.
+    # I/O backend: 'auto' (hardware on a Pi, else simulation), 'hardware',
+    # 'simulation' or 'replay' of a recorded experiment at REPLAY_SPEED x
+    config['IO_BACKEND'] = os.environ.get('IO_BACKEND', 'auto')
+    config['REPLAY_EXPERIMENT_ID'] = os.environ.get('REPLAY_EXPERIMENT_ID')
+    config['REPLAY_SPEED'] = float(os.environ.get('REPLAY_SPEED', 1.0))
+    config['REPLAY_LOOP'] = os.environ.get('REPLAY_LOOP', '1').lower() in ('1', 'true', 'yes')
+    # Background ADC acquisition rate (scans of both MCP3008 chips per second)
+    config['ACQUISITION_RATE_HZ'] = float(os.environ.get('ACQUISITION_RATE_HZ', 10))
+    # MCP3008 scan strategy: 'per_channel' or 'batched', plus oversampling of noisy channels
+    config['ADC_SCAN_MODE'] = os.environ.get('ADC_SCAN_MODE', 'per_channel')
+    config['ADC_OVERSAMPLE'] = int(os.environ.get('ADC_OVERSAMPLE', 1))
+    config['ADC_DECIMATION'] = os.environ.get('ADC_DECIMATION', 'mean')
+    # Minutes of full-rate ADC history kept in memory for /api/adc-history
+    config['HISTORY_MINUTES'] = float(os.environ.get('HISTORY_MINUTES', 10))
+    # Write-behind sensor logger: batch size (scans) and max batch age (s)
+    config['WRITER_FLUSH_SCANS'] = int(os.environ.get('WRITER_FLUSH_SCANS', 50))
+    config['WRITER_FLUSH_INTERVAL'] = float(os.environ.get('WRITER_FLUSH_INTERVAL', 1.0))
+    # Logged scans go through a spool of memory-mapped files (default: next to the
+    # database) and survive a crash; scans are dropped once it holds this many
+    # full segments of 4096 scans
+    config['SPOOL_DIR'] = os.environ.get('SPOOL_DIR')
+    config['SPOOL_MAX_SEGMENTS'] = int(os.environ.get('SPOOL_MAX_SEGMENTS', 64))
+    # Experiment recording: default and maximum logging rate (samples per second)
+    config['RECORDING_RATE_HZ'] = float(os.environ.get('RECORDING_RATE_HZ', 10))
+    config['RECORDING_MAX_RATE_HZ'] = float(os.environ.get('RECORDING_MAX_RATE_HZ', 100))
+    # Bearer token that lets a Prometheus scraper read /api/metrics without a session
+    config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # 'deferred' opens the database and the hardware in a thread after
+    # create_app returns; 'inline' finishes both before it returns
+    config['STARTUP_WARMUP'] = os.environ.get('STARTUP_WARMUP', 'deferred')
+    return config
+
+def init_io(config):
+    """Open the I/O backend and start feeding the history; returns the scan rate.
+
+    The caller subscribes its consumers and then starts acquisition at that rate.
+    """
+    from . import acquisition, backends, history, metrics, pi_io
+    pi_io.configure_adc(
+        mode=config['ADC_SCAN_MODE'],
+        oversample=config['ADC_OVERSAMPLE'],
+        decimation=config['ADC_DECIMATION'],
+    )
+    io_backend = backends.create(
+        config['IO_BACKEND'],
+        replay_experiment_id=config['REPLAY_EXPERIMENT_ID'],
+        replay_speed=config['REPLAY_SPEED'],
+        replay_loop=config['REPLAY_LOOP'],
+    )
+    pi_io.init_hardware(io_backend)
+    print("Raspberry Pi I/O initialized")
+
+    # A replay runs at its recorded rate times REPLAY_SPEED
+    rate_hz = io_backend.scan_rate_hz or config['ACQUISITION_RATE_HZ']
+
+    # Single producer of ADC snapshots for the API, logger and other consumers
+    history.init(rate_hz, config['HISTORY_MINUTES'])
+    acquisition.engine.subscribe(history.record)
+    acquisition.engine.subscribe(metrics.observe_snapshot)
+    return rate_hz
 
 def create_app():
+    from . import startup
+    startup.begin()
     app = Flask(__name__)
     
     print("=== Experiment Control System Startup ===")
     print(f"Python version: {sys.version}")
     print(f"Working directory: {os.getcwd()}")
     
-    # Configure session
-    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev_key_change_in_production')
-    app.config['SESSION_TYPE'] = 'filesystem'
-    app.config['SESSION_PERMANENT'] = False
-    app.config['SESSION_USE_SIGNER'] = True
-    app.config['SESSION_FILE_DIR'] = os.path.join(os.getcwd(), 'flask_session')
-    
-    print(f"Session directory: {app.config['SESSION_FILE_DIR']}")
-    
-    # Create session directory if it doesn't exist
-    os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
+    with startup.phase('config'):
+        configure(app.config)
     
     # Initialize session
-    try:
-        Session(app)
-        print("Session initialization successful")
-    except Exception as e:
-        print(f"ERROR initializing session: {e}")
+    with startup.phase('sessions'):
+        from . import sessions
+        try:
+            sessions.init_app(app)
+            print("Session initialization successful")
+        except Exception as e:
+            print(f"ERROR initializing session: {e}")
+    
+    # Request, session and I/O timing for /api/metrics
+    with startup.phase('metrics'):
+        from . import metrics
+        metrics.init_app(app)
     
-    # Initialize database
-    print("Initializing database...")
+    # The database is opened and checked on first use (see db.ensure_ready);
+    # in client mode the acquisition daemon owns it and runs every query
     from . import db
+    if app.config['IO_MODE'] == 'client':
+        from . import remote
+        db.use_remote(remote.cursor)
     app.teardown_appcontext(db.close_db)
     
+    # Registered first so it runs last, after the writer has flushed
+    atexit.register(db.close_connection)
+    
+    # Register blueprints
+    with startup.phase('blueprints'):
+        from .routes import main as main_blueprint
+        from .auth import auth as auth_blueprint
+        from .api import api as api_blueprint
+        
+        app.register_blueprint(main_blueprint)
+        app.register_blueprint(auth_blueprint)
+        app.register_blueprint(api_blueprint)
+    
+    # Database check, sensor writer and I/O: in the background unless
+    # STARTUP_WARMUP is 'inline'. /api requests wait for it (see api.py).
+    startup.serving()
+    startup.warm_up(lambda: _warm_up(app), deferred=app.config['STARTUP_WARMUP'] != 'inline')
+    
+    print("Application initialized successfully")
+    print("===================================")
+    
+    return app
+
+def _warm_up(app):
+    from . import db, startup
+    if app.config['IO_MODE'] == 'client':
+        # The daemon owns the database
+        _attach_daemon(app)
+    elif app.config['IO_MODE'] == 'local':
+        with startup.phase('database'):
+            print("Initializing database...")
+            db.ensure_ready()
+        _init_local_io(app)
+    else:
+        print(f"ERROR: invalid IO_MODE {app.config['IO_MODE']!r} (use 'local' or 'client')")
+
+def _init_local_io(app):
+    """Run the sensor writer, hardware and acquisition in this process."""
+    from . import startup
+    # Start the background sensor writer
+    from . import writer
     try:
-        with app.app_context():
-            db.init_db()
+        with startup.phase('sensor writer'):
+            writer.start(
+                spool_dir=app.config['SPOOL_DIR'],
+                flush_scans=app.config['WRITER_FLUSH_SCANS'],
+                flush_interval=app.config['WRITER_FLUSH_INTERVAL'],
+                max_segments=app.config['SPOOL_MAX_SEGMENTS'],
+            )
     except Exception as e:
-        print(f"ERROR during database initialization: {e}")
+        print(f"ERROR starting sensor writer: {e}")
     
     # Initialize Raspberry Pi I/O
     print("Initializing Raspberry Pi I/O...")
     from . import pi_io
     try:
-        pi_io.init_hardware()
-        pi_io.start_simulation()  # Start sensor simulation if in simulation mode
-        print("Raspberry Pi I/O initialized")
+        with startup.phase('I/O backend'):
+            rate_hz = init_io(app.config)
+
+        # Server-Sent Events fan-out of ADC snapshots and output changes
+        from . import acquisition, stream
+        acquisition.engine.subscribe(stream.broadcaster.publish_snapshot)
+        stream.broadcaster.publish_outputs(pi_io.get_gpio_states())
+        pi_io.add_output_listener(stream.broadcaster.publish_outputs)
+        with startup.phase('acquisition'):
+            acquisition.start(rate_hz)
         
         # Register cleanup function to run on application exit
         atexit.register(pi_io.cleanup)
     except Exception as e:
         print(f"ERROR initializing Raspberry Pi I/O: {e}")
-    
-    # Register blueprints
-    from .routes import main as main_blueprint
-    from .auth import auth as auth_blueprint
-    from .api import api as api_blueprint
-    
-    app.register_blueprint(main_blueprint)
-    app.register_blueprint(auth_blueprint)
-    app.register_blueprint(api_blueprint)
-    
-    print("Application initialized successfully")
-    print("===================================")
-    
-    return app
\ No newline at end of file
+
+def _attach_daemon(app):
+    """Use the hardware, sensor writer and database of the acquisition daemon."""
+    from . import db, ipc, metrics, pi_io, remote, startup, stream
+    print("Attaching to the acquisition daemon...")
+    try:
+        with startup.phase('daemon attach'):
+            remote.connect(
+                app.config['DAEMON_SOCKET'] or ipc.default_address(db.DB_PATH),
+                app.config['SECRET_KEY'],
+                app.config['DAEMON_SHM_NAME'],
+            )
+        engine = remote.install()
+        engine.subscribe(stream.broadcaster.publish_snapshot)
+        stream.broadcaster.publish_outputs(pi_io.get_gpio_states())
+        pi_io.add_output_listener(stream.broadcaster.publish_outputs)
+        engine.start()
+
+        # /api/metrics reports both processes
+        metrics.set_process('web')
+        metrics.add_source(lambda: remote.client.call('metrics'))
+        # Runs after cleanup has stopped the poller
+        atexit.register(remote.close)
+        atexit.register(pi_io.cleanup)
+    except Exception as e:
+        print(f"ERROR attaching to the acquisition daemon: {e}")
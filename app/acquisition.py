@@ -0,0 +1,221 @@
+# app/acquisition.py
+import time
+import threading
+from collections import deque, namedtuple
+from datetime import datetime
+from types import MappingProxyType
+
+from . import calibration
+from . import metrics
+from . import pi_io
+from . import schemas
+
+# Immutable result of one full scan of every ADC chip.
+# `values` maps chip name (as in the I/O config, e.g. 'mcp1') to a tuple of raw counts.
+Snapshot = namedtuple('Snapshot', [
+    'seq',            # Monotonically increasing scan number
+    'timestamp',      # Wall-clock time at the start of the scan (datetime)
+    'monotonic',      # time.monotonic() at the start of the scan
+    'values',         # Read-only mapping chip -> tuple of counts
+    'eu',             # Read-only mapping chip -> tuple of engineering values (calibration.py)
+    'scan_duration',  # Seconds spent doing SPI work for this scan
+    'jitter',         # Seconds between the scheduled and the actual scan start
+])
+
+DEFAULT_RATE_HZ = 10.0
+JITTER_WINDOW = 256
+
+
+class AcquisitionEngine:
+    """Background thread that scans the ADCs at a fixed rate and publishes snapshots."""
+
+    def __init__(self, rate_hz=DEFAULT_RATE_HZ, scan=None):
+        self.rate_hz = float(rate_hz)
+        self._scan = scan or pi_io.read_all_adc
+        self._snapshot = None
+        self._seq = 0
+        self._jitter = deque(maxlen=JITTER_WINDOW)
+        self._overruns = 0
+        self._subscribers = []
+        # Serializes scans: the acquisition thread and a lazy first scan from a request
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def period(self):
+        return 1.0 / self.rate_hz
+
+    def subscribe(self, callback):
+        """Call `callback(snapshot)` from the acquisition thread after every scan.
+
+        Callbacks must be cheap and must not block: they run on the sampling clock.
+        """
+        # Copy-on-write so the acquisition thread can iterate without a lock
+        self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        self._subscribers = [cb for cb in self._subscribers if cb is not callback]
+
+    def get_snapshot(self):
+        """Return the latest published snapshot (no SPI work)."""
+        return self._snapshot
+
+    def scan_once(self, deadline=None):
+        """Run one scan, publish the snapshot and return it."""
+        with self._lock:
+            snapshot = self._take(deadline)
+        self._notify(snapshot)
+        return snapshot
+
+    def get_or_scan(self):
+        """Latest snapshot, or one scanned now if none was published yet.
+
+        Threads that get here together share a single scan.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None:
+                return snapshot
+            snapshot = self._take(None)
+        self._notify(snapshot)
+        return snapshot
+
+    def _take(self, deadline):
+        """Scan and publish a snapshot; called with _lock held."""
+        started = time.monotonic()
+        timestamp = datetime.now()
+        values = self._scan()
+        finished = time.monotonic()
+
+        jitter = started - deadline if deadline is not None else 0.0
+        self._seq += 1
+        snapshot = Snapshot(
+            seq=self._seq,
+            timestamp=timestamp,
+            monotonic=started,
+            values=MappingProxyType({chip: tuple(counts) for chip, counts in values.items()}),
+            eu=MappingProxyType(calibration.convert(values)),
+            scan_duration=finished - started,
+            jitter=jitter,
+        )
+        # A single reference assignment is atomic: readers never see a partial scan
+        self._snapshot = snapshot
+        self._jitter.append(jitter)
+        return snapshot
+
+    def _notify(self, snapshot):
+        for callback in self._subscribers:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                print(f"Error in acquisition subscriber {callback!r}: {e}")
+
+    def _run(self):
+        next_deadline = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.scan_once(next_deadline)
+            except Exception as e:
+                print(f"Error during ADC scan: {e}")
+
+            # Schedule against the ideal timeline so sleep errors do not accumulate
+            period = self.period
+            next_deadline += period
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            elif -delay >= period:
+                # We fell behind by at least one full period: skip the missed
+                # slots instead of bursting to catch up.
+                missed = int(-delay // period)
+                self._overruns += missed
+                next_deadline += missed * period
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        # Publish a first snapshot synchronously so consumers never see None
+        self.scan_once()
+        self._thread = threading.Thread(target=self._run, name='adc-acquisition', daemon=True)
+        self._thread.start()
+        print(f"Acquisition thread started at {self.rate_hz:g} Hz")
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_rate(self, rate_hz):
+        rate_hz = float(rate_hz)
+        if rate_hz <= 0:
+            raise ValueError(f"Acquisition rate must be positive, got {rate_hz}")
+        self.rate_hz = rate_hz
+
+    def jitter_stats(self):
+        """Summary of the scan start jitter over the last JITTER_WINDOW scans, in ms."""
+        samples = list(self._jitter)
+        if not samples:
+            return {"mean_ms": 0.0, "max_ms": 0.0, "window": 0, "overruns": self._overruns}
+        return {
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+            "max_ms": round(max(samples) * 1000, 3),
+            "window": len(samples),
+            "overruns": self._overruns,
+        }
+
+
+engine = AcquisitionEngine()
+
+
+def start(rate_hz=None):
+    """Start the shared acquisition engine."""
+    if rate_hz is not None:
+        engine.set_rate(rate_hz)
+    engine.start()
+
+
+def stop():
+    engine.stop()
+
+
+def get_snapshot():
+    """Return the latest snapshot, scanning once if the engine was never started.
+
+    Returns None if nothing was scanned yet and no I/O backend is attached.
+    """
+    snapshot = engine.get_snapshot()
+    if snapshot is None and pi_io.backend is not None:
+        snapshot = engine.get_or_scan()
+    return snapshot
+
+
+def snapshot_to_struct(snapshot):
+    """Convert a snapshot to the schemas.ADCSnapshot served by /api/adc-values."""
+    return schemas.ADCSnapshot(
+        *[snapshot.values[chip.name] for chip in pi_io.CHIPS],
+        eu=dict(snapshot.eu),
+        seq=snapshot.seq,
+        timestamp=snapshot.timestamp,
+        scan_duration_ms=round(snapshot.scan_duration * 1000, 3),
+        jitter_ms=round(snapshot.jitter * 1000, 3),
+        rate_hz=engine.rate_hz,
+        jitter=schemas.JitterStats(**engine.jitter_stats()),
+    )
+
+
+@metrics.register_collector
+def _collect_metrics():
+    return [
+        ('acquisition_rate_hz', 'gauge', 'Configured ADC scan rate.', engine.rate_hz),
+        ('acquisition_overruns_total', 'counter', 'Scans skipped because a scan overran its slot.',
+         engine.jitter_stats()['overruns']),
+    ]
@@ -0,0 +1,152 @@
+# app/analytics.py
+import re
+
+from . import compression
+from . import db
+
+DEFAULT_WIDTH = 1000
+MAX_BUCKETS = 20000
+
+_UNITS = {'us': 1e-6, 'ms': 1e-3, 's': 1.0, 'm': 60.0, 'min': 60.0, 'h': 3600.0}
+
+
+def parse_bucket(text):
+    """Parse a bucket size such as '500ms', '1s', '5m' or '1h' into seconds."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*(us|ms|s|min|m|h)?\s*', text or '')
+    if not match:
+        raise ValueError(f"Invalid bucket size: {text!r}")
+    seconds = float(match.group(1)) * _UNITS[match.group(2) or 's']
+    if seconds <= 0:
+        raise ValueError("Bucket size must be positive")
+    return seconds
+
+
+def resolve_channels(conn, names=None):
+    """Map requested channel names (tags or column names) to (tag, column) pairs."""
+    columns = db.stored_columns(conn)
+    if not names:
+        return columns
+    lookup = {}
+    for tag, column in columns:
+        lookup[tag.upper()] = (tag, column)
+        lookup[column.upper()] = (tag, column)
+    selected = []
+    for name in names:
+        entry = lookup.get(name.strip().upper())
+        if entry is None:
+            raise ValueError(f"Unknown channel: {name}")
+        if entry not in selected:
+            selected.append(entry)
+    return selected
+
+
+def time_span(conn, experiment_id):
+    """(first, last) sample timestamps of an experiment as epoch seconds, or None."""
+    row = conn.execute(
+        f"SELECT epoch(min(timestamp)), epoch(max(timestamp)) "
+        f"FROM {db.SCAN_TABLE} WHERE experiment_id = ?",
+        (experiment_id,)
+    ).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return row[0], row[1]
+
+
+def bucketed_readings(conn, experiment_id, channels, bucket_s=None, width=DEFAULT_WIDTH):
+    """Aggregate an experiment into time buckets inside DuckDB.
+
+    Returns min/max/avg/last per bucket and channel. Keeping min and max of
+    every bucket preserves peaks and dips however far the series is reduced.
+    When `bucket_s` is None it is chosen so the run fits in `width` buckets
+    (one per horizontal pixel of the chart).
+    """
+    span = time_span(conn, experiment_id)
+    result = {'experiment_id': experiment_id, 'bucket_s': bucket_s, 't': [], 'count': [], 'channels': {}}
+    if span is None:
+        return result
+
+    duration = max(span[1] - span[0], 1e-6)
+    if bucket_s is None:
+        bucket_s = duration / max(1, int(width))
+    # Guard against a tiny bucket on a long run producing a huge response
+    bucket_s = max(bucket_s, duration / MAX_BUCKETS)
+    bucket_us = max(1, int(round(bucket_s * 1e6)))
+    result['bucket_s'] = bucket_us / 1e6
+
+    aggregates = ", ".join(
+        f'min("{column}"), max("{column}"), avg("{column}"), arg_max("{column}", timestamp)'
+        for _, column in channels
+    )
+    rows = conn.execute(
+        f"""
+        SELECT epoch_ms(time_bucket(INTERVAL '{bucket_us} microseconds', timestamp, origin)) AS bucket,
+               count(*) AS n{', ' + aggregates if aggregates else ''}
+        FROM {compression.FULL_VIEW}, (SELECT make_timestamp(?) AS origin)
+        WHERE experiment_id = ?
+        GROUP BY bucket
+        ORDER BY bucket
+        """,
+        # Buckets start at the first sample instead of the epoch
+        (int(round(span[0] * 1e6)), experiment_id)
+    ).fetchall()
+
+    result['t'] = [row[0] for row in rows]
+    result['count'] = [row[1] for row in rows]
+    for index, (tag, _) in enumerate(channels):
+        base = 2 + index * 4
+        result['channels'][tag] = {
+            'min': [row[base] for row in rows],
+            'max': [row[base + 1] for row in rows],
+            'avg': [row[base + 2] for row in rows],
+            'last': [row[base + 3] for row in rows],
+        }
+    return result
+
+
+def lttb(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets downsampling of (xs, ys) to `threshold` points."""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(xs), list(ys)
+
+    out_x, out_y = [xs[0]], [ys[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third vertex of the triangle
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, n)
+        count = max(1, end - start)
+        avg_x = sum(xs[start:end]) / count
+        avg_y = sum(ys[start:end]) / count
+
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        best_area, best = -1.0, range_start
+        ax, ay = xs[a], ys[a]
+        for j in range(range_start, range_end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area, best = area, j
+        out_x.append(xs[best])
+        out_y.append(ys[best])
+        a = best
+
+    out_x.append(xs[-1])
+    out_y.append(ys[-1])
+    return out_x, out_y
+
+
+def lttb_readings(conn, experiment_id, channels, width=DEFAULT_WIDTH):
+    """Chart-ready series of `width` points per channel.
+
+    DuckDB first reduces the run to 4 x width buckets (avg per bucket), then
+    LTTB picks the `width` points that best preserve the visual shape.
+    """
+    coarse = bucketed_readings(conn, experiment_id, channels, width=int(width) * 4)
+    result = {'experiment_id': experiment_id, 'bucket_s': coarse['bucket_s'], 'channels': {}}
+    for tag, series in coarse['channels'].items():
+        points = [(t, v) for t, v in zip(coarse['t'], series['avg']) if v is not None]
+        xs, ys = lttb([p[0] for p in points], [p[1] for p in points], int(width))
+        result['channels'][tag] = {'t': xs, 'v': ys}
+    return result
@@ -1,71 +1,340 @@
 # app/api.py
-from flask import Blueprint, jsonify, request, g
+import hmac
+import msgspec
+from flask import Blueprint, jsonify, request, g, current_app, Response, session, stream_with_context
+from . import db
+from . import analytics
+from . import calibration
+from . import export
+from . import rollups
 from . import pi_io
+from . import acquisition
+from . import history
+from . import writer
+from . import recording
+from . import sequencer
+from . import stream
+from . import schemas
+from . import metrics
+from . import startup
 from .auth import login_required
 
 api = Blueprint('api', __name__)
 
+# Last encoded /api/adc-values body per content type: (seq, body)
+_adc_cache = {}
+
+@api.before_request
+def wait_for_warm_up():
+    """Hold /api requests until the database and the I/O backend are up (see startup.py)."""
+    if not startup.wait_ready(startup.READY_TIMEOUT):
+        return jsonify({"success": False, "error": "The server is still starting up"})
+
+def _response_mimetype():
+    """MessagePack if the client prefers it over JSON, JSON otherwise."""
+    best = request.accept_mimetypes.best_match(
+        (schemas.JSON_MIMETYPE,) + schemas.MSGPACK_MIMETYPES, default=schemas.JSON_MIMETYPE
+    )
+    return schemas.MSGPACK_MIMETYPE if best in schemas.MSGPACK_MIMETYPES else best
+
+def _encoded(body, mimetype):
+    return Response(body, mimetype=mimetype)
+
+def _typed_response(obj):
+    """Encode a msgspec Struct with the precomputed encoder for the negotiated type."""
+    mimetype = _response_mimetype()
+    return _encoded(schemas.ENCODERS[mimetype].encode(obj), mimetype)
+
+def _typed_request(cls):
+    """Decode the request body as `cls`; returns (value, None) or (None, error response)."""
+    mimetype = request.mimetype if request.mimetype in schemas.MSGPACK_MIMETYPES else schemas.JSON_MIMETYPE
+    try:
+        return schemas.decode(request.get_data() or b'{}', cls, mimetype), None
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        return None, _typed_response(schemas.Result(success=False, error=str(e)))
+
 @api.route('/api/adc-values')
 @login_required
 def get_adc_values():
-    """API endpoint to get the current ADC values."""
-    values = pi_io.read_all_adc()
-    return jsonify(values)
+    """API endpoint to get the latest ADC snapshot from the acquisition thread."""
+    snapshot = acquisition.get_snapshot()
+    if snapshot is None:
+        return jsonify({"success": False, "error": "No ADC snapshot: the I/O backend is not initialized"})
+    mimetype = _response_mimetype()
+    # Pollers between two scans get the already encoded body
+    cached = _adc_cache.get(mimetype)
+    if cached is None or cached[0] != snapshot.seq:
+        cached = (snapshot.seq, schemas.ENCODERS[mimetype].encode(acquisition.snapshot_to_struct(snapshot)))
+        _adc_cache[mimetype] = cached
+    return _encoded(cached[1], mimetype)
+
+@api.route('/api/channels')
+@login_required
+def get_channels():
+    """API endpoint to get the calibration (type, unit, thresholds, labels) of every channel."""
+    return jsonify(calibration.describe())
+
+@api.route('/api/adc-history')
+@login_required
+def get_adc_history():
+    """API endpoint to get buffered ADC samples newer than the `since` cursor."""
+    try:
+        since = max(0, int(request.args.get('since', 0)))
+        limit = min(int(request.args.get('limit', history.MAX_RESPONSE_SAMPLES)),
+                    history.MAX_RESPONSE_SAMPLES)
+    except ValueError:
+        return jsonify({"success": False, "error": "since and limit must be integers"})
+    if limit < 1:
+        return jsonify({"success": False, "error": "limit must be at least 1"})
+
+    if history.buffer is None:
+        return jsonify({"success": False, "error": "ADC history is not available"})
+
+    return jsonify(history.buffer.since(since, limit))
+
+@api.route('/api/stream')
+@login_required
+def event_stream():
+    """Server-Sent Events stream of ADC deltas (at `rate` Hz) and GPIO/PWM changes."""
+    try:
+        rate_hz = float(request.args.get('rate', stream.DEFAULT_RATE_HZ))
+    except ValueError:
+        rate_hz = stream.DEFAULT_RATE_HZ
+    rate_hz = min(max(rate_hz, 0.1), stream.MAX_RATE_HZ)
+
+    response = Response(
+        stream_with_context(stream.broadcaster.events(rate_hz)),
+        mimetype='text/event-stream',
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering
+    return response
 
 @api.route('/api/gpio-states')
 @login_required
 def get_gpio_states():
     """API endpoint to get the current GPIO states."""
-    states = pi_io.get_gpio_states()
-    return jsonify(states)
+    return _typed_response(pi_io.read_gpio_states())
 
 @api.route('/api/set-gpio', methods=['POST'])
 @login_required
 def set_gpio():
     """API endpoint to set a GPIO pin."""
-    data = request.json
-    
-    if not data or 'gpio' not in data or 'state' not in data:
-        return jsonify({"success": False, "error": "Missing required parameters: gpio, state"})
+    data, error = _typed_request(schemas.SetGPIORequest)
+    if error:
+        return error
     
     try:
-        gpio = int(data['gpio'])
-        state = bool(data['state'])
-        
-        result = pi_io.set_gpio(gpio, state)
-        return jsonify(result)
+        result = pi_io.set_gpio(data.gpio, data.state)
+        return _typed_response(schemas.Result(**result))
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
+        return _typed_response(schemas.Result(success=False, error=str(e)))
 
 @api.route('/api/set-pwm', methods=['POST'])
 @login_required
 def set_pwm():
     """API endpoint to set a PWM duty cycle."""
-    data = request.json
-    
-    if not data or 'gpio' not in data or 'value' not in data:
-        return jsonify({"success": False, "error": "Missing required parameters: gpio, value"})
+    data, error = _typed_request(schemas.SetPWMRequest)
+    if error:
+        return error
     
     try:
-        gpio = int(data['gpio'])
-        value = int(data['value'])
-        
-        result = pi_io.set_pwm(gpio, value)
-        return jsonify(result)
+        result = pi_io.set_pwm(data.gpio, data.value)
+        return _typed_response(schemas.Result(**result))
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
+        return _typed_response(schemas.Result(success=False, error=str(e)))
+
+@api.route('/api/io-batch', methods=['POST'])
+@login_required
+def io_batch():
+    """API endpoint to apply several GPIO/PWM changes at once, with one result per operation."""
+    data, error = _typed_request(schemas.IOBatchRequest)
+    if error:
+        return error
+
+    try:
+        result = pi_io.set_outputs([msgspec.structs.asdict(op) for op in data.operations])
+    except Exception as e:
+        return _typed_response(schemas.IOBatchResult(success=False, error=str(e)))
+    return _typed_response(schemas.IOBatchResult(
+        success=result["success"],
+        results=[schemas.Result(**r) for r in result["results"]],
+        timestamp=result.get("timestamp"),
+        states=pi_io.read_gpio_states(),
+        error=result.get("error"),
+    ))
 
 @api.route('/api/log-sensor-data', methods=['POST'])
 @login_required
 def log_sensor_data():
     """API endpoint to manually trigger sensor data logging."""
-    experiment_id = request.json.get('experiment_id') if request.json else None
+    data, error = _typed_request(schemas.LogSensorDataRequest)
+    if error:
+        return error
     
     try:
-        success = pi_io.log_sensor_data(experiment_id)
-        if success:
-            return jsonify({"success": True})
-        else:
-            return jsonify({"success": False, "error": "Failed to log sensor data"})
+        if pi_io.log_sensor_data(data.experiment_id):
+            return _typed_response(schemas.Result(success=True))
+        return _typed_response(schemas.Result(success=False, error="Failed to log sensor data"))
     except Exception as e:
-        return jsonify({"success": False, "error": str(e)})
\ No newline at end of file
+        return _typed_response(schemas.Result(success=False, error=str(e)))
+
+@api.route('/api/writer-metrics')
+@login_required
+def get_writer_metrics():
+    """API endpoint to get the sensor writer queue and throughput counters."""
+    return jsonify(writer.get_metrics())
+
+@api.route('/api/experiments/<int:experiment_id>/recording/start', methods=['POST'])
+@login_required
+def start_recording(experiment_id):
+    """API endpoint to start logging every sample of an experiment."""
+    data = request.json or {}
+
+    row = db.get_db().execute(
+        "SELECT test_duration FROM experiments WHERE id = ?",
+        (experiment_id,)
+    ).fetchone()
+    if row is None:
+        return jsonify({"success": False, "error": f"Experiment {experiment_id} not found"})
+
+    try:
+        rate_hz = float(data.get('rate_hz', current_app.config['RECORDING_RATE_HZ']))
+        # test_duration is entered in minutes on the experiment setup page
+        duration_s = float(data.get('duration_s', row[0] * 60))
+    except (TypeError, ValueError) as e:
+        return jsonify({"success": False, "error": str(e)})
+
+    return jsonify(recording.start(
+        experiment_id, rate_hz, duration_s, current_app.config['RECORDING_MAX_RATE_HZ']
+    ))
+
+@api.route('/api/experiments')
+@login_required
+def list_experiments():
+    """API endpoint to list experiments with their sample counts and time span."""
+    conn = db.get_db()
+    return jsonify({"success": True, "experiments": rollups.list_experiments(conn)})
+
+@api.route('/api/experiments/<int:experiment_id>/summary')
+@login_required
+def get_experiment_summary(experiment_id):
+    """API endpoint to get per-channel statistics of an experiment (add ?minutes=1 for per-minute)."""
+    conn = db.get_db()
+    if export.get_experiment(conn, experiment_id) is None:
+        return jsonify({"success": False, "error": f"Experiment {experiment_id} not found"})
+    per_minute = request.args.get('minutes', '0').lower() in ('1', 'true', 'yes')
+    summary = rollups.experiment_summary(conn, experiment_id, per_minute)
+    return jsonify(dict(summary, success=True))
+
+@api.route('/api/experiments/<int:experiment_id>/readings')
+@login_required
+def get_experiment_readings(experiment_id):
+    """API endpoint to get time-bucketed (or LTTB-decimated) readings of an experiment.
+
+    Query parameters: bucket (e.g. 500ms, 1s, 1m), channels (comma-separated
+    tags), width (target number of points when bucket is omitted) and
+    decimate ('minmax', the default, or 'lttb').
+    """
+    conn = db.get_db()
+    try:
+        names = [name for name in request.args.get('channels', '').split(',') if name.strip()]
+        channels = analytics.resolve_channels(conn, names)
+        width = int(request.args.get('width', analytics.DEFAULT_WIDTH))
+        bucket = request.args.get('bucket')
+        bucket_s = analytics.parse_bucket(bucket) if bucket else None
+        decimate = request.args.get('decimate', 'minmax')
+
+        if decimate == 'lttb':
+            result = analytics.lttb_readings(conn, experiment_id, channels, width)
+        elif decimate == 'minmax':
+            result = analytics.bucketed_readings(conn, experiment_id, channels, bucket_s, width)
+        else:
+            raise ValueError(f"Invalid decimation: {decimate}")
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)})
+
+    return jsonify(result)
+
+@api.route('/api/experiments/<int:experiment_id>/export')
+@login_required
+def export_experiment(experiment_id):
+    """API endpoint to download an experiment's data as Parquet or CSV."""
+    fmt = request.args.get('format', 'parquet').lower()
+    try:
+        f, size, mimetype, filename = export.export_experiment(experiment_id, fmt)
+    except (ValueError, LookupError) as e:
+        return jsonify({"success": False, "error": str(e)})
+
+    response = Response(export.stream_file(f), mimetype=mimetype)
+    # Also when the body is never iterated (HEAD, early disconnect)
+    response.call_on_close(f.close)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Content-Length'] = str(size)
+    return response
+
+@api.route('/api/recording/stop', methods=['POST'])
+@login_required
+def stop_recording():
+    """API endpoint to stop the current recording before its duration elapses."""
+    return jsonify(recording.stop())
+
+@api.route('/api/recording/status')
+@login_required
+def get_recording_status():
+    """API endpoint to get the live rate, rows written and drops of the recording."""
+    return jsonify(recording.status())
+
+@api.route('/api/sequences', methods=['POST'])
+@login_required
+def start_sequence():
+    """API endpoint to run a list of steps (set outputs, wait, wait for a sensor condition) on the server."""
+    data, error = _typed_request(schemas.SequenceRequest)
+    if error:
+        return error
+    return jsonify(sequencer.start(msgspec.to_builtins(data.steps), data.name))
+
+@api.route('/api/sequences')
+@login_required
+def list_sequences():
+    """API endpoint to list running and recently finished sequences."""
+    return jsonify(sequencer.list_sequences())
+
+@api.route('/api/sequences/<int:sequence_id>')
+@login_required
+def get_sequence(sequence_id):
+    """API endpoint to get the state of a sequence and the planned and actual time of each step run."""
+    return jsonify(sequencer.status(sequence_id))
+
+@api.route('/api/sequences/<int:sequence_id>/cancel', methods=['POST'])
+@login_required
+def cancel_sequence(sequence_id):
+    """API endpoint to stop a sequence before its remaining steps run."""
+    return jsonify(sequencer.cancel(sequence_id))
+
+@api.route('/api/io-backend')
+@login_required
+def get_io_backend():
+    """API endpoint to get the active I/O backend and, for a replay, its position."""
+    return jsonify(pi_io.backend.status())
+
+@api.route('/api/metrics')
+def get_metrics():
+    """Prometheus text-format metrics; needs a session or the METRICS_TOKEN bearer token."""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if 'user_id' not in session and not (token and hmac.compare_digest(authorization, f"Bearer {token}")):
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/startup-profile')
+@login_required
+def get_startup_profile():
+    """API endpoint to get the time spent in each startup phase."""
+    return jsonify(startup.report())
+
+@api.route('/api/db-health')
+@login_required
+def get_db_health():
+    """API endpoint to check the shared database connection and cursor counters."""
+    return jsonify(db.health_check())
\ No newline at end of file
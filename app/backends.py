@@ -0,0 +1,375 @@
+# app/backends.py
+import time
+import random
+import threading
+from array import array
+
+from .channels import SPI_SPEED_HZ
+
+BACKENDS = ('auto', 'hardware', 'simulation', 'replay')
+
+
+def is_raspberry_pi():
+    try:
+        with open('/proc/device-tree/model', 'r') as m:
+            if 'raspberry pi' in m.read().lower():
+                return True
+    except OSError:
+        pass
+    return False
+
+
+class Backend:
+    """What pi_io needs from the hardware: the MCP3008 chips and the output pins.
+
+    Output methods take the logical (UI) state; any inversion needed by the
+    wiring is the backend's business.
+    """
+    name = None
+    # Scan rate at which the backend's data plays at its intended speed (None: any)
+    scan_rate_hz = None
+
+    def open(self, layout):
+        """Claim the output pins and the SPI devices of a channels.Layout."""
+
+    def spi_device(self, chip):
+        """SpiDev-like object (with xfer2) for the named MCP3008 chip."""
+        raise NotImplementedError
+
+    def before_scan(self):
+        """Called under spi_lock before every ADC scan, fast-plan scans included."""
+
+    def write_output(self, pin, state):
+        """Drive an on/off output to the logical `state`."""
+
+    def write_outputs(self, states):
+        """Drive several on/off outputs ({pin: logical state}); backends that
+        can set them in one call override this."""
+        for pin, state in states.items():
+            self.write_output(pin, state)
+
+    def write_batch(self, states, duties):
+        """Apply on/off `states` and PWM `duties` ({pin: duty}) together.
+
+        Returns {('gpio' or 'pwm', pin): error message} for the writes that failed.
+        """
+        errors = {}
+        if states:
+            try:
+                self.write_outputs(states)
+            except Exception as e:
+                errors.update((('gpio', pin), str(e)) for pin in states)
+        for pin, duty_cycle in duties.items():
+            try:
+                self.write_pwm(pin, duty_cycle)
+            except Exception as e:
+                errors[('pwm', pin)] = str(e)
+        return errors
+
+    def read_output(self, pin):
+        """Logical state read back from an output, or None if it cannot be read."""
+        return None
+
+    def write_pwm(self, pin, duty_cycle):
+        """Set a PWM output to the logical duty cycle (0-100)."""
+
+    def close(self):
+        """Release the pins and devices."""
+
+    def status(self):
+        return {"backend": self.name}
+
+
+class HardwareBackend(Backend):
+    """RPi.GPIO outputs (active low) and MCP3008 chips on spidev devices."""
+    name = 'hardware'
+
+    def __init__(self):
+        # Only importable on a Pi
+        import RPi.GPIO
+        import spidev
+        self.GPIO = RPi.GPIO
+        self._spidev = spidev
+        self._spi = {}
+        self._pwm = {}
+
+    def open(self, layout):
+        GPIO = self.GPIO
+        GPIO.setmode(GPIO.BCM)
+        for pin in layout.output_pins:
+            GPIO.setup(pin, GPIO.OUT)
+            # For inverted logic, HIGH on pin is "OFF"
+            GPIO.output(pin, GPIO.HIGH)
+        for pwm in layout.pwm_outputs.values():
+            GPIO.setup(pwm.pin, GPIO.OUT)
+            self._pwm[pwm.pin] = GPIO.PWM(pwm.pin, pwm.frequency_hz)
+            self._pwm[pwm.pin].start(0)  # Physical 0% duty cycle
+
+        # One SpiDev per chip select
+        for chip in layout.chips:
+            spi = self._spidev.SpiDev()
+            spi.open(chip.bus, chip.device)
+            spi.max_speed_hz = chip.max_speed_hz
+            self._spi[chip.name] = spi
+
+    def spi_device(self, chip):
+        return self._spi[chip]
+
+    def write_output(self, pin, state):
+        # Invert logic for physical output:
+        # UI "ON" (state=True) -> physical LOW
+        # UI "OFF" (state=False) -> physical HIGH
+        self.GPIO.output(pin, self.GPIO.LOW if state else self.GPIO.HIGH)
+
+    def write_outputs(self, states):
+        # One RPi.GPIO call for the whole bank: the pins change back to back
+        # without releasing the GIL in between
+        GPIO = self.GPIO
+        GPIO.output(list(states), [GPIO.LOW if state else GPIO.HIGH for state in states.values()])
+
+    def read_output(self, pin):
+        # Physical HIGH means logical "OFF" (False)
+        return self.GPIO.input(pin) != self.GPIO.HIGH
+
+    def write_pwm(self, pin, duty_cycle):
+        # invert duty cycle 0->100 100->0
+        self._pwm[pin].ChangeDutyCycle(abs(duty_cycle - 100))
+
+    def close(self):
+        for pwm in self._pwm.values():
+            pwm.stop()
+        for spi in self._spi.values():
+            spi.close()
+        self.GPIO.cleanup()
+
+
+class SimulatedSpiDev:
+    """Speaks the MCP3008 protocol, answering with the backend's `adc_values`.
+
+    Every xfer call is counted and can be slowed down by `latency` seconds,
+    so the cost of a scan strategy can be measured without a Pi.
+    """
+    # Default per-transfer latency applied to new instances (seconds)
+    latency = 0.0
+
+    def __init__(self, backend, chip, max_speed_hz=SPI_SPEED_HZ):
+        self.backend = backend
+        self.chip = chip
+        self.max_speed_hz = max_speed_hz
+        self.transfer_count = 0
+        self.bytes_transferred = 0
+
+    def xfer2(self, data):
+        self.transfer_count += 1
+        self.bytes_transferred += len(data)
+        if self.latency:
+            time.sleep(self.latency)
+
+        # Answer every 3-byte command frame with a 10-bit conversion result
+        values = self.backend.adc_values[self.chip]
+        response = []
+        for i in range(0, len(data) - 2, 3):
+            channel = (data[i + 1] >> 4) & 7
+            value = max(0, min(1023, int(round(values[channel]))))
+            response.extend((0, (value >> 8) & 3, value & 0xFF))
+        return response
+
+    xfer3 = xfer2
+
+    def reset_counters(self):
+        self.transfer_count = 0
+        self.bytes_transferred = 0
+
+    def close(self):
+        pass
+
+
+class _SimulatedADC(Backend):
+    """Outputs that only exist in memory and simulated MCP3008 chips."""
+
+    def __init__(self):
+        # Replaced as a whole (never mutated) so a scan sees one consistent set
+        self.adc_values = {}
+        self._chips = ()
+        self._spi = {}
+
+    def open(self, layout):
+        self._chips = layout.chips
+        self.adc_values = {chip.name: (0,) * 8 for chip in layout.chips}
+        self._spi = {chip.name: SimulatedSpiDev(self, chip.name, chip.max_speed_hz) for chip in layout.chips}
+
+    def spi_device(self, chip):
+        return self._spi[chip]
+
+
+class SimulationBackend(_SimulatedADC):
+    """Random sensor values around fixed levels, refreshed every `period` seconds."""
+    name = 'simulation'
+
+    # Channels of the first chip held at 1.5 V so the dashboard shows a known reading
+    TEST_VALUE = 1.5 * 1023 / 3.3
+
+    def __init__(self, period=1.0, seed=None):
+        super().__init__()
+        self.period = float(period)
+        self._random = random.Random(seed)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def open(self, layout):
+        super().open(layout)
+        self.randomize()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='adc-simulation', daemon=True)
+        self._thread.start()
+
+    def randomize(self):
+        """Draw a new set of simulated ADC values."""
+        values = {}
+        for chip in self._chips:
+            if chip.index == 0:
+                values[chip.name] = (self.TEST_VALUE,) * 8
+                continue
+            counts = []
+            for i in range(8):
+                # Randomize around a different base value for each channel
+                variation = self._random.randint(-50, 50)
+                # Keep values within 0-1023 range (10-bit ADC)
+                counts.append(max(0, min(1023, i * 100 + variation + 50)))
+            values[chip.name] = tuple(counts)
+        self.adc_values = values
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self.randomize()
+
+    def close(self):
+        self._stop.set()
+
+
+class ReplayBackend(_SimulatedADC):
+    """Plays back the sensor_scans of a recorded experiment, one row per ADC scan.
+
+    Every scan advances one recorded row, so the data is the same whatever
+    the timing. `scan_rate_hz` is the recorded rate times `speed`; running
+    the acquisition engine at that rate replays the experiment at `speed`x.
+    """
+    name = 'replay'
+
+    def __init__(self, experiment_id, speed=1.0, loop=True):
+        super().__init__()
+        self.experiment_id = int(experiment_id)
+        self.speed = float(speed)
+        self.loop = bool(loop)
+        if self.speed <= 0:
+            raise ValueError(f"Replay speed must be positive, got {speed}")
+        self._rows = {}
+        self._length = 0
+        self._position = 0
+        self.loops = 0
+        self.recorded_rate_hz = None
+
+    def open(self, layout):
+        super().open(layout)
+        self._load()
+        self.before_scan()
+
+    def _load(self):
+        from . import compression, db
+
+        conn = db.cursor()
+        try:
+            stored = {column for _, column in db.stored_columns(conn)}
+            # One array per channel; channels the experiment did not record stay at 0
+            columns = [(chip, channel, column) for chip, channel, _, column in db.scan_columns()
+                       if column in stored]
+            select = ", ".join(f'"{column}"' for _, _, column in columns)
+            result = conn.execute(
+                f"SELECT epoch(timestamp), {select} FROM {compression.FULL_VIEW} "
+                f"WHERE experiment_id = ? ORDER BY timestamp, id",
+                (self.experiment_id,)
+            )
+            channels = {(chip, channel): array('h') for chip, channel, _ in columns}
+            first = last = None
+            while True:
+                rows = result.fetchmany(10000)
+                if not rows:
+                    break
+                if first is None:
+                    first = rows[0][0]
+                last = rows[-1][0]
+                for index, (chip, channel, _) in enumerate(columns, start=1):
+                    channels[(chip, channel)].extend(
+                        0 if row[index] is None else row[index] for row in rows
+                    )
+        finally:
+            db.close_cursor(conn)
+
+        self._length = len(next(iter(channels.values()))) if channels else 0
+        if self._length == 0:
+            raise LookupError(f"Experiment {self.experiment_id} has no recorded scans to replay")
+
+        zeros = array('h', bytes(2 * self._length))
+        for chip in self._chips:
+            self._rows[chip.name] = [channels.get((chip.name, channel), zeros) for channel in range(8)]
+        if self._length > 1 and last > first:
+            self.recorded_rate_hz = (self._length - 1) / (last - first)
+            self.scan_rate_hz = self.recorded_rate_hz * self.speed
+        print(f"Replay of experiment {self.experiment_id}: {self._length} scans"
+              + (f" recorded at {self.recorded_rate_hz:.3g} Hz, playing at {self.speed:g}x"
+                 if self.recorded_rate_hz else ""))
+
+    def before_scan(self):
+        position = self._position
+        if position >= self._length:
+            if not self.loop:
+                return  # Hold the last recorded values
+            position = 0
+            self.loops += 1
+        self.adc_values = {
+            chip: tuple(column[position] for column in columns)
+            for chip, columns in self._rows.items()
+        }
+        self._position = position + 1
+
+    def status(self):
+        return {
+            "backend": self.name,
+            "experiment_id": self.experiment_id,
+            "position": self._position,
+            "length": self._length,
+            "loops": self.loops,
+            "speed": self.speed,
+            "recorded_rate_hz": self.recorded_rate_hz,
+            "scan_rate_hz": self.scan_rate_hz,
+        }
+
+
+def detect():
+    """'hardware' on a Raspberry Pi with RPi.GPIO and spidev installed, else 'simulation'."""
+    if not is_raspberry_pi():
+        print("Non-Raspberry Pi system detected. Running in simulation mode.")
+        return 'simulation'
+    try:
+        import RPi.GPIO  # noqa: F401
+        import spidev  # noqa: F401
+    except ImportError:
+        print("WARNING: RPi.GPIO or spidev not available. Running in simulation mode.")
+        return 'simulation'
+    print("Raspberry Pi hardware detected. Running in hardware mode.")
+    return 'hardware'
+
+
+def create(name='auto', replay_experiment_id=None, replay_speed=1.0, replay_loop=True):
+    """Build the backend selected by name ('auto' picks hardware or simulation)."""
+    if name not in BACKENDS:
+        raise ValueError(f"Invalid I/O backend: {name}")
+    if name == 'auto':
+        name = detect()
+    if name == 'hardware':
+        return HardwareBackend()
+    if name == 'simulation':
+        return SimulationBackend()
+    if replay_experiment_id is None:
+        raise ValueError("The replay backend needs an experiment ID")
+    return ReplayBackend(replay_experiment_id, replay_speed, replay_loop)
@@ -0,0 +1,74 @@
+# app/calibration.py
+"""Raw ADC counts to engineering units, using the calibration in the I/O config.
+
+Each wired channel has a scale and offset (value = scale * count + offset);
+status channels then compare that value against their threshold and read
+1.0 (active) or 0.0. Converted values travel with every snapshot, are
+stored next to the raw counts in sensor_scans and are streamed to clients.
+"""
+from . import channels
+from . import db
+
+# (chip, channel, scale, offset, threshold) per wired channel, in storage order
+_TABLE = tuple(
+    (c.chip, c.channel, c.scale, c.offset, c.threshold) for c in channels.LAYOUT.channels
+)
+_UNWIRED = {chip.name: [None] * channels.CHANNELS_PER_CHIP for chip in channels.LAYOUT.chips}
+
+# Engineering values are rounded to keep API and stream payloads short
+DECIMALS = 4
+
+
+def convert(values):
+    """Engineering values of one scan, shaped like `values` (None where nothing is wired)."""
+    eu = {chip: list(unwired) for chip, unwired in _UNWIRED.items()}
+    for chip, channel, scale, offset, threshold in _TABLE:
+        value = values[chip][channel] * scale + offset
+        eu[chip][channel] = round(value, DECIMALS) if threshold is None else float(value >= threshold)
+    return {chip: tuple(chip_values) for chip, chip_values in eu.items()}
+
+
+def sql_expression(channel):
+    """SQL computing a channel's engineering value from its raw sensor_scans column."""
+    # Float literals would be read as DECIMAL and overflow; compute in DOUBLE
+    value = f'(CAST("{channel.column}" AS DOUBLE) * {channel.scale!r} + {channel.offset!r})'
+    if channel.threshold is None:
+        return f'round({value}, {DECIMALS})'
+    return f'CAST({value} >= {channel.threshold!r} AS REAL)'
+
+
+def backfill(conn):
+    """Fill engineering-unit columns that are NULL, e.g. scans recorded before they existed.
+
+    Returns the number of rows updated.
+    """
+    existing = set(db.table_columns(conn))
+    wired = [c for c in channels.LAYOUT.channels if c.column in existing and c.eu_column in existing]
+    if not wired:
+        return 0
+    assignments = ", ".join(
+        f'"{c.eu_column}" = coalesce("{c.eu_column}", {sql_expression(c)})' for c in wired
+    )
+    missing = " OR ".join(
+        f'("{c.eu_column}" IS NULL AND "{c.column}" IS NOT NULL)' for c in wired
+    )
+    return conn.execute(f"UPDATE {db.SCAN_TABLE} SET {assignments} WHERE {missing}").fetchone()[0]
+
+
+def describe():
+    """Calibration of every wired channel, as served by /api/channels."""
+    return [
+        {
+            "chip": c.chip,
+            "channel": c.channel,
+            "tag": c.tag,
+            "type": c.type,
+            "unit": c.unit,
+            "scale": c.scale,
+            "offset": c.offset,
+            "threshold": c.threshold,
+            "states": c.states,
+            "rate": c.rate,
+        }
+        for c in channels.LAYOUT.channels
+    ]
@@ -0,0 +1,192 @@
+# app/channels.py
+"""Channel and pin map of the test bench, loaded once from a JSON file.
+
+The file (app/io_config.json, or the path in the IO_CONFIG environment
+variable) lists the MCP3008 chips with their SPI bus and chip select, the
+sensor tag and calibration of each wired channel, and the on/off and PWM
+outputs. Storage compression (compression.py) is off unless a channel opts
+in with a "compression" entry. Every lookup table the I/O code needs is
+precomputed here at import time.
+"""
+import os
+import re
+import json
+from collections import namedtuple
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'io_config.json')
+
+CHANNELS_PER_CHIP = 8  # MCP3008
+SPI_SPEED_HZ = 1000000  # 1MHz
+PWM_FREQUENCY_HZ = 10
+RATES = ('fast', 'slow')
+VREF = 3.3
+ADC_MAX = 1023
+
+# Calibration presets: (scale, offset, unit) turning a raw count into
+# engineering units; a channel can override any of them
+CONVERSIONS = {
+    'voltage': (VREF / ADC_MAX, 0.0, 'V'),
+    'percentage': (100 / ADC_MAX, 0.0, '%'),
+    # 0.5 V reads 0 %, every volt above it adds 100 %
+    'percentage-corrected': (VREF * 100 / ADC_MAX, -50.0, '%'),
+    # On/off input: the voltage is compared against the channel's threshold
+    'status': (VREF / ADC_MAX, 0.0, 'V'),
+}
+STATUS_THRESHOLD_V = 2.5
+STATUS_STATES = {'active': 'Ligado', 'inactive': 'Desligado'}
+EU_SUFFIX = '_eu'
+
+# Storage compression per channel (see compression.py); 'edge' is for status channels
+COMPRESSIONS = ('none', 'deadband', 'swinging-door', 'edge')
+DEFAULT_DEVIATION = 2  # counts
+DEFAULT_MAX_INTERVAL_S = 60.0
+
+Chip = namedtuple('Chip', ['name', 'index', 'bus', 'device', 'max_speed_hz'])
+Channel = namedtuple('Channel', [
+    'chip', 'channel', 'tag', 'column', 'rate', 'oversample',
+    'type', 'scale', 'offset', 'unit',
+    'eu_column',  # sensor_scans column with the value in engineering units
+    'threshold',  # Status channels only: active when scale * count + offset >= threshold
+    'states',     # Status channels only: {'active': label, 'inactive': label}
+    'compression',   # One of COMPRESSIONS
+    'deviation',     # deadband / swinging-door: tolerated error in counts
+    'max_interval',  # Seconds after which a point is stored even if nothing changed
+])
+PWMOutput = namedtuple('PWMOutput', ['pin', 'label', 'frequency_hz'])
+
+Layout = namedtuple('Layout', [
+    'path',
+    'chips',         # Chips in scan order
+    'channels',      # Wired channels in storage order
+    'by_tag',        # tag -> Channel
+    'by_key',        # (chip name, channel) -> Channel
+    'sensor_tags',   # chip name -> tag per channel (None where nothing is wired)
+    'gpio_pins',     # pin -> label, on/off outputs first, then PWM outputs
+    'output_pins',   # On/off outputs, in the order used by the published output state
+    'pwm_pins',      # PWM outputs, in the same kind of order
+    'pwm_outputs',   # pin -> PWMOutput
+    'slow_every',    # Slow channels are read on every Nth scan
+])
+
+
+def tag_column(tag):
+    """Column name used for a sensor tag in the wide sensor_scans table."""
+    return re.sub(r'[^a-z0-9_]', '_', tag.lower())
+
+
+def load(path=DEFAULT_PATH):
+    """Read and validate a channel map file. Raises ValueError if it is inconsistent."""
+    with open(path, encoding='utf-8') as f:
+        config = json.load(f)
+
+    def fail(message):
+        raise ValueError(f"{path}: {message}")
+
+    chips = []
+    channels = []
+    by_tag = {}
+    by_key = {}
+    columns = set()
+    selects = set()
+    for index, entry in enumerate(config.get('chips', [])):
+        chip = Chip(
+            name=str(entry['name']),
+            index=index,
+            bus=int(entry.get('bus', 0)),
+            device=int(entry['device']),
+            max_speed_hz=int(entry.get('max_speed_hz', SPI_SPEED_HZ)),
+        )
+        if any(other.name == chip.name for other in chips):
+            fail(f"duplicate chip name {chip.name!r}")
+        if (chip.bus, chip.device) in selects:
+            fail(f"two chips on SPI bus {chip.bus}, device {chip.device}")
+        selects.add((chip.bus, chip.device))
+        chips.append(chip)
+
+        for wired in entry.get('channels', []):
+            kind = wired.get('type', 'voltage')
+            if kind not in CONVERSIONS:
+                fail(f"invalid type {kind!r} for {wired['tag']}")
+            scale, offset, unit = CONVERSIONS[kind]
+            status = kind == 'status'
+            channel = Channel(
+                chip=chip.name,
+                channel=int(wired['channel']),
+                tag=str(wired['tag']),
+                column=tag_column(str(wired['tag'])),
+                rate=wired.get('rate', 'fast'),
+                oversample=bool(wired.get('oversample', False)),
+                type=kind,
+                scale=float(wired.get('scale', scale)),
+                offset=float(wired.get('offset', offset)),
+                unit=wired.get('unit', unit),
+                eu_column=tag_column(str(wired['tag'])) + EU_SUFFIX,
+                threshold=float(wired.get('threshold', STATUS_THRESHOLD_V)) if status else None,
+                states=dict(STATUS_STATES, **wired.get('states', {})) if status else None,
+                compression=wired.get('compression', 'none'),
+                deviation=float(wired.get('deviation', DEFAULT_DEVIATION)),
+                max_interval=float(wired.get('max_interval_s', DEFAULT_MAX_INTERVAL_S)),
+            )
+            if not 0 <= channel.channel < CHANNELS_PER_CHIP:
+                fail(f"{chip.name} has no channel {channel.channel}")
+            if channel.rate not in RATES:
+                fail(f"invalid rate {channel.rate!r} for {channel.tag}")
+            if channel.compression not in COMPRESSIONS:
+                fail(f"invalid compression {channel.compression!r} for {channel.tag}")
+            if (channel.compression == 'edge') != status and channel.compression != 'none':
+                fail(f"{channel.tag}: 'edge' compression is for status channels, "
+                     f"deadband and swinging-door for the others")
+            if channel.deviation < 0 or channel.max_interval <= 0:
+                fail(f"{channel.tag}: deviation must be >= 0 and max_interval_s > 0")
+            if (chip.name, channel.channel) in by_key:
+                fail(f"{chip.name} channel {channel.channel} is listed twice")
+            if channel.tag in by_tag or {channel.column, channel.eu_column} & columns:
+                fail(f"duplicate sensor tag {channel.tag}")
+            by_key[(chip.name, channel.channel)] = by_tag[channel.tag] = channel
+            columns.update((channel.column, channel.eu_column))
+            channels.append(channel)
+
+    if not chips:
+        fail("no ADC chips configured")
+
+    gpio_pins = {}
+    for entry in config.get('outputs', []) + config.get('pwm', []):
+        pin = int(entry['pin'])
+        if pin in gpio_pins:
+            fail(f"GPIO {pin} is listed twice")
+        gpio_pins[pin] = entry.get('label', f"GPIO {pin}")
+    pwm_outputs = {
+        int(entry['pin']): PWMOutput(
+            pin=int(entry['pin']),
+            label=gpio_pins[int(entry['pin'])],
+            frequency_hz=float(entry.get('frequency_hz', PWM_FREQUENCY_HZ)),
+        )
+        for entry in config.get('pwm', [])
+    }
+
+    slow_every = int(config.get('scan', {}).get('slow_every', 1))
+    if slow_every < 1:
+        fail(f"scan.slow_every must be at least 1, got {slow_every}")
+
+    return Layout(
+        path=path,
+        chips=tuple(chips),
+        channels=tuple(channels),
+        by_tag=by_tag,
+        by_key=by_key,
+        sensor_tags={
+            chip.name: [
+                by_key[(chip.name, n)].tag if (chip.name, n) in by_key else None
+                for n in range(CHANNELS_PER_CHIP)
+            ]
+            for chip in chips
+        },
+        gpio_pins=gpio_pins,
+        output_pins=tuple(pin for pin in gpio_pins if pin not in pwm_outputs),
+        pwm_pins=tuple(pwm_outputs),
+        pwm_outputs=pwm_outputs,
+        slow_every=slow_every,
+    )
+
+
+LAYOUT = load(os.environ.get('IO_CONFIG') or DEFAULT_PATH)
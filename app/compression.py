@@ -0,0 +1,304 @@
+# app/compression.py
+"""Per-channel compression of logged scans, and reconstruction on read.
+
+A channel configured with a compression method in the I/O config is left
+NULL in its sensor_scans columns. What is kept instead:
+
+- 'deadband': a point whenever the value moves more than `deviation`
+  counts away from the last stored point. Read back as steps.
+- 'swinging-door': the vertices of a piecewise-linear line that stays
+  within `deviation` counts of every sample. Read back by linear
+  interpolation (rounded to whole counts, so up to half a count more).
+- 'edge' (status channels): an event at every state transition, with the
+  timestamp of the scan that saw it. Read back as steps.
+
+Points go to sensor_points and events to sensor_events. The scan rows
+themselves (id, timestamp and the uncompressed channels) are still written,
+and the sensor_scans_full view rebuilds every compressed column at the
+timestamp of every scan. Deadband and swinging-door also store a point after
+`max_interval_s` without one, so the reconstruction error is bounded in time
+as well as in value.
+"""
+from . import calibration
+from . import channels
+from . import db
+
+POINTS_TABLE = 'sensor_points'
+EVENTS_TABLE = 'sensor_events'
+# sensor_scans with the compressed columns rebuilt; read paths query this
+FULL_VIEW = 'sensor_scans_full'
+
+# Wired channels that are stored compressed
+COMPRESSED = tuple(c for c in channels.LAYOUT.channels if c.compression != 'none')
+
+
+class Deadband:
+    """Store a sample when it leaves the band around the last stored one."""
+
+    def __init__(self, deviation, max_interval):
+        self.deviation = deviation
+        self.max_interval = max_interval
+        self._stored = None
+        self._previous = None
+
+    def add(self, sample):
+        """Feed one (seconds, timestamp, value, eu) sample; returns the samples to store."""
+        stored = self._stored
+        self._previous = sample
+        if (stored is None or abs(sample[2] - stored[2]) > self.deviation
+                or sample[0] - stored[0] >= self.max_interval):
+            self._stored = sample
+            return [sample]
+        return []
+
+    def flush(self):
+        """Samples to store when the recording ends."""
+        if self._previous is None or self._previous is self._stored:
+            return []
+        self._stored = self._previous
+        return [self._previous]
+
+
+class SwingingDoor:
+    """Swinging-door trending: keep the vertices of a line within `deviation` of every sample.
+
+    A vertex is placed on the line through the middle of the door, not on the
+    sample itself, so every sample it covers stays within `deviation`.
+    """
+
+    def __init__(self, deviation, max_interval):
+        self.deviation = deviation
+        self.max_interval = max_interval
+        self._stored = None
+        self._previous = None
+        self._upper = self._lower = None
+
+    def _pivot(self, sample):
+        self._stored = self._previous = sample
+        self._upper, self._lower = float('-inf'), float('inf')
+
+    def _close(self, sample):
+        """Narrow the door with the slopes from the pivots around the stored sample."""
+        stored = self._stored
+        elapsed = sample[0] - stored[0]
+        self._upper = max(self._upper, (sample[2] - stored[2] - self.deviation) / elapsed)
+        self._lower = min(self._lower, (sample[2] - stored[2] + self.deviation) / elapsed)
+
+    def _vertex(self):
+        """Point at the previous sample's time on a line that fits every sample since the stored one."""
+        stored, previous = self._stored, self._previous
+        slope = (self._upper + self._lower) / 2
+        return (previous[0], previous[1], stored[2] + slope * (previous[0] - stored[0]), None)
+
+    def _restart(self, sample):
+        """Store a vertex at the previous sample and start the next segment from it."""
+        vertex = self._vertex()
+        self._pivot(vertex)
+        self._close(sample)
+        self._previous = sample
+        return [vertex]
+
+    def add(self, sample):
+        """Feed one (seconds, timestamp, value, eu) sample; returns the samples to store."""
+        if self._stored is None:
+            self._pivot(sample)
+            return [sample]
+        if sample[0] <= self._previous[0]:
+            return []  # Same timestamp as the previous scan
+
+        if sample[0] - self._stored[0] > self.max_interval:
+            # Too long since the last point: end the segment at the previous
+            # sample, or at this one after a gap in logging
+            if self._previous is self._stored:
+                self._pivot(sample)
+                return [sample]
+            return self._restart(sample)
+
+        door = self._upper, self._lower
+        self._close(sample)
+        if self._upper > self._lower:
+            # No line from the stored point fits this sample too: end the segment before it
+            self._upper, self._lower = door
+            return self._restart(sample)
+        self._previous = sample
+        return []
+
+    def flush(self):
+        """Samples to store when the recording ends."""
+        if self._previous is None or self._previous is self._stored:
+            return []
+        vertex = self._vertex()
+        self._pivot(vertex)
+        return [vertex]
+
+
+class Edge:
+    """Store a status sample only when the state changes."""
+
+    def __init__(self):
+        self._state = None
+
+    def add(self, sample):
+        state = sample[3] >= 0.5
+        if state == self._state:
+            return []
+        self._state = state
+        return [sample]
+
+    def flush(self):
+        return []
+
+
+def _compressor(channel):
+    if channel.compression == 'edge':
+        return Edge()
+    if channel.compression == 'deadband':
+        return Deadband(channel.deviation, channel.max_interval)
+    return SwingingDoor(channel.deviation, channel.max_interval)
+
+
+class Pipeline:
+    """Compression state of every experiment being logged, owned by the sensor writer.
+
+    Rows to insert are collected in `points` (experiment_id, tag, timestamp,
+    value, eu) and `events` (experiment_id, tag, timestamp, state, value)
+    until the writer takes them with `take()`.
+    """
+
+    def __init__(self):
+        self._state = {}
+        self.points = []
+        self.events = []
+
+    def add(self, snapshot, experiment_id):
+        compressors = self._state.get(experiment_id)
+        if compressors is None:
+            compressors = self._state[experiment_id] = [(c, _compressor(c)) for c in COMPRESSED]
+        seconds = snapshot.timestamp.timestamp()
+        for channel, compressor in compressors:
+            value = int(round(snapshot.values[channel.chip][channel.channel]))
+            sample = (seconds, snapshot.timestamp, value, snapshot.eu[channel.chip][channel.channel])
+            self._collect(experiment_id, channel, compressor.add(sample))
+
+    def finish(self, experiment_id):
+        """Store the pending samples of an experiment and forget its state."""
+        compressors = self._state.pop(experiment_id, [])
+        for channel, compressor in compressors:
+            self._collect(experiment_id, channel, compressor.flush())
+
+    def finish_all(self):
+        for experiment_id in list(self._state):
+            self.finish(experiment_id)
+
+    def _collect(self, experiment_id, channel, samples):
+        for _, timestamp, value, eu in samples:
+            if channel.compression == 'edge':
+                self.events.append((experiment_id, channel.tag, timestamp, eu >= 0.5, value))
+            else:
+                # Swinging-door vertices are fitted values: convert them like a sample
+                eu = round(value * channel.scale + channel.offset, calibration.DECIMALS)
+                self.points.append((experiment_id, channel.tag, timestamp, value, eu))
+
+    def take(self):
+        """Return and clear the (points, events) collected so far."""
+        points, events = self.points, self.events
+        self.points, self.events = [], []
+        return points, events
+
+
+def _literal(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    if hasattr(value, 'isoformat'):
+        return f"'{value.isoformat(sep=' ')}'"
+    return repr(value)
+
+
+def insert(conn, points, events):
+    """Insert collected points and events (inlined, like the scan batches)."""
+    for table, rows in ((POINTS_TABLE, points), (EVENTS_TABLE, events)):
+        if rows:
+            conn.execute(
+                f"INSERT INTO {table} VALUES "
+                + ",".join("(" + ",".join(_literal(value) for value in row) + ")" for row in rows)
+            )
+
+
+def ensure_schema(conn):
+    """Create the point and event tables and (re)create the sensor_scans_full view."""
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {POINTS_TABLE} (
+        experiment_id INTEGER,
+        sensor_tag VARCHAR NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        value REAL,  -- Swinging-door vertices lie between whole counts
+        eu REAL
+    )
+    ''')
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {EVENTS_TABLE} (
+        experiment_id INTEGER,
+        sensor_tag VARCHAR NOT NULL,
+        timestamp TIMESTAMP NOT NULL,
+        state BOOLEAN NOT NULL,
+        value SMALLINT
+    )
+    ''')
+    create_full_view(conn)
+
+
+def create_full_view(conn):
+    """(Re)create sensor_scans_full: sensor_scans with compressed channels rebuilt.
+
+    Each compressed column is the stored value if there is one (scans logged
+    before compression was enabled), else the value rebuilt from its points
+    or events with ASOF joins on the scan timestamp.
+    """
+    existing = db.table_columns(conn)
+    present = set(existing)
+    replaced = {}
+    joins = []
+    for index, c in enumerate(COMPRESSED):
+        if c.column not in present:
+            continue
+        tag = _literal(c.tag)
+        same_experiment = "coalesce({0}.experiment_id, -1) = coalesce(s.experiment_id, -1)"
+        if c.compression == 'edge':
+            source = f"(SELECT experiment_id, timestamp, value, CAST(state AS REAL) AS eu FROM {EVENTS_TABLE} WHERE sensor_tag = {tag})"
+        else:
+            source = f"(SELECT experiment_id, timestamp, value, eu FROM {POINTS_TABLE} WHERE sensor_tag = {tag})"
+        before = f"p{index}"
+        joins.append(
+            f"ASOF LEFT JOIN {source} {before} "
+            f"ON {same_experiment.format(before)} AND s.timestamp >= {before}.timestamp"
+        )
+        if c.compression == 'swinging-door':
+            after = f"n{index}"
+            joins.append(
+                f"ASOF LEFT JOIN {source} {after} "
+                f"ON {same_experiment.format(after)} AND s.timestamp <= {after}.timestamp"
+            )
+            # Position of the scan between the two surrounding vertices
+            fraction = (
+                f"(epoch(s.timestamp) - epoch({before}.timestamp)) "
+                f"/ nullif(epoch({after}.timestamp) - epoch({before}.timestamp), 0)"
+            )
+            value = f"coalesce({before}.value + ({after}.value - {before}.value) * {fraction}, {before}.value)"
+            eu = f"coalesce({before}.eu + ({after}.eu - {before}.eu) * {fraction}, {before}.eu)"
+            replaced[c.column] = f'CAST(round(coalesce(s."{c.column}", {value})) AS SMALLINT)'
+        else:
+            replaced[c.column] = f'CAST(coalesce(s."{c.column}", {before}.value) AS SMALLINT)'
+            eu = f"{before}.eu"
+        if c.eu_column in present:
+            replaced[c.eu_column] = f'CAST(coalesce(s."{c.eu_column}", {eu}) AS REAL)'
+
+    selects = [
+        f'{replaced[column]} AS "{column}"' if column in replaced else f's."{column}"'
+        for column in existing
+    ]
+    conn.execute(
+        f"CREATE OR REPLACE VIEW {FULL_VIEW} AS SELECT {', '.join(selects)} "
+        f"FROM {db.SCAN_TABLE} s {' '.join(joins)}"
+    )
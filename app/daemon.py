@@ -0,0 +1,120 @@
+# app/daemon.py
+"""Acquisition daemon: the one process that owns the GPIO and SPI hardware.
+
+    python -m app.daemon
+
+Runs the I/O backend, the acquisition engine, the ADC history, output
+control, experiment recording and test sequences, configured from the same
+environment variables as the web app. Snapshots and output states are published in
+shared memory (shared_state.py); web processes started with IO_MODE=client
+read them there and send everything else as commands over a Unix socket
+(ipc.py). The daemon also owns the database: it runs the sensor writer and
+every web worker's queries, since DuckDB lets only one process open the
+file.
+"""
+import os
+import signal
+import threading
+
+from . import acquisition
+from . import configure
+from . import db
+from . import history
+from . import init_io
+from . import ipc
+from . import metrics
+from . import pi_io
+from . import recording
+from . import sequencer
+from . import shared_state
+from . import writer
+
+
+def _spool_append(timestamp, values, experiment_id=None):
+    """Log a scan taken by a web process (manual logging)."""
+    snapshot = acquisition.Snapshot(0, timestamp, 0.0, values, None, 0.0, 0.0)
+    return writer.submit(snapshot, experiment_id)
+
+
+def _db_execute(query, parameters=None):
+    """Run one statement for a web process and return all its rows."""
+    cur = db.cursor()
+    try:
+        return cur.execute(query, parameters).fetchall()
+    finally:
+        db.close_cursor(cur)
+
+
+def commands():
+    """Commands accepted from web processes: name -> callable."""
+    return {
+        'ping': os.getpid,
+        'set_gpio': pi_io.set_gpio,
+        'set_pwm': pi_io.set_pwm,
+        'apply_outputs': lambda states, duties: pi_io.apply_outputs(states, duties)[0],
+        'set_rate': acquisition.engine.set_rate,
+        'history_since': lambda seq=0, limit=history.MAX_RESPONSE_SAMPLES: history.buffer.since(seq, limit),
+        'backend_status': lambda: pi_io.backend.status(),
+        'recording_start': recording.start,
+        'recording_stop': lambda reason='stopped': recording.recorder.stop(reason),
+        'recording_status': recording.status,
+        'sequence_start': sequencer.start,
+        'sequence_cancel': sequencer.cancel,
+        'sequence_status': sequencer.status,
+        'sequence_list': sequencer.list_sequences,
+        'spool_append': _spool_append,
+        'spool_finalize': writer.finalize_experiment,
+        'writer_written': writer.get_written,
+        'writer_metrics': writer.get_metrics,
+        'db_execute': _db_execute,
+        'metrics': metrics.render,
+    }
+
+
+def main():
+    config = configure({})
+
+    print("=== Acquisition Daemon Startup ===")
+    metrics.set_process('daemon')
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    db.ensure_ready()
+    writer.start(
+        spool_dir=config['SPOOL_DIR'],
+        flush_scans=config['WRITER_FLUSH_SCANS'],
+        flush_interval=config['WRITER_FLUSH_INTERVAL'],
+        max_segments=config['SPOOL_MAX_SEGMENTS'],
+    )
+    publisher = shared_state.Publisher(config['DAEMON_SHM_NAME'])
+    server = None
+    try:
+        rate_hz = init_io(config)
+        acquisition.engine.subscribe(publisher.publish_snapshot)
+        pi_io.add_output_listener(publisher.publish_outputs)
+        publisher.publish_outputs(pi_io.get_gpio_states())
+        acquisition.start(rate_hz)
+
+        server = ipc.Server(
+            config['DAEMON_SOCKET'] or ipc.default_address(db.DB_PATH),
+            config['SECRET_KEY'],
+            commands(),
+        )
+        server.start()
+        print(f"Publishing shared state {config['DAEMON_SHM_NAME']!r}")
+        while not stopping.wait(1.0):
+            pass
+    finally:
+        print("Stopping acquisition daemon...")
+        if server is not None:
+            server.close()
+        if recording.recorder.status().get('active'):
+            recording.stop()
+        pi_io.cleanup()
+        publisher.close()
+        db.close_connection()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,83 +1,340 @@
 # app/db.py
 import os
+import time
 import hashlib
+import threading
 import duckdb
 from flask import g
 
+from . import channels
+from .channels import tag_column
+
 DB_PATH = 'experiment_system.duckdb'
 
+# Wide sample storage: one row per scan, one SMALLINT column per sensor tag
+# (raw counts) and one REAL <column>_eu column with its engineering value
+SCAN_TABLE = 'sensor_scans'
+# Long-format (one row per channel per scan) table of older databases
+LEGACY_READINGS_TABLE = 'sensor_readings'
+
+# Fingerprint of the schema init_db last brought up to date. Bump
+# SCHEMA_VERSION whenever a CREATE or ALTER run by init_db changes.
+SCHEMA_TABLE = 'schema_version'
+SCHEMA_VERSION = 1
+
+# Process-wide database instance; requests and workers get cursors on it
+_connection = None
+_connection_lock = threading.Lock()
+# Cursor factory of a web worker whose queries run in the acquisition
+# daemon, which owns the database file (IO_MODE=client, see use_remote)
+_remote = None
+# Set once init_db has run in this process (see ensure_ready)
+_ready = False
+_ready_lock = threading.Lock()
+_cursor_stats = {
+    'connects': 0,
+    'cursors_opened': 0,
+    'cursors_closed': 0,
+}
+
+def get_connection():
+    """Return the shared DuckDB connection, opening the file on first use."""
+    global _connection
+    if _remote is not None:
+        return _remote()
+    if _connection is None:
+        with _connection_lock:
+            if _connection is None:
+                _connection = duckdb.connect(DB_PATH)
+                _cursor_stats['connects'] += 1
+    return _connection
+
+def cursor():
+    """Return a new cursor on the shared connection.
+
+    Cursors are cheap (no file open, no catalog load) but are not thread-safe:
+    use one per request or per worker thread and close it when done.
+    """
+    conn = get_connection()
+    with _connection_lock:
+        cur = conn if _remote is not None else conn.cursor()
+        _cursor_stats['cursors_opened'] += 1
+    return cur
+
+def close_cursor(cur):
+    """Close a cursor obtained from cursor()."""
+    cur.close()
+    _cursor_stats['cursors_closed'] += 1
+
+def close_connection():
+    """Close the shared connection (at process exit)."""
+    global _connection
+    with _connection_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
 def get_db():
-    """Connect to DuckDB database and return connection."""
+    """Return the database cursor for the current request."""
     if 'db' not in g:
-        g.db = duckdb.connect(DB_PATH)
-        # We'll use standard DuckDB functionality without extensions
+        ensure_ready()
+        g.db = cursor()
     return g.db
 
 def close_db(e=None):
-    """Close the database connection."""
+    """Close the request's database cursor."""
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        close_cursor(db)
+
+def get_metrics():
+    """Connection manager counters, including cursors currently open."""
+    metrics = dict(_cursor_stats)
+    metrics['open_cursors'] = metrics['cursors_opened'] - metrics['cursors_closed']
+    metrics['connected'] = _connection is not None or _remote is not None
+    metrics['remote'] = _remote is not None
+    return metrics
+
+def health_check():
+    """Run a trivial query on a fresh cursor and report its latency."""
+    started = time.perf_counter()
+    try:
+        cur = cursor()
+        try:
+            ok = cur.execute("SELECT 1").fetchone()[0] == 1
+        finally:
+            close_cursor(cur)
+        error = None
+    except Exception as e:
+        ok = False
+        error = str(e)
+    result = {
+        "healthy": ok,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 3),
+        "metrics": get_metrics(),
+    }
+    if error:
+        result["error"] = error
+    return result
+
+def schema_fingerprint():
+    """SCHEMA_VERSION plus the configured channels, which decide the sensor columns."""
+    layout = [(c.tag, c.column, c.eu_column, c.compression) for c in channels.LAYOUT.channels]
+    return f"{SCHEMA_VERSION}:" + hashlib.sha256(repr(layout).encode('utf-8')).hexdigest()[:16]
+
+def stored_fingerprint(conn):
+    """Fingerprint recorded by the last complete init_db, or None."""
+    try:
+        row = conn.execute(f"SELECT fingerprint FROM {SCHEMA_TABLE}").fetchone()
+    except duckdb.CatalogException:
+        return None
+    return row[0] if row else None
+
+def use_remote(cursor_factory):
+    """Run this process's queries through `cursor_factory()` cursors instead of the file.
+
+    DuckDB lets one process at a time open the database read-write, so web
+    workers attached to the acquisition daemon leave it to the daemon,
+    which also brought the schema up to date.
+    """
+    global _remote, _ready
+    _remote = cursor_factory
+    _ready = True
+
+def ensure_ready():
+    """Run init_db once per process, on first use (a request or the warm-up thread)."""
+    global _ready
+    if _ready:
+        return
+    with _ready_lock:
+        if not _ready:
+            init_db()
+            # Also after an error: the app works with partial functionality, as before
+            _ready = True
 
 def init_db():
-    """Initialize the database with tables."""
+    """Initialize the database with tables.
+
+    Skips every CREATE/ALTER when the stored schema fingerprint matches, so
+    a normal start costs one query on one cursor.
+    """
     try:
-        conn = duckdb.connect(DB_PATH)
-        
-        # Create sequences for each table
-        conn.execute("CREATE SEQUENCE IF NOT EXISTS user_id_seq")
-        conn.execute("CREATE SEQUENCE IF NOT EXISTS reading_id_seq")
-        conn.execute("CREATE SEQUENCE IF NOT EXISTS experiment_id_seq")
-        
-        # Create users table
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY,
-            username VARCHAR UNIQUE NOT NULL,
-            password VARCHAR NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Create sensor_readings table
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS sensor_readings (
-            id INTEGER PRIMARY KEY,
-            sensor_tag VARCHAR NOT NULL,
-            timestamp TIMESTAMP NOT NULL,
-            value REAL NOT NULL,
-            experiment_id INTEGER
-        )
-        ''')
-        
-        # Create experiments table
-        conn.execute('''
-        CREATE TABLE IF NOT EXISTS experiments (
-            id INTEGER PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            fuel_type VARCHAR NOT NULL,
-            hydrogen_usage VARCHAR,
-            hydrogen_type VARCHAR,
-            test_duration INTEGER NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        conn.close()
-        print("Database initialized successfully.")
-        
-        # Test the database connection
-        if not test_db_connection():
-            print("WARNING: Database connection test failed!")
-        
-        # Ensure a test user exists
-        ensure_test_user()
-        
+        conn = cursor()
+        try:
+            fingerprint = schema_fingerprint()
+            if stored_fingerprint(conn) == fingerprint:
+                print(f"Database schema up to date ({fingerprint})")
+            else:
+                create_schema(conn, fingerprint)
+                print("Database initialized successfully.")
+
+            # Ensure a test user exists
+            ensure_test_user(conn)
+        finally:
+            close_cursor(conn)
     except Exception as e:
         print(f"Error initializing database: {e}")
         # Continue execution even if there's an error
         # The application might still work with partial functionality
 
+def create_schema(conn, fingerprint):
+    """Create or upgrade every table and view, then record `fingerprint`."""
+    # Create sequences for each table
+    conn.execute("CREATE SEQUENCE IF NOT EXISTS user_id_seq")
+    conn.execute("CREATE SEQUENCE IF NOT EXISTS experiment_id_seq")
+    
+    # Create users table
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        username VARCHAR UNIQUE NOT NULL,
+        password VARCHAR NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Create the wide sensor_scans table and the sensor_readings view
+    ensure_scan_schema(conn)
+    
+    # Create experiments table
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS experiments (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        fuel_type VARCHAR NOT NULL,
+        hydrogen_usage VARCHAR,
+        hydrogen_type VARCHAR,
+        test_duration INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    
+    # Create the per-experiment rollups read by the experiment list
+    from . import rollups
+    rollups.ensure_schema(conn)
+
+    # Position of the sensor writer in the spool
+    from . import spool
+    spool.ensure_schema(conn)
+
+    # A legacy table still waiting for app.migrate keeps the check running
+    # (and its warning printed) on every start
+    if table_type(conn, LEGACY_READINGS_TABLE) == 'BASE TABLE':
+        return
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} (fingerprint VARCHAR, updated_at TIMESTAMP)")
+    conn.execute(f"DELETE FROM {SCHEMA_TABLE}")
+    conn.execute(f"INSERT INTO {SCHEMA_TABLE} VALUES (?, now())", (fingerprint,))
+
+# (chip, channel, tag, column) for every wired ADC channel, in storage order
+_SCAN_COLUMNS = tuple((c.chip, c.channel, c.tag, c.column) for c in channels.LAYOUT.channels)
+
+def scan_columns():
+    """(chip, channel, tag, column) for every ADC channel, in storage order."""
+    return _SCAN_COLUMNS
+
+def table_type(conn, name):
+    """Return 'BASE TABLE', 'VIEW' or None for a table name in the main schema."""
+    row = conn.execute(
+        "SELECT table_type FROM information_schema.tables "
+        "WHERE table_schema = 'main' AND table_name = ?",
+        (name,)
+    ).fetchone()
+    return row[0] if row else None
+
+def ensure_scan_schema(conn, extra_tags=(), warn_legacy=True):
+    """Create sensor_scans (adding columns for new tags) and the compatibility view.
+
+    Returns the list of (tag, column) pairs stored in the table.
+    """
+    conn.execute("CREATE SEQUENCE IF NOT EXISTS scan_id_seq")
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {SCAN_TABLE} (
+        id BIGINT NOT NULL,
+        experiment_id INTEGER,
+        timestamp TIMESTAMP NOT NULL
+    )
+    ''')
+
+    tags = [tag for _, _, tag, _ in scan_columns()]
+    tags += [tag for tag in extra_tags if tag not in tags]
+    for tag in tags:
+        conn.execute(
+            f'ALTER TABLE {SCAN_TABLE} ADD COLUMN IF NOT EXISTS "{tag_column(tag)}" SMALLINT'
+        )
+    # Engineering-unit value of every configured channel (see calibration.py)
+    existing = set(table_columns(conn))
+    added = [c.eu_column for c in channels.LAYOUT.channels if c.eu_column not in existing]
+    for column in added:
+        conn.execute(f'ALTER TABLE {SCAN_TABLE} ADD COLUMN "{column}" REAL')
+    if added and conn.execute(f"SELECT count(*) FROM {SCAN_TABLE}").fetchone()[0]:
+        print(f"Added {len(added)} engineering-unit columns to {SCAN_TABLE}. "
+              f"Run 'python -m app.migrate' to fill them for existing scans.")
+
+    columns = stored_columns(conn, tags)
+
+    # Points/events of compressed channels and the view that rebuilds them
+    from . import compression
+    compression.ensure_schema(conn)
+
+    if table_type(conn, LEGACY_READINGS_TABLE) == 'BASE TABLE':
+        if warn_legacy:
+            print(f"WARNING: {LEGACY_READINGS_TABLE} still uses the long format. "
+                  f"Run 'python -m app.migrate' to convert it to {SCAN_TABLE}.")
+    else:
+        create_readings_view(conn, columns)
+    return columns
+
+def stored_columns(conn, tags=()):
+    """(tag, column) for every sensor column present in sensor_scans.
+
+    Includes columns of tags that only exist in migrated data; their tag is
+    recovered from the column name.
+    """
+    existing = table_columns(conn)
+    by_column = {tag_column(tag): tag for _, _, tag, _ in scan_columns()}
+    by_column.update({tag_column(tag): tag for tag in tags})
+    present = set(existing)
+    return [
+        (by_column.get(column, column.upper()), column)
+        for column in existing
+        if column not in ('id', 'experiment_id', 'timestamp')
+        # Engineering-unit copies of a raw column are not sensors of their own
+        and not (column.endswith(channels.EU_SUFFIX)
+                 and column[:-len(channels.EU_SUFFIX)] in present
+                 and column not in by_column)
+    ]
+
+def table_columns(conn):
+    """Column names of sensor_scans in table order."""
+    return [
+        row[0] for row in conn.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = 'main' AND table_name = ? ORDER BY ordinal_position",
+            (SCAN_TABLE,)
+        ).fetchall()
+    ]
+
+def create_readings_view(conn, columns):
+    """(Re)create sensor_readings as a long-format view over sensor_scans_full.
+
+    Keeps the original (id, sensor_tag, timestamp, value, experiment_id) shape
+    queryable; `id` is derived from the scan ID and the channel position.
+    """
+    from .compression import FULL_VIEW
+    if not columns:
+        return
+    width = len(columns)
+    selects = [
+        f"SELECT id * {width} + {position} AS id, '{tag.replace(chr(39), chr(39) * 2)}' AS sensor_tag, "
+        f"timestamp, "
+        f'CAST("{column}" AS REAL) AS value, experiment_id '
+        f'FROM {FULL_VIEW} WHERE "{column}" IS NOT NULL'
+        for position, (tag, column) in enumerate(columns)
+    ]
+    conn.execute(
+        f"CREATE OR REPLACE VIEW {LEGACY_READINGS_TABLE} AS " + " UNION ALL ".join(selects)
+    )
+
 def hash_password(password):
     """Hash a password for storing."""
     salt = os.urandom(32)  # A new salt for this user
@@ -150,9 +407,9 @@ def authenticate_user(username, password):
 def test_db_connection():
     """Test if the database connection works correctly."""
     try:
-        db = duckdb.connect(DB_PATH)
+        db = cursor()
         result = db.execute("SELECT 1").fetchone()
-        db.close()
+        close_cursor(db)
         if result[0] == 1:
             print("Database connection test successful!")
             return True
@@ -163,10 +420,13 @@ def test_db_connection():
         print(f"Database connection test failed: {e}")
         return False
 
-def ensure_test_user():
-    """Ensure that a test user exists."""
+def ensure_test_user(conn=None):
+    """Ensure that a test user exists.
+
+    The password is only hashed (100k PBKDF2 iterations) when the user is missing.
+    """
     try:
-        db = duckdb.connect(DB_PATH)
+        db = conn if conn is not None else cursor()
         
         # Check if 'admin' user exists
         result = db.execute(
@@ -174,19 +434,6 @@ def ensure_test_user():
         ).fetchone()
         
         if result[0] == 0:
-            # Make sure sequence exists
-            db.execute("CREATE SEQUENCE IF NOT EXISTS user_id_seq")
-            
-            # Create tables if they don't exist
-            db.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY,
-                username VARCHAR UNIQUE NOT NULL,
-                password VARCHAR NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            ''')
-            
             # Get next ID from sequence
             next_id = db.execute("SELECT nextval('user_id_seq')").fetchone()[0]
             
@@ -200,8 +447,9 @@ def ensure_test_user():
         else:
             print("Test user 'admin' already exists")
         
-        db.close()
+        if conn is None:
+            close_cursor(db)
         return True
     except Exception as e:
         print(f"Error ensuring test user: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,122 @@
+# app/export.py
+import os
+import tempfile
+
+from . import compression
+from . import db
+
+FORMATS = {
+    'csv': ('text/csv', "FORMAT csv, HEADER true"),
+    'parquet': ('application/vnd.apache.parquet', "FORMAT parquet, COMPRESSION zstd"),
+}
+CHUNK_SIZE = 64 * 1024
+
+METADATA_COLUMNS = ('fuel_type', 'hydrogen_usage', 'hydrogen_type', 'test_duration')
+
+
+def _literal(value):
+    """SQL string literal for a metadata value."""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def get_experiment(conn, experiment_id):
+    """Return the experiments row as a dict, or None."""
+    row = conn.execute(
+        "SELECT id, user_id, fuel_type, hydrogen_usage, hydrogen_type, test_duration, created_at "
+        "FROM experiments WHERE id = ?",
+        (experiment_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    keys = ('id', 'user_id', 'fuel_type', 'hydrogen_usage', 'hydrogen_type', 'test_duration', 'created_at')
+    return dict(zip(keys, row))
+
+
+def export_to_file(conn, experiment, fmt):
+    """Write an experiment's scans, with its metadata, to a temporary file.
+
+    DuckDB's COPY streams the query result to disk, so memory use does not
+    depend on the size of the experiment. Returns the file path; the caller
+    deletes it.
+    """
+    _, options = FORMATS[fmt]
+    sensor_columns = ", ".join(
+        f'"{column}" AS "{tag}"' for tag, column in db.stored_columns(conn)
+    )
+    metadata_columns = ", ".join(f"e.{column}" for column in METADATA_COLUMNS)
+
+    if fmt == 'parquet':
+        # Also attach the metadata to the file footer for tools that read it there
+        pairs = ", ".join(
+            f"{key}: {_literal(experiment[key])}"
+            for key in ('id',) + METADATA_COLUMNS if experiment[key] is not None
+        )
+        options += f", KV_METADATA {{{pairs}}}"
+
+    fd, path = tempfile.mkstemp(prefix=f"experiment_{experiment['id']}_", suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        conn.execute(
+            f"""
+            COPY (
+                SELECT s.experiment_id, {metadata_columns}, s.timestamp, {sensor_columns}
+                FROM {compression.FULL_VIEW} s
+                JOIN experiments e ON e.id = s.experiment_id
+                WHERE s.experiment_id = {int(experiment['id'])}
+                ORDER BY s.timestamp
+            ) TO '{path}' ({options})
+            """
+        )
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def open_unlinked(path):
+    """Open a file for reading and delete its name; returns (file, size).
+
+    The data stays readable through the file object and its space is freed
+    when that is closed, so nothing is left behind if the response is never
+    streamed (a HEAD request, a client that disconnects, an error).
+    """
+    f = open(path, 'rb')
+    try:
+        size = os.fstat(f.fileno()).st_size
+    finally:
+        os.remove(path)
+    return f, size
+
+
+def stream_file(f, chunk_size=CHUNK_SIZE):
+    """Yield an open file in fixed-size chunks and close it afterwards."""
+    with f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def export_experiment(experiment_id, fmt):
+    """Export an experiment and return (open file, size, mimetype, download name).
+
+    Uses its own cursor so a long export never shares state with the
+    request's cursor, the writer or the acquisition threads. The file is
+    already deleted from disk (see open_unlinked); close it when done.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Invalid export format: {fmt}")
+
+    conn = db.cursor()
+    try:
+        experiment = get_experiment(conn, experiment_id)
+        if experiment is None:
+            raise LookupError(f"Experiment {experiment_id} not found")
+        path = export_to_file(conn, experiment, fmt)
+    finally:
+        db.close_cursor(conn)
+
+    f, size = open_unlinked(path)
+    mimetype, _ = FORMATS[fmt]
+    return f, size, mimetype, f"experiment_{experiment_id}.{fmt}"
@@ -0,0 +1,106 @@
+# app/history.py
+import threading
+from array import array
+
+from . import channels
+
+DEFAULT_MINUTES = 10
+MAX_RESPONSE_SAMPLES = 5000
+
+
+class RingBuffer:
+    """Fixed-size, column-oriented history of acquisition snapshots.
+
+    Storage is preallocated once: one contiguous array of doubles per channel
+    plus a timestamp and a sequence column, so memory use never grows with
+    uptime. Samples are addressed by the acquisition sequence number.
+    """
+
+    def __init__(self, capacity, layout):
+        # layout: ordered mapping chip -> number of channels, e.g. {'mcp1': 8, 'mcp2': 8}
+        self.capacity = int(capacity)
+        self.layout = dict(layout)
+        self._seq = array('q', bytes(8 * self.capacity))
+        self._timestamp = array('d', bytes(8 * self.capacity))
+        self._columns = {
+            chip: [array('d', bytes(8 * self.capacity)) for _ in range(channels)]
+            for chip, channels in self.layout.items()
+        }
+        self._count = 0
+        self._next = 0  # Slot the next sample is written to
+        self._last_seq = 0
+        self._lock = threading.Lock()
+
+    def nbytes(self):
+        """Total bytes held by the column arrays."""
+        columns = sum(len(cols) for cols in self._columns.values()) + 2
+        return columns * 8 * self.capacity
+
+    def append(self, snapshot):
+        """Store one snapshot, overwriting the oldest sample when full."""
+        timestamp = snapshot.timestamp.timestamp()
+        with self._lock:
+            slot = self._next
+            self._seq[slot] = snapshot.seq
+            self._timestamp[slot] = timestamp
+            for chip, columns in self._columns.items():
+                counts = snapshot.values.get(chip, ())
+                for channel, column in enumerate(columns):
+                    column[slot] = counts[channel] if channel < len(counts) else 0.0
+            self._next = (slot + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+            self._last_seq = snapshot.seq
+
+    def since(self, seq=0, limit=MAX_RESPONSE_SAMPLES):
+        """Return the samples with a sequence number greater than `seq`, oldest first.
+
+        At most `limit` samples are returned; callers page by passing the
+        returned `last_seq` back as the next cursor. A cursor ahead of the
+        newest sample was taken before a restart that started the sequence
+        numbers again: the samples are then returned from the oldest one, with
+        `reset` and `truncated` set.
+        """
+        with self._lock:
+            oldest_seq = self._seq[(self._next - self._count) % self.capacity] if self._count else 0
+            reset = seq > self._last_seq
+            if reset:
+                seq = max(0, oldest_seq - 1)
+            # Sequence numbers in the buffer are contiguous, so the slot of a
+            # cursor is a fixed offset from the newest sample.
+            available = max(0, min(self._count, self._last_seq - seq))
+            n = min(available, limit)
+            start = (self._next - available) % self.capacity
+            slots = [(start + i) % self.capacity for i in range(n)]
+
+            result = {
+                'oldest_seq': oldest_seq,
+                'last_seq': self._seq[slots[-1]] if slots else seq,
+                'truncated': reset or seq + 1 < oldest_seq,
+                'reset': reset,
+                'more': available > n,
+                'seq': [self._seq[i] for i in slots],
+                'timestamp': [self._timestamp[i] for i in slots],
+            }
+            for chip, columns in self._columns.items():
+                result[chip] = [[column[i] for i in slots] for column in columns]
+        return result
+
+
+buffer = None
+
+
+def init(rate_hz, minutes=DEFAULT_MINUTES, layout=None):
+    """Create the shared history buffer sized for `minutes` at `rate_hz`."""
+    global buffer
+    capacity = max(1, int(rate_hz * minutes * 60))
+    buffer = RingBuffer(capacity, layout or {
+        chip.name: channels.CHANNELS_PER_CHIP for chip in channels.LAYOUT.chips
+    })
+    print(f"ADC history buffer: {capacity} samples ({buffer.nbytes() / 1024:.0f} KiB)")
+    return buffer
+
+
+def record(snapshot):
+    """Acquisition subscriber that appends each snapshot to the history buffer."""
+    if buffer is not None:
+        buffer.append(snapshot)
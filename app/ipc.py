@@ -0,0 +1,169 @@
+# app/ipc.py
+"""Command channel between web workers and the acquisition daemon.
+
+A multiprocessing.connection Listener on a Unix socket, authenticated with
+the app's SECRET_KEY. A request is a pickled (command, args, kwargs) tuple;
+the reply is ('ok', result) or ('error', message). Every connection is
+served by its own thread, so a slow command never holds up other workers.
+"""
+import os
+import threading
+from multiprocessing.connection import Client as _connect, Listener
+
+CALL_TIMEOUT = 5.0
+# Idle connections a client keeps open (more are opened while calls overlap)
+POOL_SIZE = 4
+
+
+def default_address(db_path):
+    """Daemon socket kept next to the database, like the spool."""
+    return os.path.abspath(db_path) + '.sock'
+
+
+def _authkey(secret):
+    return secret.encode('utf-8') if isinstance(secret, str) else secret
+
+
+class Server:
+    """Serve `commands` (name -> callable) on the Unix socket at `address`."""
+
+    def __init__(self, address, secret, commands):
+        self.address = address
+        self.commands = commands
+        if os.path.exists(address):
+            os.unlink(address)  # Left behind by a daemon that was killed
+        self._listener = Listener(address, family='AF_UNIX', authkey=_authkey(secret))
+        os.chmod(address, 0o600)
+        self._thread = None
+        self._closing = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept, name='ipc-listener', daemon=True)
+        self._thread.start()
+        print(f"Daemon listening on {self.address}")
+
+    def _accept(self):
+        while not self._closing:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                if self._closing:
+                    break
+                continue
+            except Exception as e:
+                print(f"Rejected daemon connection: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(conn,), name='ipc-connection', daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    name, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                command = self.commands.get(name)
+                try:
+                    if command is None:
+                        raise KeyError(f"Unknown daemon command: {name}")
+                    reply = ('ok', command(*args, **kwargs))
+                except Exception as e:
+                    reply = ('error', str(e))
+                try:
+                    conn.send(reply)
+                except (OSError, ValueError):
+                    return
+
+    def close(self):
+        self._closing = True
+        self._listener.close()
+        try:
+            os.unlink(self.address)
+        except OSError:
+            pass
+
+
+class Client:
+    """Thread-safe connections to the daemon; reconnects after the daemon restarts.
+
+    Every call takes a connection of its own from a small pool, so a slow
+    command (metrics, history) never holds up an output write from another
+    thread. A command is retried only if it could not be sent: once sent it
+    may have run, and running set_gpio or sequence_start twice is worse than
+    reporting the error.
+    """
+
+    def __init__(self, address, secret, timeout=CALL_TIMEOUT, pool_size=POOL_SIZE):
+        self.address = address
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._authkey = _authkey(secret)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._closed = False
+
+    def call(self, name, *args, **kwargs):
+        """Run a daemon command and return its result; RuntimeError if it failed."""
+        return self.call_within(self.timeout, name, *args, **kwargs)
+
+    def call_within(self, timeout, name, *args, **kwargs):
+        """call() for a command that may take up to `timeout` seconds, like a query."""
+        for attempt in (1, 2):
+            try:
+                conn = self._acquire()
+            except OSError as e:
+                raise RuntimeError(f"Acquisition daemon unavailable: {e}") from e
+            try:
+                conn.send((name, args, kwargs))
+                break
+            except (OSError, ValueError) as e:
+                # Nothing reached the daemon, so a new connection can carry it
+                _close(conn)
+                if attempt == 2:
+                    raise RuntimeError(f"Acquisition daemon unavailable: {e}") from e
+
+        try:
+            if not conn.poll(timeout):
+                # The reply may still arrive: never read it as the answer to another call
+                _close(conn)
+                raise RuntimeError(f"Daemon did not answer {name} within {timeout:g} s")
+            status, result = conn.recv()
+        except (EOFError, OSError) as e:
+            _close(conn)
+            raise RuntimeError(f"Lost the acquisition daemon during {name}: {e}") from e
+        self._release(conn)
+        if status != 'ok':
+            raise RuntimeError(result)
+        return result
+
+    def _acquire(self):
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                # An idle connection has nothing to read unless the daemon closed it
+                if conn.poll(0):
+                    _close(conn)
+                    continue
+                return conn
+        return _connect(self.address, family='AF_UNIX', authkey=self._authkey)
+
+    def _release(self, conn):
+        with self._lock:
+            if not self._closed and len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        _close(conn)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            _close(conn)
+
+
+def _close(conn):
+    try:
+        conn.close()
+    except OSError:
+        pass
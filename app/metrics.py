@@ -0,0 +1,265 @@
+# app/metrics.py
+import copy
+import time
+import threading
+from bisect import bisect_left
+
+from flask import request
+
+# Upper bounds in seconds (or rows); +Inf is implicit
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+IO_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 0.1, 1.0)
+BATCH_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+_registry = []
+_collectors = []
+# Label added to every sample when several processes report (see set_process)
+_process = None
+# Callables returning the rendered metrics of other processes, merged into render()
+_sources = []
+
+
+class _HistogramChild:
+    __slots__ = ('counts', 'sum', '_buckets', '_lock')
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def observe_serialized(self, value):
+        """observe() for callers that already serialize every observation."""
+        self.counts[bisect_left(self._buckets, value)] += 1
+        self.sum += value
+
+
+class Histogram:
+    """Fixed-bucket histogram with optional labels, rendered in Prometheus text format.
+
+    An observation is one bisect and one uncontended lock, a few microseconds
+    on a Pi, so the instrumentation stays on permanently.
+    """
+
+    def __init__(self, name, help_text, buckets, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def labels(self, *values):
+        """Child histogram for one combination of label values (cache it on hot paths)."""
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _HistogramChild(self.buckets))
+        return child
+
+    def observe(self, value, *labels):
+        self.labels(*labels).observe(value)
+
+    def render(self, constant=()):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            labels = ",".join(f'{name}="{_escape(value)}"'
+                              for name, value in tuple(constant) + tuple(zip(self.labelnames, values)))
+            prefix = labels + "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(float(bound))
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total!r}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class TimedLock:
+    """threading.Lock that records how long callers wait for it and hold it.
+
+    Both observations are made while the lock is held, so the lock itself
+    serializes them and the histograms need no locking of their own.
+    """
+
+    def __init__(self, name):
+        self._lock = threading.Lock()
+        self._wait = LOCK_WAIT_SECONDS.labels(name).observe_serialized
+        self._hold = LOCK_HOLD_SECONDS.labels(name).observe_serialized
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self._lock.acquire(blocking, timeout)
+        if acquired:
+            self._acquired_at = now = time.perf_counter()
+            self._wait(now - started)
+        return acquired
+
+    def release(self):
+        self._hold(time.perf_counter() - self._acquired_at)
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to build the response, per route.',
+    REQUEST_BUCKETS, ('method', 'route'))
+SESSION_SECONDS = Histogram(
+    'session_store_duration_seconds', 'Time spent loading and saving sessions.',
+    IO_BUCKETS, ('operation',))
+SPI_SECONDS = Histogram(
+    'spi_transaction_duration_seconds', 'SPI time to read all channels of one MCP3008.',
+    IO_BUCKETS, ('chip',))
+SCAN_SECONDS = Histogram(
+    'acquisition_scan_duration_seconds', 'Duration of one full ADC scan.', IO_BUCKETS)
+JITTER_SECONDS = Histogram(
+    'acquisition_jitter_seconds', 'Delay of each scan start after its scheduled time.', IO_BUCKETS)
+LOCK_WAIT_SECONDS = Histogram(
+    'lock_wait_seconds', 'Time spent waiting to acquire an I/O lock.', IO_BUCKETS, ('lock',))
+LOCK_HOLD_SECONDS = Histogram(
+    'lock_hold_seconds', 'Time an I/O lock was held.', IO_BUCKETS, ('lock',))
+SEQUENCE_LATENESS_SECONDS = Histogram(
+    'sequence_step_lateness_seconds', 'Delay of each sequence step after its planned time.',
+    IO_BUCKETS, ('action',))
+DB_BATCH_ROWS = Histogram(
+    'db_write_batch_rows', 'Scans per sensor writer batch.', BATCH_BUCKETS)
+DB_BATCH_SECONDS = Histogram(
+    'db_write_batch_duration_seconds', 'Time to insert one sensor writer batch and update rollups.',
+    REQUEST_BUCKETS)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def register_collector(fn):
+    """Register `fn()` returning [(name, type, help, value)] sampled at scrape time."""
+    _collectors.append(fn)
+    return fn
+
+
+def observe_snapshot(snapshot):
+    """Acquisition subscriber: record scan duration and start jitter."""
+    SCAN_SECONDS.observe(snapshot.scan_duration)
+    JITTER_SECONDS.observe(snapshot.jitter)
+
+
+def set_process(name):
+    """Label every sample of this process with process="<name>"."""
+    global _process
+    _process = name
+
+
+def add_source(fn):
+    """Merge the text returned by `fn()` (another process's render()) into render()."""
+    _sources.append(fn)
+
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    constant = (('process', _process),) if _process else ()
+    suffix = f'{{process="{_escape(_process)}"}}' if _process else ""
+    lines = []
+    for histogram in _registry:
+        lines.extend(histogram.render(constant))
+    for collector in _collectors:
+        try:
+            samples = collector()
+        except Exception as e:
+            print(f"Error in metrics collector {collector!r}: {e}")
+            continue
+        for name, kind, help_text, value in samples:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{suffix} {float(value)!r}")
+    text = "\n".join(lines) + "\n"
+    if not _sources:
+        return text
+    texts = [text]
+    for source in _sources:
+        try:
+            texts.append(source())
+        except Exception as e:
+            print(f"Error in metrics source {source!r}: {e}")
+    return merge(texts)
+
+
+def merge(texts):
+    """Combine rendered metrics so each family is declared once, with the samples of every text."""
+    families = {}
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# HELP ') or line.startswith('# TYPE '):
+                family = families.setdefault(line.split(' ', 3)[2], {'header': [], 'samples': []})
+                if len(family['header']) < 2:
+                    family['header'].append(line)
+            elif line and family is not None:
+                family['samples'].append(line)
+    lines = []
+    for family in families.values():
+        lines.extend(family['header'])
+        lines.extend(family['samples'])
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    """Time every request and the session store of `app`."""
+    wsgi_app = app.wsgi_app
+
+    def timed_wsgi_app(environ, start_response):
+        # Started before the session is opened, so request time includes it
+        environ['metrics.started'] = time.perf_counter()
+        return wsgi_app(environ, start_response)
+
+    app.wsgi_app = timed_wsgi_app
+
+    @app.teardown_request
+    def observe_request(exc):
+        started = request.environ.get('metrics.started')
+        if started is None:
+            return
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route)
+
+    # Flask's default interface is shared by every app, so patch a copy
+    interface = app.session_interface = copy.copy(app.session_interface)
+    open_session, save_session = interface.open_session, interface.save_session
+    open_timer, save_timer = SESSION_SECONDS.labels('open'), SESSION_SECONDS.labels('save')
+
+    def timed_open_session(app, request):
+        started = time.perf_counter()
+        try:
+            return open_session(app, request)
+        finally:
+            open_timer.observe(time.perf_counter() - started)
+
+    def timed_save_session(app, session, response):
+        started = time.perf_counter()
+        try:
+            return save_session(app, session, response)
+        finally:
+            save_timer.observe(time.perf_counter() - started)
+
+    interface.open_session = timed_open_session
+    interface.save_session = timed_save_session
@@ -0,0 +1,143 @@
+# app/migrate.py
+"""Convert a database from long-format sensor_readings to wide sensor_scans.
+
+Usage: python -m app.migrate [db_path] [--keep-legacy] [--compact]
+
+Each group of legacy rows sharing (timestamp, experiment_id) becomes one
+sensor_scans row with one SMALLINT column per sensor tag. Afterwards
+sensor_readings is recreated as a view over sensor_scans, so existing
+queries keep working. Engineering-unit columns of scans recorded before
+they existed are filled from the current calibration (see calibration.py).
+
+  --keep-legacy  rename the old table to sensor_readings_legacy instead of dropping it
+  --compact      rewrite the database into a fresh file so freed space is
+                 returned to the SD card (the original is kept as <db_path>.bak)
+"""
+import os
+import sys
+import time
+
+import duckdb
+
+from . import calibration
+from . import db
+from . import rollups
+
+
+def migrate(db_path, keep_legacy=False):
+    """Migrate `db_path` in place. Returns the number of scans written."""
+    conn = duckdb.connect(db_path)
+    try:
+        if db.table_type(conn, db.LEGACY_READINGS_TABLE) != 'BASE TABLE':
+            print(f"{db_path}: {db.LEGACY_READINGS_TABLE} is not a table, nothing to migrate")
+            db.ensure_scan_schema(conn)
+            filled = calibration.backfill(conn)
+            if filled:
+                print(f"{db_path}: filled engineering units of {filled} scans")
+            return 0
+
+        legacy_rows = conn.execute(
+            f"SELECT COUNT(*) FROM {db.LEGACY_READINGS_TABLE}"
+        ).fetchone()[0]
+        tags = [
+            row[0] for row in conn.execute(
+                f"SELECT DISTINCT sensor_tag FROM {db.LEGACY_READINGS_TABLE} ORDER BY sensor_tag"
+            ).fetchall()
+        ]
+        print(f"{db_path}: converting {legacy_rows} rows with {len(tags)} sensor tags")
+
+        conn.execute("BEGIN TRANSACTION")
+        db.ensure_scan_schema(conn, extra_tags=tags, warn_legacy=False)
+
+        pivots = ", ".join(
+            f"CAST(round(max(value) FILTER (WHERE sensor_tag = ?)) AS SMALLINT) "
+            f'AS "{db.tag_column(tag)}"'
+            for tag in tags
+        )
+        column_list = ", ".join(f'"{db.tag_column(tag)}"' for tag in tags)
+        conn.execute(
+            f"""
+            INSERT INTO {db.SCAN_TABLE} (id, experiment_id, timestamp, {column_list})
+            SELECT nextval('scan_id_seq'), experiment_id, timestamp, {column_list}
+            FROM (
+                SELECT experiment_id, timestamp, {pivots}
+                FROM {db.LEGACY_READINGS_TABLE}
+                GROUP BY experiment_id, timestamp
+                ORDER BY timestamp
+            )
+            """,
+            tags
+        )
+        scans = conn.execute(f"SELECT COUNT(*) FROM {db.SCAN_TABLE}").fetchone()[0]
+
+        if keep_legacy:
+            conn.execute(
+                f"ALTER TABLE {db.LEGACY_READINGS_TABLE} "
+                f"RENAME TO {db.LEGACY_READINGS_TABLE}_legacy"
+            )
+        else:
+            conn.execute(f"DROP TABLE {db.LEGACY_READINGS_TABLE}")
+
+        # With the table gone this creates the compatibility view
+        db.ensure_scan_schema(conn, extra_tags=tags)
+        calibration.backfill(conn)
+        rollups.ensure_schema(conn, rebuild_all=True)
+        conn.execute("COMMIT")
+        conn.execute("CHECKPOINT")
+        print(f"{db_path}: wrote {scans} scans to {db.SCAN_TABLE}")
+        return scans
+    except Exception:
+        try:
+            conn.execute("ROLLBACK")
+        except duckdb.Error:
+            pass  # No transaction was open
+        raise
+    finally:
+        conn.close()
+
+
+def compact(db_path):
+    """Rewrite `db_path` into a new file to release the space of dropped data."""
+    tmp_path = db_path + '.compact'
+    backup_path = db_path + '.bak'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = duckdb.connect(db_path)
+    try:
+        source = conn.execute("SELECT current_database()").fetchone()[0]
+        conn.execute(f"ATTACH '{tmp_path}' AS compacted")
+        conn.execute(f"COPY FROM DATABASE {source} TO compacted")
+        conn.execute("DETACH compacted")
+    finally:
+        conn.close()
+
+    os.replace(db_path, backup_path)
+    os.replace(tmp_path, db_path)
+    print(f"{db_path}: compacted, original kept as {backup_path}")
+
+
+def main(argv=None):
+    args = list(sys.argv[1:] if argv is None else argv)
+    keep_legacy = '--keep-legacy' in args
+    do_compact = '--compact' in args
+    paths = [arg for arg in args if not arg.startswith('--')]
+    db_path = paths[0] if paths else db.DB_PATH
+
+    if not os.path.exists(db_path):
+        print(f"Database not found: {db_path}")
+        return 1
+
+    before = os.path.getsize(db_path)
+    started = time.perf_counter()
+    migrate(db_path, keep_legacy=keep_legacy)
+    if do_compact:
+        compact(db_path)
+    after = os.path.getsize(db_path)
+    print(f"Done in {time.perf_counter() - started:.1f} s: "
+          f"{before / 1024:.0f} KiB -> {after / 1024:.0f} KiB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
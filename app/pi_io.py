@@ -6,247 +6,287 @@ import platform
 import os
 from datetime import datetime
 
-# Check if running on Raspberry Pi
-def is_raspberry_pi():
-    try:
-        with open('/proc/device-tree/model', 'r') as m:
-            if 'raspberry pi' in m.read().lower():
-                return True
-    except:
-        pass
-    return False
-
-# Set hardware mode based on platform
-HARDWARE_AVAILABLE = is_raspberry_pi()
-
-# Only import RPi.GPIO and spidev if running on Raspberry Pi
-if HARDWARE_AVAILABLE:
-    try:
-        import RPi.GPIO as GPIO
-        import spidev
-        HARDWARE_AVAILABLE = True
-        print("Raspberry Pi hardware detected. Running in hardware mode.")
-    except ImportError:
-        print("WARNING: RPi.GPIO or spidev not available. Running in simulation mode.")
-        HARDWARE_AVAILABLE = False
-else:
-    print("Non-Raspberry Pi system detected. Running in simulation mode.")
-    # Create mock modules for GPIO and spidev
-    class MockGPIO:
-        BCM = 11
-        OUT = 0
-        IN = 1
-        HIGH = 1
-        LOW = 0
-        
-        @staticmethod
-        def setmode(mode):
-            pass
-            
-        @staticmethod
-        def setup(pin, mode):
-            pass
-            
-        @staticmethod
-        def output(pin, value):
-            pass
-            
-        @staticmethod
-        def input(pin):
-            return 0
-            
-        @staticmethod
-        def cleanup():
-            pass
-            
-        class PWM:
-            def __init__(self, pin, freq):
-                self.pin = pin
-                self.freq = freq
-                self.dc = 0
-                
-            def start(self, dc):
-                self.dc = dc
-                
-            def ChangeDutyCycle(self, dc):
-                self.dc = dc
-                
-            def stop(self):
-                pass
-    
-    # Mock SpiDev class
-    class MockSpiDev:
-        def __init__(self):
-            self.max_speed_hz = 0
-            
-        def open(self, bus, device):
-            pass
-            
-        def xfer2(self, data):
-            # Return mock data - 3 bytes as in MCP3008 protocol
-            return [0, 0, 0]
-            
-        def close(self):
-            pass
-    
-    # Set mock classes
-    GPIO = MockGPIO()
-    spidev = type('spidev', (), {'SpiDev': MockSpiDev})
-    spidev.SpiDev = MockSpiDev
+import msgspec
+
+from . import backends
+from . import channels
+from . import metrics
+
+# Channel and pin map, loaded from the I/O config file (see channels.py)
+CHIPS = channels.LAYOUT.chips
 
 # GPIO assignments
-GPIO_PINS = {
-    2: "ABRIR/FECHAR DIESEL",
-    3: "ABRIR/FECHAR OB1",
-    23: "ABRIR/FECHAR OCA1",
-    17: "CHAVE GERAL DO MOTOGERADOR",
-    27: "LIGA/DESLIGA MOTOR",
-    22: "LIGA/DESLIGA ELETROLISADOR",
-    0: "BOMBA H2",
-    13: "LIGAR/DESLIGAR INJETOR",
-    12: "DESLIZANTE PRÉ BOMBA (PWM)",
-}
+GPIO_PINS = channels.LAYOUT.gpio_pins
 
 # PWM pins
-PWM_PINS = [12]
+PWM_PINS = channels.LAYOUT.pwm_pins
 
-# Simulation data
-adc_values = {
-    'mcp1': [0] * 8,
-    'mcp2': [0] * 8
-}
+# On/off outputs, in the order used by the published output state
+OUTPUT_PINS = channels.LAYOUT.output_pins
 
-gpio_states = {}
-pwm_instances = {}
+# Sensor tags stored with each ADC channel, indexed by chip and channel
+SENSOR_TAGS = channels.LAYOUT.sensor_tags
 
-# Lock for thread safety
-io_lock = threading.Lock()
+gpio_states = {}
 
-def init_hardware():
-    """Initialize GPIO and SPI if hardware is available."""
-    with io_lock:
+# Hardware, simulation or replay (see backends.py), set by init_hardware
+backend = None
+
+# SPI handle of each MCP3008 chip by name (set by init_hardware)
+spi_devices = {}
+
+# ADC scan configuration (see configure_adc)
+SCAN_MODES = ('per_channel', 'batched')
+DECIMATION_MODES = ('mean', 'median')
+adc_scan_config = {
+    # 'per_channel': one xfer2 per conversion (CS toggles between frames)
+    # 'batched': all frames of a chip concatenated into a single xfer2
+    'mode': 'per_channel',
+    'oversample': 1,
+    'decimation': 'mean',
+    # Noisy channels that get oversampled, as (chip, channel) pairs
+    'oversample_channels': {(c.chip, c.channel) for c in channels.LAYOUT.channels if c.oversample},
+}
+# Precomputed per-chip transfer plans, rebuilt by configure_adc
+_scan_plans = {}
+# Last counts of every chip; slow channels keep theirs between full scans
+_last_counts = {chip.name: [0] * channels.CHANNELS_PER_CHIP for chip in CHIPS}
+_scan_count = 0
+
+# Separate locks so an output change never waits behind an ADC scan:
+# spi_lock covers both MCP3008 chips and the scan configuration, gpio_lock
+# and pwm_lock serialize writers of the on/off outputs and the PWM outputs.
+spi_lock = metrics.TimedLock('spi')
+gpio_lock = metrics.TimedLock('gpio')
+pwm_lock = metrics.TimedLock('pwm')
+
+# Copy-on-write output state. Writers publish new tuples under their lock;
+# readers take the current reference without locking.
+_output_snapshot = (False,) * len(OUTPUT_PINS)
+_pwm_snapshot = (0,) * len(PWM_PINS)
+_OUTPUT_INDEX = {pin: index for index, pin in enumerate(OUTPUT_PINS)}
+_PWM_INDEX = {pin: index for index, pin in enumerate(PWM_PINS)}
+
+# Callbacks invoked with the get_gpio_states() response after an output changes
+_output_listeners = []
+
+def init_hardware(io_backend=None):
+    """Initialize GPIO and SPI through `io_backend` (auto-detected if None)."""
+    global backend, _output_snapshot, _pwm_snapshot
+    with gpio_lock:
         for pin in GPIO_PINS:
             gpio_states[pin] = False  # Logical "OFF"
+        _output_snapshot = (False,) * len(OUTPUT_PINS)
 
+    with pwm_lock:
         for pin in PWM_PINS:
             # For PWM, 0% is the initial logical "OFF" state
             gpio_states[f"pwm_{pin}"] = 0
-
-    if not HARDWARE_AVAILABLE:
-        print("Hardware initialization skipped (simulation mode)")
-        return
-
-    GPIO.setmode(GPIO.BCM)
-    for pin in GPIO_PINS:
-        if pin in PWM_PINS:
-            GPIO.setup(pin, GPIO.OUT)
-            pwm_instances[pin] = GPIO.PWM(pin, 10)
-            pwm_instances[pin].start(0)  # Physical 0% duty cycle
-        else:
-            GPIO.setup(pin, GPIO.OUT)
-            # For inverted logic, HIGH on pin is "OFF"
-            GPIO.output(pin, GPIO.HIGH) 
-            # gpio_states[pin] is already False, which matches physical HIGH (OFF)
-
-
-    # Initialize SPI for MCP3008
-    try:
-        # We have two MCP3008 chips on separate SPI channels
-        global spi_mcp1, spi_mcp2
-        spi_mcp1 = spidev.SpiDev()
-        spi_mcp1.open(0, 0)  # Bus 0, Device 0
-        spi_mcp1.max_speed_hz = 1000000  # 1MHz
-
-        spi_mcp2 = spidev.SpiDev()
-        spi_mcp2.open(0, 1)  # Bus 0, Device 1
-        spi_mcp2.max_speed_hz = 1000000  # 1MHz
-    except Exception as e:
-        print(f"Error initializing SPI: {e}")
+        _pwm_snapshot = (0,) * len(PWM_PINS)
+
+    if io_backend is None:
+        io_backend = backends.create()
+    with spi_lock:
+        if backend is not None:
+            backend.close()
+        io_backend.open(channels.LAYOUT)
+        backend = io_backend
+        spi_devices.clear()
+        spi_devices.update((chip.name, backend.spi_device(chip.name)) for chip in CHIPS)
+    print(f"I/O backend: {backend.name}")
 
 def cleanup():
     """Clean up GPIO resources."""
-    if HARDWARE_AVAILABLE:
-        for pin in PWM_PINS:
-            if pin in pwm_instances:
-                pwm_instances[pin].stop()
-        GPIO.cleanup()
+    # Stop sampling before the hardware goes away
+    from . import acquisition, sequencer, writer
+    sequencer.stop()
+    acquisition.stop()
+    # Flush every queued sensor reading before exiting
+    writer.stop()
+
+    if backend is not None:
+        backend.close()
+
+def configure_adc(mode=None, oversample=None, decimation=None, oversample_channels=None):
+    """Configure how read_all_adc talks to the MCP3008 chips.
+
+    `oversample` is the number of conversions taken per channel in
+    `oversample_channels` (a set of (chip, channel) pairs); they are reduced to
+    one value with `decimation` ('mean' or 'median').
+    """
+    with spi_lock:
+        if mode is not None:
+            if mode not in SCAN_MODES:
+                raise ValueError(f"Invalid ADC scan mode: {mode}")
+            adc_scan_config['mode'] = mode
+        if oversample is not None:
+            oversample = int(oversample)
+            if oversample < 1:
+                raise ValueError(f"Oversample factor must be at least 1, got {oversample}")
+            adc_scan_config['oversample'] = oversample
+        if decimation is not None:
+            if decimation not in DECIMATION_MODES:
+                raise ValueError(f"Invalid decimation mode: {decimation}")
+            adc_scan_config['decimation'] = decimation
+        if oversample_channels is not None:
+            adc_scan_config['oversample_channels'] = {tuple(c) for c in oversample_channels}
+        _build_scan_plans()
+
+def _build_scan_plans():
+    """Precompute the command frames sent for each chip during a scan.
+
+    Every chip gets a 'full' plan covering all wired channels and a 'fast'
+    plan that leaves out the channels configured with the slow rate.
+    """
+    oversample = adc_scan_config['oversample']
+    for chip in CHIPS:
+        wired = [c for c in channels.LAYOUT.channels if c.chip == chip.name]
+        plans = {}
+        for name, selected in (('full', wired), ('fast', [c for c in wired if c.rate == 'fast'])):
+            scanned = []
+            for c in selected:
+                repeats = oversample if (chip.name, c.channel) in adc_scan_config['oversample_channels'] else 1
+                scanned.extend([c.channel] * repeats)
+            # MCP3008 protocol: Start bit (1), single-ended (1), channel (3 bits), 000 padding
+            frames = [[1, (8 + channel) << 4, 0] for channel in scanned]
+            plans[name] = {
+                'channels': scanned,
+                'wired': sorted({c.channel for c in selected}),
+                'frames': frames,
+                'batched_tx': [byte for frame in frames for byte in frame],
+            }
+        _scan_plans[chip.name] = plans
+
+def _decode(r, offset=0):
+    """Combine the two low bytes of a response frame into the 10-bit ADC value."""
+    return ((r[offset + 1] & 3) << 8) + r[offset + 2]
+
+def _reduce(samples):
+    """Decimate oversampled conversions of one channel into a single value."""
+    if len(samples) == 1:
+        return samples[0]
+    if adc_scan_config['decimation'] == 'median':
+        return sorted(samples)[len(samples) // 2]
+    return sum(samples) / len(samples)
 
 def read_adc(chip, channel):
-    """Read the specified ADC channel on the specified MCP3008 chip."""
-    if not HARDWARE_AVAILABLE:
-        # Return simulated ADC value
-        if chip == 1:
-            return adc_values['mcp1'][channel]
-        else:
-            return adc_values['mcp2'][channel]
-
+    """Read the specified ADC channel on the named MCP3008 chip."""
     try:
-        spi = spi_mcp1 if chip == 1 else spi_mcp2
+        spi = spi_devices[chip]
         # MCP3008 protocol: Start bit (1), single-ended (1), channel (3 bits), 000 padding
         r = spi.xfer2([1, (8 + channel) << 4, 0])
         # Combine the two bytes to get the 10-bit ADC value
-        value = ((r[1] & 3) << 8) + r[2]
-        return value
+        return _decode(r)
     except Exception as e:
         print(f"Error reading ADC: {e}")
         return 0
 
-def read_all_adc():
-    """Read all ADC channels from both MCP3008 chips."""
-    with io_lock:
-        # Read from MCP1 (all 8 channels)
-        for i in range(8):
-            adc_values['mcp1'][i] = read_adc(1, i)
+_spi_timers = {chip.name: metrics.SPI_SECONDS.labels(chip.name) for chip in CHIPS}
 
-        # Read from MCP2 (all 8 channels)
-        for i in range(8):
-            adc_values['mcp2'][i] = read_adc(2, i)
+def read_chip(chip, full=True):
+    """Read the wired channels of the named MCP3008 chip, applying oversampling.
 
-        return adc_values
+    With `full` False only the fast channels are converted; the slow ones
+    keep the value of the last full scan.
+    """
+    if not _scan_plans:
+        _build_scan_plans()
+    plan = _scan_plans[chip]['full' if full else 'fast']
+    spi = spi_devices[chip]
+    counts = _last_counts[chip]
 
-def get_gpio_states():
-    """Get the current state of all GPIO pins (reflecting UI logic)."""
-    states = {}
-
-    with io_lock:
-        if HARDWARE_AVAILABLE:
-            for pin_key in GPIO_PINS: # Iterate using the keys from GPIO_PINS
-                pin_number = int(pin_key)
-
-                if pin_number in PWM_PINS:
-                    # PWM state is stored directly as UI-intended duty cycle
-                    states[str(pin_number)] = gpio_states.get(f"pwm_{pin_number}", 0)
-                else:
-                    try:
-                        # Physical HIGH means logical "OFF" (False)
-                        # Physical LOW means logical "ON" (True)
-                        physical_state_is_high = GPIO.input(pin_number) == GPIO.HIGH
-                        states[str(pin_number)] = not physical_state_is_high
-                    except Exception as e:
-                        # Fallback to stored state on error
-                        print(f"Error reading GPIO {pin_number}: {e}. Using stored state.")
-                        states[str(pin_number)] = gpio_states.get(pin_number, False)
-        else:
-            # Simulation mode: return directly from gpio_states
-            for pin_key in GPIO_PINS:
-                pin_number = int(pin_key)
-                if pin_number in PWM_PINS:
-                    states[str(pin_number)] = gpio_states.get(f"pwm_{pin_number}", 0)
-                else:
-                    states[str(pin_number)] = gpio_states.get(pin_number, False)
-
-    response = {}
-    for pin, state in states.items():
-        pin_number = int(pin) if isinstance(pin, str) else pin
-        if pin_number in PWM_PINS:
-            if 'pwm' not in response:
-                response['pwm'] = {}
-            response['pwm'][str(pin_number)] = state
+    started = time.perf_counter()
+    try:
+        if adc_scan_config['mode'] == 'batched':
+            # One ioctl for the whole chip: the command frames are concatenated
+            r = spi.xfer2(list(plan['batched_tx']))
+            raw = [_decode(r, i * 3) for i in range(len(plan['channels']))]
         else:
-            response[str(pin_number)] = state
+            raw = [_decode(spi.xfer2(list(frame))) for frame in plan['frames']]
+    except Exception as e:
+        print(f"Error reading ADC chip {chip}: {e}")
+        for channel in plan['wired']:
+            counts[channel] = 0
+        return list(counts)
+    _spi_timers[chip].observe(time.perf_counter() - started)
+
+    samples = {channel: [] for channel in plan['wired']}
+    for channel, count in zip(plan['channels'], raw):
+        samples[channel].append(count)
+    for channel, channel_samples in samples.items():
+        counts[channel] = _reduce(channel_samples)
+    return list(counts)
+
+def read_all_adc():
+    """Read all ADC channels from every configured MCP3008 chip.
+
+    Slow channels are only converted on every `slow_every`th scan.
+
+    This does the actual SPI work; consumers should use the snapshot published
+    by the acquisition engine (`acquisition.get_snapshot()`) instead.
+    """
+    global _scan_count
+    with spi_lock:
+        backend.before_scan()
+        full = _scan_count % channels.LAYOUT.slow_every == 0
+        _scan_count += 1
+        return {chip.name: read_chip(chip.name, full) for chip in CHIPS}
+
+def _read_back(pin):
+    """Logical (UI) state of an output pin as read from the backend."""
+    try:
+        state = backend.read_output(pin)
+    except Exception as e:
+        # Fallback to stored state on error
+        print(f"Error reading GPIO {pin}: {e}. Using stored state.")
+        state = None
+    return gpio_states.get(pin, False) if state is None else state
+
+def read_gpio_states():
+    """Get the current output state as a schemas.GPIOStates struct.
 
-    return response
+    Never blocks: it reads the state last published by set_gpio/set_pwm.
+    """
+    from . import schemas
 
+    outputs, pwm = _output_snapshot, _pwm_snapshot
+    return schemas.GPIOStates(*outputs, schemas.PWMStates(*pwm))
+
+def get_gpio_states():
+    """Get the current state of all GPIO pins (reflecting UI logic)."""
+    return msgspec.to_builtins(read_gpio_states())
+
+
+def output_tuples():
+    """(on/off states in OUTPUT_PINS order, duty cycles in PWM_PINS order)."""
+    return _output_snapshot, _pwm_snapshot
+
+def sync_outputs(outputs, duties):
+    """Adopt an output state set by another process (see remote.py) and notify listeners."""
+    global _output_snapshot, _pwm_snapshot
+    outputs, duties = tuple(outputs), tuple(duties)
+    with gpio_lock, pwm_lock:
+        if (outputs, duties) == (_output_snapshot, _pwm_snapshot):
+            return
+        gpio_states.update(zip(OUTPUT_PINS, outputs))
+        gpio_states.update((f"pwm_{pin}", duty) for pin, duty in zip(PWM_PINS, duties))
+        _output_snapshot, _pwm_snapshot = outputs, duties
+    _notify_outputs({"success": True})
+
+def add_output_listener(callback):
+    """Register `callback(states)` to be called after every successful set_gpio/set_pwm."""
+    _output_listeners.append(callback)
+
+def _notify_outputs(result):
+    """Push the new output state to listeners if the change succeeded."""
+    if result.get("success") and _output_listeners:
+        states = get_gpio_states()
+        for callback in _output_listeners:
+            try:
+                callback(states)
+            except Exception as e:
+                print(f"Error in output listener {callback!r}: {e}")
+    return result
 
 def set_gpio(pin, state):
     """Set a GPIO pin. UI 'state' (True=ON, False=OFF) is inverted for physical output."""
@@ -258,23 +298,25 @@ def set_gpio(pin, state):
     if pin in PWM_PINS:
         return {"success": False, "error": f"GPIO {pin} is a PWM pin. Use set_pwm instead."}
 
-    with io_lock:
-        # Store the UI-intended state
-        gpio_states[pin] = state 
-
-        if HARDWARE_AVAILABLE:
-            try:
-                # Invert logic for physical output:
-                # UI "ON" (state=True) -> physical LOW
-                # UI "OFF" (state=False) -> physical HIGH
-                physical_output = GPIO.LOW if state else GPIO.HIGH
-                GPIO.output(pin, physical_output)
-                return {"success": True}
-            except Exception as e:
-                return {"success": False, "error": str(e)}
-        else:
-            # Simulation mode: just update the logical state
-            return {"success": True}
+    global _output_snapshot
+    state = bool(state)
+    with gpio_lock:
+        try:
+            backend.write_output(pin, state)
+            result = {"success": True}
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+            # Publish what the pin actually reads after the failed write
+            state = _read_back(pin)
+
+        # Store the UI-intended state and publish a new snapshot
+        gpio_states[pin] = state
+        outputs = list(_output_snapshot)
+        outputs[_OUTPUT_INDEX[pin]] = state
+        _output_snapshot = tuple(outputs)
+
+    # Listeners are called outside the lock so they can read the new state
+    return _notify_outputs(result)
 
 def set_pwm(pin, duty_cycle):
     """Set the PWM duty cycle for a GPIO pin."""
@@ -287,118 +329,130 @@ def set_pwm(pin, duty_cycle):
     if duty_cycle < 0 or duty_cycle > 100:
         return {"success": False, "error": f"Duty cycle must be between 0 and 100, got {duty_cycle}"}
     
-    with io_lock:
-        gpio_states[f"pwm_{pin}"] = duty_cycle
-        
-        if HARDWARE_AVAILABLE:
-            try:
-                duty_cycle = abs(duty_cycle - 100) # invert duty cycle 0->100 100->0
-                pwm_instances[pin].ChangeDutyCycle(duty_cycle)
-                return {"success": True}
-            except Exception as e:
-                return {"success": False, "error": str(e)}
+    global _pwm_snapshot
+    with pwm_lock:
+        try:
+            backend.write_pwm(pin, duty_cycle)
+            result = {"success": True}
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+
+        if result["success"]:
+            gpio_states[f"pwm_{pin}"] = duty_cycle
+            duties = list(_pwm_snapshot)
+            duties[_PWM_INDEX[pin]] = duty_cycle
+            _pwm_snapshot = tuple(duties)
+
+    return _notify_outputs(result)
+
+def apply_outputs(states, duties):
+    """Write on/off `states` and PWM `duties` under one hold of both output locks.
+
+    Returns ({('gpio' or 'pwm', pin): error}, time at which the combined
+    state took effect). Listeners see one change.
+    """
+    global _output_snapshot, _pwm_snapshot
+    with gpio_lock, pwm_lock:
+        errors = backend.write_batch(states, duties)
+        timestamp = datetime.now()
+
+        outputs = list(_output_snapshot)
+        for pin, state in states.items():
+            if ('gpio', pin) in errors:
+                # Publish what the pin actually reads after the failed write
+                state = _read_back(pin)
+            gpio_states[pin] = state
+            outputs[_OUTPUT_INDEX[pin]] = state
+        _output_snapshot = tuple(outputs)
+
+        duties_now = list(_pwm_snapshot)
+        for pin, duty_cycle in duties.items():
+            if ('pwm', pin) not in errors:
+                gpio_states[f"pwm_{pin}"] = duty_cycle
+                duties_now[_PWM_INDEX[pin]] = duty_cycle
+        _pwm_snapshot = tuple(duties_now)
+
+    if len(errors) < len(states) + len(duties):
+        _notify_outputs({"success": True})
+    return errors, timestamp
+
+def set_outputs(operations):
+    """Apply a batch of output changes at once (see /api/io-batch).
+
+    Each operation is {"gpio": pin, "state": bool} for an on/off output or
+    {"gpio": pin, "value": duty} for a PWM output, never both. Nothing is written if
+    any operation is invalid; otherwise every write is attempted and
+    reported in "results", in the order given.
+    """
+    states, duties = {}, {}
+    keys, invalid = [], {}
+    for index, op in enumerate(operations):
+        try:
+            pin = int(op.get('gpio'))
+        except (TypeError, ValueError):
+            invalid[index] = f"Invalid GPIO pin: {op.get('gpio')}"
+            keys.append(None)
+            continue
+        if op.get('value') is not None and op.get('state') is not None:
+            key = None
+            invalid[index] = f"Operation on GPIO {pin} has both a state and a value"
+        elif op.get('value') is not None:
+            key = ('pwm', pin)
+            duty_cycle = int(op['value'])
+            if pin not in PWM_PINS:
+                invalid[index] = f"GPIO {pin} is not a PWM pin"
+            elif duty_cycle < 0 or duty_cycle > 100:
+                invalid[index] = f"Duty cycle must be between 0 and 100, got {duty_cycle}"
+            else:
+                duties[pin] = duty_cycle
+        elif op.get('state') is not None:
+            key = ('gpio', pin)
+            if pin not in GPIO_PINS:
+                invalid[index] = f"Invalid GPIO pin: {pin}"
+            elif pin in PWM_PINS:
+                invalid[index] = f"GPIO {pin} is a PWM pin. Use a value instead of a state."
+            else:
+                states[pin] = bool(op['state'])
         else:
-            # Simulation mode
-            return {"success": True}
-
-def simulate_sensor_values():
-    """Simulate changing sensor values for testing."""
-    import random
-
-    TEST_VALUE = 1.5
-    TEST_VALUE = TEST_VALUE * 1023 / 3.3
-    
-    with io_lock:
-        # Generate realistic looking values
-        for i in range(8):
-            # Randomize around a base value to simulate real sensor readings
-            base_value = i * 100  # Different base value for each channel
-            variation = random.randint(-50, 50)  # Random variation
-            
-            # Keep values within 0-1023 range (10-bit ADC)
-            adc_values['mcp1'][i] = max(0, min(1023, base_value + variation))
-            adc_values['mcp2'][i] = max(0, min(1023, base_value + variation + 50))
-        
-        adc_values['mcp1'][0] = TEST_VALUE
-        adc_values['mcp1'][1] = TEST_VALUE
-        adc_values['mcp1'][2] = TEST_VALUE
-        adc_values['mcp1'][3] = TEST_VALUE
-        adc_values['mcp1'][4] = TEST_VALUE
-        adc_values['mcp1'][5] = TEST_VALUE
-        adc_values['mcp1'][6] = TEST_VALUE
-        adc_values['mcp1'][7] = TEST_VALUE
-
-# Start a background thread to simulate sensor values when in simulation mode
-def start_simulation():
-    """Start a background thread to simulate sensor values."""
-    if not HARDWARE_AVAILABLE:
-        print("Starting sensor simulation thread...")
-        def simulation_thread():
-            while True:
-                simulate_sensor_values()
-                time.sleep(1)
-        
-        thread = threading.Thread(target=simulation_thread, daemon=True)
-        thread.start()
-    else:
-        print("Simulation not started (hardware mode active)")
+            key = None
+            invalid[index] = f"Operation on GPIO {pin} needs a state or a value"
+        if key is not None and key in keys:
+            invalid[index] = f"GPIO {pin} appears more than once"
+        keys.append(key)
+
+    if invalid:
+        return {
+            "success": False,
+            "error": "No output changed: the batch has invalid operations",
+            "results": [
+                {"success": False, "error": invalid.get(index, "Not applied")}
+                for index in range(len(operations))
+            ],
+        }
+
+    errors, timestamp = apply_outputs(states, duties)
+    results = [
+        {"success": False, "error": errors[key]} if key in errors else {"success": True}
+        for key in keys
+    ]
+    result = {"success": not errors, "results": results, "timestamp": timestamp}
+    if errors:
+        result["error"] = f"{len(errors)} of {len(keys)} operations failed"
+    return result
 
 # Data logging functionality
 def log_sensor_data(experiment_id=None):
-    """Log sensor data to database."""
-    from . import db
-    
-    data = read_all_adc()
-    timestamp = datetime.now()
-    
-    try:
-        conn = db.get_db()
-        
-        # Make sure the sequence exists
-        conn.execute("CREATE SEQUENCE IF NOT EXISTS reading_id_seq")
-        
-        for chip in [1, 2]:
-            for channel in range(8):
-                # Create a tag for the sensor
-                if chip == 1:
-                    if channel == 0:
-                        tag = "MOTOR_ATIVO"
-                    elif channel == 1:
-                        tag = "SENSOR_H2_AMBIENTES"
-                    elif channel == 2:
-                        tag = "ABERTO_FECHADO_GN"
-                    elif channel == 3:
-                        tag = "ABERTO_FECHADO_H2"
-                    elif channel == 4:
-                        tag = "PRE_INJECAO_GN"
-                    elif channel == 5:
-                        tag = "PRESSAO_ELETROLISADOR"
-                    elif channel == 6:
-                        tag = "VALVULA_ARMAZENADO"
-                    elif channel == 7:
-                        tag = "VALVULA_ELETROLISADO"
-                else:
-                    if channel == 0:
-                        tag = "BOMBA_ELETROLISADO"
-                    else:
-                        tag = f"MCP2_CH{channel}"
-                
-                value = data[f'mcp{chip}'][channel]
-                
-                # Get next ID from sequence
-                next_id = conn.execute("SELECT nextval('reading_id_seq')").fetchone()[0]
-                
-                # Log to database with explicit ID
-                conn.execute(
-                    """
-                    INSERT INTO sensor_readings 
-                    (id, sensor_tag, timestamp, value, experiment_id) 
-                    VALUES (?, ?, ?, ?, ?)
-                    """,
-                    (next_id, tag, timestamp, value, experiment_id)
-                )
-        
-        return True
-    except Exception as e:
-        print(f"Error logging sensor data: {e}")
-        return False
\ No newline at end of file
+    """Queue the latest sensor snapshot for writing to the database."""
+    from . import acquisition
+    from . import writer
+
+    # Log the latest published scan instead of touching the SPI bus again
+    snapshot = acquisition.get_snapshot()
+    if snapshot is None:
+        print("Error logging sensor data: the I/O backend is not initialized")
+        return False
+
+    if not writer.submit(snapshot, experiment_id):
+        print("Error logging sensor data: writer queue is full or not running")
+        return False
+    return True
@@ -0,0 +1,190 @@
+# app/recording.py
+import time
+import threading
+from collections import deque
+from datetime import datetime
+
+from . import acquisition
+from . import writer
+
+DEFAULT_RATE_HZ = 10.0
+MAX_RATE_HZ = 100.0
+RATE_WINDOW = 100
+
+
+class Recorder:
+    """Logs acquisition snapshots for one experiment at a fixed rate.
+
+    The recorder subscribes to the acquisition engine and forwards a
+    snapshot to the sensor writer whenever a sample is due at the requested
+    rate, so rates that do not divide the acquisition rate are still kept on
+    average. The acquisition rate is raised for the duration of the
+    recording if it is below the requested rate. It stops on its own once
+    the experiment duration has elapsed, checked on every scan and by a
+    timer in case acquisition stalls; without a duration it runs until
+    stopped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = False
+        self._state = {}
+        self._times = deque(maxlen=RATE_WINDOW)
+        self._timer = None
+
+    def start(self, experiment_id, rate_hz, duration_s=None, max_rate_hz=MAX_RATE_HZ):
+        rate_hz = float(rate_hz)
+        if duration_s is not None:
+            duration_s = float(duration_s)
+        if rate_hz <= 0 or rate_hz > max_rate_hz:
+            return {"success": False, "error": f"Recording rate must be between 0 and {max_rate_hz:g} Hz"}
+        if duration_s is not None and duration_s <= 0:
+            return {"success": False, "error": "Recording duration must be positive"}
+
+        with self._lock:
+            if self._active:
+                return {"success": False,
+                        "error": f"Experiment {self._state['experiment_id']} is already recording"}
+
+            engine = acquisition.engine
+            previous_rate = engine.rate_hz
+            raised_rate = None
+            if engine.rate_hz < rate_hz:
+                engine.set_rate(rate_hz)
+                raised_rate = engine.rate_hz
+
+            now = time.monotonic()
+            self._times.clear()
+            self._state = {
+                'experiment_id': int(experiment_id),
+                'rate_hz': rate_hz,
+                'duration_s': duration_s,
+                'period': 1.0 / rate_hz,
+                # Set when this recording raised the acquisition rate
+                'previous_acquisition_rate_hz': previous_rate,
+                'raised_acquisition_rate_hz': raised_rate,
+                'next_due': now,
+                'started_at': datetime.now(),
+                'started': now,
+                'ends': now + duration_s if duration_s is not None else float('inf'),
+                'submitted': 0,
+                'dropped_queue': 0,
+                'dropped_missed': 0,
+                'written_at_start': writer.get_written(int(experiment_id)),
+                'stopped_at': None,
+                'stop_reason': None,
+            }
+            self._active = True
+            engine.subscribe(self._on_snapshot)
+            if duration_s is not None:
+                self._timer = threading.Timer(duration_s, self.stop, ('completed', self._state))
+                self._timer.daemon = True
+                self._timer.start()
+
+        length = f"for {duration_s:g} s" if duration_s is not None else "until stopped"
+        print(f"Recording experiment {experiment_id} at {rate_hz:g} Hz {length}")
+        return {"success": True, "status": self.status()}
+
+    def stop(self, reason='stopped', recording=None):
+        """Stop the recording (only if it is still `recording`, a state dict, when given)."""
+        with self._lock:
+            if not self._active or (recording is not None and recording is not self._state):
+                return {"success": False, "error": "No recording in progress"}
+            self._active = False
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            engine = acquisition.engine
+            engine.unsubscribe(self._on_snapshot)
+            # Leave the rate alone if someone else changed it during the recording
+            if self._state['raised_acquisition_rate_hz'] == engine.rate_hz:
+                engine.set_rate(self._state['previous_acquisition_rate_hz'])
+            self._state['stopped_at'] = datetime.now()
+            self._state['stopped'] = time.monotonic()
+            self._state['stop_reason'] = reason
+
+        # Queued behind the recording's last scans, so the summary is complete
+        writer.finalize_experiment(self._state['experiment_id'])
+        print(f"Recording of experiment {self._state['experiment_id']} {reason}")
+        return {"success": True, "status": self.status()}
+
+    def _on_snapshot(self, snapshot):
+        """Acquisition subscriber: forward the snapshots due at the recording rate to the writer."""
+        state = self._state
+        if not self._active:
+            return
+        if snapshot.monotonic >= state['ends']:
+            self.stop('completed', state)
+            return
+
+        # A scan up to half an acquisition period early takes the slot, so
+        # jitter does not push samples to the next scan
+        due, period = state['next_due'], state['period']
+        if snapshot.monotonic < due - acquisition.engine.period / 2:
+            return
+        # Slots with no scan (the acquisition thread was overloaded) count as dropped
+        missed = int((snapshot.monotonic - due) // period)
+        if missed > 0:
+            state['dropped_missed'] += missed
+            due += missed * period
+        state['next_due'] = due + period
+        if writer.submit(snapshot, state['experiment_id']):
+            state['submitted'] += 1
+            self._times.append(snapshot.monotonic)
+        else:
+            state['dropped_queue'] += 1
+
+    def live_rate(self):
+        """Samples per second actually forwarded over the last RATE_WINDOW samples."""
+        times = list(self._times)
+        if len(times) < 2 or times[-1] == times[0]:
+            return 0.0
+        return (len(times) - 1) / (times[-1] - times[0])
+
+    def status(self):
+        state = dict(self._state)
+        if not state:
+            return {"active": False}
+
+        end = state.get('stopped') if not self._active else time.monotonic()
+        elapsed = (end or time.monotonic()) - state['started']
+        if not self._active:
+            remaining = 0.0
+        elif state['duration_s'] is None:
+            remaining = None  # Until stopped
+        else:
+            remaining = round(max(0.0, state['duration_s'] - elapsed), 1)
+        return {
+            "active": self._active,
+            "experiment_id": state['experiment_id'],
+            "rate_hz": state['rate_hz'],
+            "live_rate_hz": round(self.live_rate(), 2) if self._active else 0.0,
+            "average_rate_hz": round(state['submitted'] / elapsed, 2) if elapsed > 0 else 0.0,
+            "acquisition_rate_hz": acquisition.engine.rate_hz,
+            "started_at": state['started_at'].isoformat(),
+            "stopped_at": state['stopped_at'].isoformat() if state['stopped_at'] else None,
+            "stop_reason": state['stop_reason'],
+            "elapsed_s": round(elapsed, 1),
+            "duration_s": state['duration_s'],
+            "remaining_s": remaining,
+            "samples_submitted": state['submitted'],
+            "rows_written": writer.get_written(state['experiment_id']) - state['written_at_start'],
+            "dropped_samples": state['dropped_queue'] + state['dropped_missed'],
+            "dropped_queue_full": state['dropped_queue'],
+            "dropped_missed_scans": state['dropped_missed'],
+        }
+
+
+recorder = Recorder()
+
+
+def start(experiment_id, rate_hz=DEFAULT_RATE_HZ, duration_s=None, max_rate_hz=MAX_RATE_HZ):
+    return recorder.start(experiment_id, rate_hz, duration_s, max_rate_hz)
+
+
+def stop():
+    return recorder.stop()
+
+
+def status():
+    return recorder.status()
@@ -0,0 +1,323 @@
+# app/remote.py
+"""Web worker side of the acquisition daemon (IO_MODE=client).
+
+connect() attaches to the daemon and install() replaces the objects the API
+uses in-process with proxies: the acquisition engine and the history read
+the daemon's shared memory or ask it over IPC, and output writes,
+recordings, sequences, logged scans and database queries are commands to
+the daemon, which owns the database. The API modules keep calling
+acquisition.get_snapshot(), pi_io.set_gpio(), db.get_db() and so on
+unchanged.
+"""
+import time
+import threading
+
+from . import acquisition
+from . import backends
+from . import history
+from . import ipc
+from . import pi_io
+from . import recording
+from . import sequencer
+from . import shared_state
+from . import startup
+from . import writer
+
+# How often the poller looks for a new snapshot or output change (s)
+POLL_INTERVAL = 0.005
+# How long attach() waits for the daemon's shared state to appear (s)
+CONNECT_TIMEOUT = 10.0
+# How long a query may run in the daemon (s); exports of long experiments are slow
+QUERY_TIMEOUT = 300.0
+
+client = None
+state = None
+
+
+class RemoteEngine:
+    """Stands in for acquisition.engine, reading snapshots from shared memory.
+
+    A poller thread calls subscribers with every new snapshot and adopts
+    output changes made through other workers, like the acquisition thread
+    does in-process.
+    """
+
+    def __init__(self, reader, client):
+        self._reader = reader
+        self._client = client
+        self._subscribers = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def rate_hz(self):
+        stats = self._reader.acquisition_stats()
+        return stats['rate_hz'] if stats else acquisition.DEFAULT_RATE_HZ
+
+    @property
+    def period(self):
+        return 1.0 / self.rate_hz
+
+    def subscribe(self, callback):
+        self._subscribers = self._subscribers + [callback]
+
+    def unsubscribe(self, callback):
+        self._subscribers = [cb for cb in self._subscribers if cb is not callback]
+
+    def get_snapshot(self):
+        return self._reader.snapshot()
+
+    def scan_once(self, deadline=None):
+        """Wait for the daemon's first snapshot (workers never scan themselves)."""
+        waited = time.monotonic() + CONNECT_TIMEOUT
+        while time.monotonic() < waited:
+            snapshot = self._reader.snapshot()
+            if snapshot is not None:
+                return snapshot
+            time.sleep(POLL_INTERVAL)
+        raise RuntimeError("The acquisition daemon has not published a snapshot")
+
+    def get_or_scan(self):
+        return self.scan_once()
+
+    def set_rate(self, rate_hz):
+        self._client.call('set_rate', float(rate_hz))
+
+    def jitter_stats(self):
+        stats = self._reader.acquisition_stats()
+        if stats is None:
+            return {"mean_ms": 0.0, "max_ms": 0.0, "window": 0, "overruns": 0}
+        return dict(stats['jitter'])
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='shared-state-poller', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        reader = self._reader
+        last_seq = 0
+        outputs_version = 0
+        while not self._stop.wait(POLL_INTERVAL):
+            try:
+                outputs = reader.outputs()
+                if outputs is not None and outputs[0] != outputs_version:
+                    outputs_version = outputs[0]
+                    pi_io.sync_outputs(outputs[1], outputs[2])
+                if reader.last_seq() == last_seq:
+                    continue
+                snapshot = reader.snapshot()
+            except Exception as e:
+                print(f"Error reading shared state: {e}")
+                continue
+            if snapshot is None:
+                continue
+            last_seq = snapshot.seq
+            for callback in self._subscribers:
+                try:
+                    callback(snapshot)
+                except Exception as e:
+                    print(f"Error in acquisition subscriber {callback!r}: {e}")
+
+
+class RemoteHistory:
+    """Stands in for history.buffer; the ring buffer lives in the daemon."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def since(self, seq=0, limit=history.MAX_RESPONSE_SAMPLES):
+        return self._client.call('history_since', seq, limit)
+
+
+class RemoteBackend(backends.Backend):
+    """Stands in for pi_io.backend: output writes are executed by the daemon.
+
+    pi_io.set_gpio/set_pwm still validate and publish the new state
+    locally; the daemon applies the write under its own output locks, which
+    serialize every worker.
+    """
+    name = 'daemon'
+
+    def __init__(self, client):
+        self._client = client
+
+    def write_output(self, pin, state):
+        result = self._client.call('set_gpio', pin, state)
+        if not result.get('success'):
+            raise RuntimeError(result.get('error'))
+
+    def write_pwm(self, pin, duty_cycle):
+        result = self._client.call('set_pwm', pin, duty_cycle)
+        if not result.get('success'):
+            raise RuntimeError(result.get('error'))
+
+    def write_batch(self, states, duties):
+        # One round trip; the daemon writes the whole batch under its locks
+        return self._client.call('apply_outputs', states, duties)
+
+    def close(self):
+        self._client.close()
+
+    def status(self):
+        return dict(self._client.call('backend_status'), mode='client')
+
+
+class RemoteScheduler:
+    """Stands in for sequencer.scheduler; sequences run in the daemon, next to the hardware."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def start(self, steps, name=None):
+        return self._client.call('sequence_start', steps, name)
+
+    def cancel(self, sequence_id):
+        return self._client.call('sequence_cancel', sequence_id)
+
+    def status(self, sequence_id):
+        return self._client.call('sequence_status', sequence_id)
+
+    def list_all(self):
+        return self._client.call('sequence_list')
+
+    def stop(self, timeout=2.0):
+        # The daemon's sequences outlive this worker
+        pass
+
+    def active(self):
+        return 0
+
+
+class RemoteRecorder:
+    """Stands in for recording.recorder; the daemon subscribes to every scan and writes the rows."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def start(self, experiment_id, rate_hz, duration_s=None, max_rate_hz=recording.MAX_RATE_HZ):
+        return self._client.call('recording_start', experiment_id, rate_hz, duration_s, max_rate_hz)
+
+    def stop(self, reason='stopped'):
+        return self._client.call('recording_stop', reason)
+
+    def status(self):
+        return self._client.call('recording_status')
+
+
+class RemoteWriter:
+    """Stands in for writer.writer; the daemon spools the scans and ingests them."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def submit(self, snapshot, experiment_id=None):
+        return self._client.call('spool_append', snapshot.timestamp, dict(snapshot.values), experiment_id)
+
+    def finalize_experiment(self, experiment_id):
+        return self._client.call('spool_finalize', experiment_id)
+
+    def get_written(self, experiment_id):
+        return self._client.call('writer_written', experiment_id)
+
+    def get_metrics(self):
+        return self._client.call('writer_metrics')
+
+    def is_running(self):
+        return self.get_metrics()['running']
+
+    def stop(self, timeout=10.0):
+        # The daemon's writer outlives this worker
+        pass
+
+
+class RemoteCursor:
+    """Stands in for a DuckDB cursor: each statement runs in the daemon.
+
+    The rows come back whole with the reply. Every statement commits on its
+    own, so callers cannot hold a transaction open across statements.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._rows = []
+        self._next = 0
+
+    def execute(self, query, parameters=None):
+        self._rows = self._client.call_within(QUERY_TIMEOUT, 'db_execute', query, parameters)
+        self._next = 0
+        return self
+
+    def fetchone(self):
+        if self._next >= len(self._rows):
+            return None
+        self._next += 1
+        return self._rows[self._next - 1]
+
+    def fetchall(self):
+        rows = self._rows[self._next:]
+        self._next = len(self._rows)
+        return rows
+
+    def cursor(self):
+        return RemoteCursor(self._client)
+
+    def close(self):
+        pass
+
+
+def connect(socket_path, secret, shm_name):
+    """Attach to the daemon's shared state and command socket, waiting for it to start."""
+    global client, state
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            state = shared_state.Reader(shm_name)
+            break
+        except FileNotFoundError:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"Acquisition daemon not running (no shared state {shm_name!r})")
+            time.sleep(0.2)
+    client = ipc.Client(socket_path, secret)
+    client.call('ping')
+    return client
+
+
+def install():
+    """Point acquisition, history, pi_io, recording, the sequencer and the writer at the daemon."""
+    engine = acquisition.engine = RemoteEngine(state, client)
+    history.buffer = RemoteHistory(client)
+    recording.recorder = RemoteRecorder(client)
+    sequencer.scheduler = RemoteScheduler(client)
+    writer.writer = RemoteWriter(client)
+    pi_io.backend = RemoteBackend(client)
+    outputs = state.outputs()
+    if outputs is not None:
+        pi_io.sync_outputs(outputs[1], outputs[2])
+    print(f"Attached to acquisition daemon (pid {state.pid}) at {client.address}")
+    return engine
+
+
+def cursor():
+    """Cursor factory for db.use_remote; waits for the warm-up to attach to the daemon."""
+    if client is None:
+        startup.wait_ready(startup.READY_TIMEOUT)
+    if client is None:
+        raise RuntimeError("Not attached to the acquisition daemon")
+    return RemoteCursor(client)
+
+
+def close():
+    if state is not None:
+        state.close()
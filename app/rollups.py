@@ -0,0 +1,216 @@
+# app/rollups.py
+import math
+
+from . import compression
+from . import db
+
+MINUTE_TABLE = 'sensor_rollups'
+SUMMARY_TABLE = 'experiment_summaries'
+
+_AGGREGATES = """
+    count(value) AS n, min(value) AS min_value, max(value) AS max_value,
+    sum(value) AS sum_value, sum(CAST(value AS DOUBLE) * value) AS sum_sq
+"""
+
+_MERGE = """
+    n = n + EXCLUDED.n,
+    min_value = least(min_value, EXCLUDED.min_value),
+    max_value = greatest(max_value, EXCLUDED.max_value),
+    sum_value = sum_value + EXCLUDED.sum_value,
+    sum_sq = sum_sq + EXCLUDED.sum_sq
+"""
+
+
+def ensure_schema(conn, rebuild_all=False):
+    """Create the per-minute and per-experiment rollup tables.
+
+    Scans stored before the tables existed are folded in once on creation;
+    `rebuild_all` recomputes them even if the tables already exist.
+    """
+    backfill = rebuild_all or db.table_type(conn, SUMMARY_TABLE) is None
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {MINUTE_TABLE} (
+        experiment_id INTEGER NOT NULL,
+        minute TIMESTAMP NOT NULL,
+        sensor_tag VARCHAR NOT NULL,
+        n BIGINT NOT NULL,
+        min_value DOUBLE,
+        max_value DOUBLE,
+        sum_value DOUBLE,
+        sum_sq DOUBLE,
+        PRIMARY KEY (experiment_id, minute, sensor_tag)
+    )
+    ''')
+    conn.execute(f'''
+    CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} (
+        experiment_id INTEGER NOT NULL,
+        sensor_tag VARCHAR NOT NULL,
+        n BIGINT NOT NULL,
+        min_value DOUBLE,
+        max_value DOUBLE,
+        sum_value DOUBLE,
+        sum_sq DOUBLE,
+        first_timestamp TIMESTAMP,
+        last_timestamp TIMESTAMP,
+        finalized_at TIMESTAMP,
+        PRIMARY KEY (experiment_id, sensor_tag)
+    )
+    ''')
+    if backfill:
+        rebuild(conn)
+
+
+def _unpivoted_scans(conn, table):
+    """SQL for `table` rows with IDs in [?, ?] as (experiment_id, timestamp, sensor_tag, value)."""
+    columns = db.stored_columns(conn)
+    renamed = ", ".join(f'"{column}" AS "{tag}"' for tag, column in columns)
+    tags = ", ".join(f'"{tag}"' for tag, _ in columns)
+    return f"""
+    UNPIVOT (
+        SELECT experiment_id, timestamp, {renamed}
+        FROM {table}
+        WHERE id BETWEEN ? AND ? AND experiment_id IS NOT NULL
+    ) ON {tags} INTO NAME sensor_tag VALUE value
+    """
+
+
+def update(conn, first_id, last_id, table=db.SCAN_TABLE):
+    """Fold the scans with IDs in [first_id, last_id] into the rollups.
+
+    Called by the writer right after it inserts a batch, in the same
+    transaction, so the rollups always match the stored scans. `table` is
+    sensor_scans, the writer's staging table (which still has the values of
+    compressed channels) or the sensor_scans_full view.
+    """
+    source = _unpivoted_scans(conn, table)
+    conn.execute(
+        f"""
+        INSERT INTO {MINUTE_TABLE}
+        SELECT experiment_id, date_trunc('minute', timestamp), sensor_tag, {_AGGREGATES}
+        FROM ({source})
+        GROUP BY ALL
+        ON CONFLICT DO UPDATE SET {_MERGE}
+        """,
+        (first_id, last_id)
+    )
+    conn.execute(
+        f"""
+        INSERT INTO {SUMMARY_TABLE}
+        SELECT experiment_id, sensor_tag, {_AGGREGATES},
+               min(timestamp), max(timestamp), NULL
+        FROM ({source})
+        GROUP BY ALL
+        ON CONFLICT DO UPDATE SET {_MERGE},
+            first_timestamp = least(first_timestamp, EXCLUDED.first_timestamp),
+            last_timestamp = greatest(last_timestamp, EXCLUDED.last_timestamp),
+            finalized_at = NULL
+        """,
+        (first_id, last_id)
+    )
+
+
+def rebuild(conn):
+    """Recompute every rollup from sensor_scans_full (after a migration or import).
+
+    Compressed channels contribute their rebuilt values.
+    """
+    conn.execute(f"DELETE FROM {MINUTE_TABLE}")
+    conn.execute(f"DELETE FROM {SUMMARY_TABLE}")
+    first_id, last_id = conn.execute(
+        f"SELECT min(id), max(id) FROM {db.SCAN_TABLE}"
+    ).fetchone()
+    if first_id is not None:
+        update(conn, first_id, last_id, compression.FULL_VIEW)
+        conn.execute(
+            f"UPDATE {SUMMARY_TABLE} SET finalized_at = CURRENT_TIMESTAMP"
+        )
+
+
+def finalize(conn, experiment_id):
+    """Mark an experiment's summary as complete once its recording has stopped."""
+    conn.execute(
+        f"UPDATE {SUMMARY_TABLE} SET finalized_at = CURRENT_TIMESTAMP WHERE experiment_id = ?",
+        (experiment_id,)
+    )
+
+
+def _stats(n, min_value, max_value, sum_value, sum_sq):
+    mean = sum_value / n if n else None
+    std = None
+    if n and n > 1:
+        variance = max(0.0, (sum_sq - sum_value * sum_value / n) / (n - 1))
+        std = math.sqrt(variance)
+    return {"count": n, "min": min_value, "max": max_value, "mean": mean, "std": std}
+
+
+def list_experiments(conn):
+    """All experiments with their sample counts, read only from the rollups."""
+    rows = conn.execute(
+        f"""
+        SELECT e.id, e.user_id, e.fuel_type, e.hydrogen_usage, e.hydrogen_type,
+               e.test_duration, e.created_at,
+               max(s.n), min(s.first_timestamp), max(s.last_timestamp), max(s.finalized_at)
+        FROM experiments e
+        LEFT JOIN {SUMMARY_TABLE} s ON s.experiment_id = e.id
+        GROUP BY ALL
+        ORDER BY e.id DESC
+        """
+    ).fetchall()
+    return [
+        {
+            "id": row[0],
+            "user_id": row[1],
+            "fuel_type": row[2],
+            "hydrogen_usage": row[3],
+            "hydrogen_type": row[4],
+            "test_duration": row[5],
+            "created_at": row[6].isoformat() if row[6] else None,
+            "samples": row[7] or 0,
+            "first_timestamp": row[8].isoformat() if row[8] else None,
+            "last_timestamp": row[9].isoformat() if row[9] else None,
+            "finalized_at": row[10].isoformat() if row[10] else None,
+        }
+        for row in rows
+    ]
+
+
+def experiment_summary(conn, experiment_id, per_minute=False):
+    """Per-channel count/min/max/mean/std of an experiment, from the rollups."""
+    rows = conn.execute(
+        f"""
+        SELECT sensor_tag, n, min_value, max_value, sum_value, sum_sq,
+               first_timestamp, last_timestamp, finalized_at
+        FROM {SUMMARY_TABLE}
+        WHERE experiment_id = ?
+        ORDER BY sensor_tag
+        """,
+        (experiment_id,)
+    ).fetchall()
+
+    summary = {
+        "experiment_id": experiment_id,
+        "finalized_at": None,
+        "first_timestamp": None,
+        "last_timestamp": None,
+        "channels": {},
+    }
+    for tag, n, min_value, max_value, sum_value, sum_sq, first, last, finalized in rows:
+        summary["channels"][tag] = _stats(n, min_value, max_value, sum_value, sum_sq)
+        summary["first_timestamp"] = first.isoformat() if first else None
+        summary["last_timestamp"] = last.isoformat() if last else None
+        summary["finalized_at"] = finalized.isoformat() if finalized else None
+
+    if per_minute:
+        minutes = conn.execute(
+            f"""
+            SELECT epoch_ms(minute), sensor_tag, n, min_value, max_value, sum_value, sum_sq
+            FROM {MINUTE_TABLE}
+            WHERE experiment_id = ?
+            ORDER BY minute, sensor_tag
+            """,
+            (experiment_id,)
+        ).fetchall()
+        summary["minutes"] = {}
+        for minute, tag, *values in minutes:
+            summary["minutes"].setdefault(tag, []).append(dict(_stats(*values), t=minute))
+    return summary
@@ -57,13 +57,14 @@ def save_experiment():
         
         # Save experiment to database
         conn = db.get_db()
+        next_id = conn.execute("SELECT nextval('experiment_id_seq')").fetchone()[0]
         conn.execute(
             """
             INSERT INTO experiments 
-            (user_id, fuel_type, hydrogen_usage, hydrogen_type, test_duration) 
-            VALUES (?, ?, ?, ?, ?)
+            (id, user_id, fuel_type, hydrogen_usage, hydrogen_type, test_duration) 
+            VALUES (?, ?, ?, ?, ?, ?)
             """,
-            (g.user['id'], fuel_type, hydrogen_usage, hydrogen_type, test_duration)
+            (next_id, g.user['id'], fuel_type, hydrogen_usage, hydrogen_type, test_duration)
         )
         
         return redirect(url_for('main.experiment_data'))
@@ -0,0 +1,148 @@
+# app/schemas.py
+from datetime import datetime
+from typing import Annotated, Literal, Optional, Union
+
+import msgspec
+
+from .pi_io import CHIPS, OUTPUT_PINS, PWM_PINS
+
+JSON_MIMETYPE = 'application/json'
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_MIMETYPES = (MSGPACK_MIMETYPE, 'application/x-msgpack')
+
+
+class JitterStats(msgspec.Struct):
+    mean_ms: float
+    max_ms: float
+    window: int
+    overruns: int
+
+
+# Body of /api/adc-values: one list of raw counts per configured chip, under the
+# chip name ({"mcp1": [...], "mcp2": [...], "eu": {...}, "seq": ...}), then the
+# scan metadata.
+ADCSnapshot = msgspec.defstruct(
+    'ADCSnapshot',
+    [(f'chip{chip.index}', list[float]) for chip in CHIPS] + [
+        # Engineering values per chip, None where nothing is wired
+        ('eu', dict[str, list[Optional[float]]]),
+        ('seq', int),
+        ('timestamp', datetime),
+        ('scan_duration_ms', float),
+        ('jitter_ms', float),
+        ('rate_hz', float),
+        ('jitter', JitterStats),
+    ],
+    rename={f'chip{chip.index}': chip.name for chip in CHIPS},
+)
+
+
+# Output state is served as {"<pin>": bool, ..., "pwm": {"<pin>": duty}}, so the
+# Structs are generated from the pin tables with the pin numbers as field names
+# on the wire.
+PWMStates = msgspec.defstruct(
+    'PWMStates',
+    [(f'gpio{pin}', int) for pin in PWM_PINS],
+    rename={f'gpio{pin}': str(pin) for pin in PWM_PINS},
+)
+
+GPIOStates = msgspec.defstruct(
+    'GPIOStates',
+    [(f'gpio{pin}', bool) for pin in OUTPUT_PINS] + [('pwm', PWMStates)],
+    rename={f'gpio{pin}': str(pin) for pin in OUTPUT_PINS},
+)
+
+
+class SetGPIORequest(msgspec.Struct):
+    gpio: int
+    state: bool
+
+
+class SetPWMRequest(msgspec.Struct):
+    gpio: int
+    value: Annotated[int, msgspec.Meta(ge=0, le=100)]
+
+
+class IOOperation(msgspec.Struct):
+    gpio: int
+    # An on/off output takes a state, a PWM output a duty cycle
+    state: Optional[bool] = None
+    value: Optional[Annotated[int, msgspec.Meta(ge=0, le=100)]] = None
+
+
+class IOBatchRequest(msgspec.Struct):
+    operations: Annotated[list[IOOperation], msgspec.Meta(min_length=1)]
+
+
+# Sequence steps (see sequencer.py), told apart by their "action" field
+class SetStep(msgspec.Struct, tag_field='action', tag='set'):
+    outputs: Annotated[list[IOOperation], msgspec.Meta(min_length=1)]
+
+
+class WaitStep(msgspec.Struct, tag_field='action', tag='wait'):
+    seconds: Annotated[float, msgspec.Meta(ge=0)]
+
+
+class WaitUntilStep(msgspec.Struct, tag_field='action', tag='wait_until'):
+    # Sensor tag from the I/O config, compared in engineering units unless raw
+    channel: str
+    op: Literal['>', '>=', '<', '<=', '==', '!=']
+    value: float
+    raw: bool = False
+    timeout_s: Optional[Annotated[float, msgspec.Meta(gt=0)]] = None
+
+
+class MarkStep(msgspec.Struct, tag_field='action', tag='mark'):
+    # Named event in the step log, e.g. for the UI to follow the sequence
+    name: str
+
+
+SequenceStep = Union[SetStep, WaitStep, WaitUntilStep, MarkStep]
+
+
+class SequenceRequest(msgspec.Struct):
+    steps: Annotated[list[SequenceStep], msgspec.Meta(min_length=1)]
+    name: Optional[str] = None
+
+
+class LogSensorDataRequest(msgspec.Struct):
+    experiment_id: Optional[int] = None
+
+
+class Result(msgspec.Struct, omit_defaults=True):
+    success: bool
+    error: Optional[str] = None
+
+
+class IOBatchResult(msgspec.Struct, omit_defaults=True):
+    success: bool
+    # One per operation, in request order
+    results: list[Result] = []
+    # When the combined state took effect (omitted if nothing was written)
+    timestamp: Optional[datetime] = None
+    states: Optional[GPIOStates] = None
+    error: Optional[str] = None
+
+
+# Encoders and decoders are built once; msgspec caches the type information
+ENCODERS = {
+    JSON_MIMETYPE: msgspec.json.Encoder(),
+    MSGPACK_MIMETYPE: msgspec.msgpack.Encoder(),
+}
+
+_DECODERS = {}
+
+
+def decode(body, cls, mimetype=JSON_MIMETYPE):
+    """Decode and validate a request body as `cls`.
+
+    Decoding is lax, so the strings sent by HTML form values ("12", "true")
+    are accepted for int and bool fields. Raises msgspec.ValidationError or
+    msgspec.DecodeError.
+    """
+    binary = mimetype in MSGPACK_MIMETYPES
+    decoder = _DECODERS.get((cls, binary))
+    if decoder is None:
+        module = msgspec.msgpack if binary else msgspec.json
+        decoder = _DECODERS[(cls, binary)] = module.Decoder(cls, strict=False)
+    return decoder.decode(body)
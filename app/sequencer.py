@@ -0,0 +1,360 @@
+# app/sequencer.py
+"""Server-side test sequences: timed output changes and sensor conditions.
+
+A sequence is a list of declarative steps (schemas.SequenceStep):
+
+    {"action": "set", "outputs": [{"gpio": 17, "state": true}, {"gpio": 12, "value": 40}]}
+    {"action": "wait", "seconds": 5}
+    {"action": "wait_until", "channel": "MOTOR_ATIVO", "op": ">=", "value": 50, "timeout_s": 30}
+    {"action": "mark", "name": "injecao_diesel"}
+
+One scheduler thread runs every sequence: timed steps wait in a heap keyed
+by their due time on the monotonic clock, and wait_until steps are checked
+against each acquisition snapshot. Steps are planned from the plan, not
+from when the previous step actually ran, so lateness does not add up over
+a sequence. Every step is logged with its planned and actual time.
+"""
+import heapq
+import itertools
+import operator
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import msgspec
+
+from . import acquisition
+from . import channels
+from . import metrics
+from . import pi_io
+from . import schemas
+
+# Finished sequences kept for /api/sequences
+KEEP_FINISHED = 50
+
+OPERATORS = {
+    '>': operator.gt, '>=': operator.ge, '<': operator.lt,
+    '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+}
+
+class Sequence:
+    """One run of a step list. Only the scheduler thread runs its steps.
+
+    `lock` is held while a step runs, so a cancel either lands before the
+    step starts or waits for it to finish.
+    """
+
+    def __init__(self, sequence_id, name, steps):
+        self.id = sequence_id
+        self.lock = threading.RLock()
+        # Set by a cancel before it waits for the step in progress: no
+        # further step starts and only the cancel may finish the sequence
+        self.cancelled = False
+        self.name = name
+        self.steps = steps
+        self.state = 'running'
+        self.error = None
+        self.index = 0
+        # Monotonic time the current step was planned for
+        self.planned = time.monotonic()
+        # Maps the monotonic clock to wall-clock times for the log
+        self.started_at = datetime.now()
+        self.started = self.planned
+        self.finished_at = None
+        self.log = []
+
+    def wall(self, monotonic):
+        return self.started_at + timedelta(seconds=monotonic - self.started)
+
+    def status(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "error": self.error,
+            "step": self.index,
+            "steps": len(self.steps),
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "log": list(self.log),
+        }
+
+
+class Scheduler:
+    """Runs many sequences on one thread."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._heap = []  # (due monotonic, tiebreak, sequence, step index)
+        self._waiting = []  # Sequences blocked on a wait_until step
+        self._snapshot = None  # Latest snapshot not yet checked against _waiting
+        self._sequences = OrderedDict()
+        self._ids = itertools.count(1)
+        self._tiebreak = itertools.count()
+        self._thread = None
+        self._stopping = False
+
+    def start(self, steps, name=None):
+        """Validate `steps` (builtins, as sent to /api/sequences) and run them."""
+        try:
+            steps = msgspec.convert(steps, list[schemas.SequenceStep])
+        except msgspec.ValidationError as e:
+            return {"success": False, "error": f"Invalid sequence: {e}"}
+        if not steps:
+            return {"success": False, "error": "A sequence needs at least one step"}
+        for step in steps:
+            if isinstance(step, schemas.WaitUntilStep) and step.channel not in channels.LAYOUT.by_tag:
+                return {"success": False, "error": f"Unknown channel: {step.channel}"}
+
+        with self._cond:
+            if self._thread is None:
+                self._stopping = False
+                acquisition.engine.subscribe(self._on_snapshot)
+                self._thread = threading.Thread(target=self._run, name='sequencer', daemon=True)
+                self._thread.start()
+            sequence = Sequence(next(self._ids), name, steps)
+            self._sequences[sequence.id] = sequence
+            self._trim()
+            self._schedule(sequence, sequence.planned)
+
+        print(f"Sequence {sequence.id} ({name or 'unnamed'}) started with {len(steps)} steps")
+        return {"success": True, "sequence": sequence.status()}
+
+    def cancel(self, sequence_id):
+        sequence = self._sequences.get(sequence_id)
+        if sequence is None:
+            return {"success": False, "error": f"Sequence {sequence_id} not found"}
+        if sequence.state != 'running' or not self._cancel(sequence):
+            return {"success": False, "error": f"Sequence {sequence_id} is already {sequence.state}"}
+        return {"success": True, "sequence": sequence.status()}
+
+    def status(self, sequence_id):
+        sequence = self._sequences.get(sequence_id)
+        if sequence is None:
+            return {"success": False, "error": f"Sequence {sequence_id} not found"}
+        return {"success": True, "sequence": sequence.status()}
+
+    def list_all(self):
+        return {
+            "success": True,
+            "sequences": [
+                {key: value for key, value in sequence.status().items() if key != 'log'}
+                for sequence in list(self._sequences.values())
+            ],
+        }
+
+    def stop(self, timeout=2.0):
+        """Cancel every running sequence and stop the scheduler thread."""
+        for sequence in list(self._sequences.values()):
+            if sequence.state == 'running':
+                self._cancel(sequence)
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify()
+            thread, self._thread = self._thread, None
+        acquisition.engine.unsubscribe(self._on_snapshot)
+        thread.join(timeout)
+
+    def active(self):
+        return sum(1 for sequence in list(self._sequences.values()) if sequence.state == 'running')
+
+    # Scheduler thread
+
+    def _on_snapshot(self, snapshot):
+        """Acquisition subscriber: hand the scan to the scheduler if anything waits on one."""
+        if self._waiting:
+            with self._cond:
+                self._snapshot = snapshot
+                self._cond.notify()
+
+    def _schedule(self, sequence, due):
+        heapq.heappush(self._heap, (due, next(self._tiebreak), sequence, sequence.index))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    now = time.monotonic()
+                    if self._heap and self._heap[0][0] <= now:
+                        due, _, sequence, index = heapq.heappop(self._heap)
+                        snapshot = None
+                        break
+                    if self._snapshot is not None:
+                        snapshot, self._snapshot = self._snapshot, None
+                        sequence = None
+                        break
+                    self._cond.wait(self._heap[0][0] - now if self._heap else None)
+
+            try:
+                if sequence is not None:
+                    if sequence.state == 'running' and sequence.index == index:
+                        if sequence in self._waiting:
+                            self._timed_out(sequence)
+                        else:
+                            self._advance(sequence)
+                else:
+                    for sequence in list(self._waiting):
+                        self._check_condition(sequence, snapshot)
+            except Exception as e:
+                print(f"Error in sequencer: {e}")
+
+    def _advance(self, sequence):
+        """Run the steps of `sequence` that are due, up to the next wait."""
+        while self._step(sequence):
+            pass
+
+    def _step(self, sequence):
+        """Run the current step of `sequence`; True if the next one is due right away."""
+        with sequence.lock:
+            if sequence.state != 'running' or sequence.cancelled:
+                return False
+            if sequence.index >= len(sequence.steps):
+                self._finish(sequence, 'completed')
+                return False
+            step = sequence.steps[sequence.index]
+
+            if isinstance(step, schemas.WaitStep):
+                self._log(sequence, step, time.monotonic(), {"seconds": step.seconds})
+                sequence.planned += step.seconds
+                sequence.index += 1
+                with self._cond:
+                    self._schedule(sequence, sequence.planned)
+                return False
+
+            if isinstance(step, schemas.WaitUntilStep):
+                with self._cond:
+                    self._waiting.append(sequence)
+                    if step.timeout_s is not None:
+                        self._schedule(sequence, sequence.planned + step.timeout_s)
+                # The latest scan counts if it was taken after the step was due
+                snapshot = acquisition.engine.get_snapshot()
+                if snapshot is not None and snapshot.monotonic >= sequence.planned:
+                    self._check_condition(sequence, snapshot)
+                return False
+
+            if isinstance(step, schemas.SetStep):
+                result = pi_io.set_outputs([msgspec.structs.asdict(op) for op in step.outputs])
+                if result.get("timestamp") is not None:
+                    actual = sequence.started + (result["timestamp"] - sequence.started_at).total_seconds()
+                else:
+                    actual = time.monotonic()
+                self._log(sequence, step, actual, {"results": result["results"]},
+                          None if result["success"] else result.get("error"))
+                if not result["success"]:
+                    self._finish(sequence, 'failed', f"Step {sequence.index}: {result.get('error')}")
+                    return False
+            else:
+                self._log(sequence, step, time.monotonic(), {"name": step.name})
+            sequence.index += 1
+            return True
+
+    def _check_condition(self, sequence, snapshot):
+        with sequence.lock:
+            if sequence.state != 'running' or sequence.cancelled or sequence not in self._waiting:
+                return
+            step = sequence.steps[sequence.index]
+            value = _channel_value(snapshot, step.channel, step.raw)
+            if value is None or not OPERATORS[step.op](value, step.value):
+                return
+            with self._cond:
+                self._waiting.remove(sequence)
+            self._log(sequence, step, snapshot.monotonic, {"seq": snapshot.seq, "value": value})
+            # Later steps are planned from the scan that met the condition
+            sequence.planned = snapshot.monotonic
+            sequence.index += 1
+        self._advance(sequence)
+
+    def _timed_out(self, sequence):
+        with sequence.lock:
+            if sequence.state != 'running' or sequence.cancelled:
+                return
+            step = sequence.steps[sequence.index]
+            with self._cond:
+                self._waiting.remove(sequence)
+            error = f"{step.channel} {step.op} {step.value:g} not met within {step.timeout_s:g} s"
+            self._log(sequence, step, time.monotonic(), {}, error)
+            self._finish(sequence, 'failed', f"Step {sequence.index}: {error}")
+
+    def _log(self, sequence, step, actual, detail, error=None):
+        # For wait_until, late_ms is how long the condition took to be met
+        late = actual - sequence.planned
+        action = type(step).__struct_config__.tag
+        if action != 'wait_until':
+            metrics.SEQUENCE_LATENESS_SECONDS.labels(action).observe(max(0.0, late))
+        sequence.log.append(dict(
+            detail,
+            index=sequence.index,
+            action=action,
+            planned_at=sequence.wall(sequence.planned).isoformat(),
+            actual_at=sequence.wall(actual).isoformat(),
+            late_ms=round(late * 1000, 3),
+            success=error is None,
+            error=error,
+        ))
+
+    def _cancel(self, sequence):
+        """Cancel `sequence` once its step in progress is done; its heap entries are skipped."""
+        sequence.cancelled = True
+        with sequence.lock:
+            return self._finish(sequence, 'cancelled')
+
+    def _finish(self, sequence, state, error=None):
+        """Move a running sequence to its final state; False if it already had one."""
+        with self._cond:
+            if sequence.state != 'running' or (sequence.cancelled and state != 'cancelled'):
+                return False
+            if sequence in self._waiting:
+                self._waiting.remove(sequence)
+            sequence.state = state
+            sequence.error = error
+            sequence.finished_at = datetime.now()
+        print(f"Sequence {sequence.id} {state}" + (f": {error}" if error else ""))
+        return True
+
+    def _trim(self):
+        finished = [s.id for s in self._sequences.values() if s.state != 'running']
+        for sequence_id in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._sequences[sequence_id]
+
+
+def _channel_value(snapshot, tag, raw=False):
+    """Value of a sensor tag in a snapshot, in engineering units unless `raw`."""
+    channel = channels.LAYOUT.by_tag[tag]
+    values = snapshot.values if raw or snapshot.eu is None else snapshot.eu
+    return values[channel.chip][channel.channel]
+
+
+scheduler = Scheduler()
+
+
+def start(steps, name=None):
+    return scheduler.start(steps, name)
+
+
+def cancel(sequence_id):
+    return scheduler.cancel(sequence_id)
+
+
+def status(sequence_id):
+    return scheduler.status(sequence_id)
+
+
+def list_sequences():
+    return scheduler.list_all()
+
+
+def stop():
+    scheduler.stop()
+
+
+@metrics.register_collector
+def _collect_metrics():
+    return [
+        ('sequences_active', 'gauge', 'Sequences currently running.', scheduler.active()),
+    ]
@@ -0,0 +1,138 @@
+# app/sessions.py
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from cachelib.base import BaseCache
+from cachelib.file import FileSystemCache
+from flask_session import Session
+from flask_session.cachelib import CacheLibSessionInterface
+
+BACKENDS = ('memory', 'cookie', 'filesystem')
+DEFAULT_MAX_SESSIONS = 256
+DEFAULT_TTL_S = 12 * 3600
+
+
+class LRUCache(BaseCache):
+    """Bounded, thread-safe in-process cache with TTL expiry and LRU eviction."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_SESSIONS, default_timeout=DEFAULT_TTL_S):
+        super().__init__(default_timeout)
+        self.max_entries = int(max_entries)
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _expires_at(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        # Never keep an entry longer than the configured TTL
+        if self.default_timeout:
+            timeout = min(timeout, self.default_timeout) if timeout else self.default_timeout
+        return time.monotonic() + timeout if timeout else float('inf')
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._items[key] = (self._expires_at(timeout), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            return self._items.pop(key, None) is not None
+
+    def has(self, key):
+        return self.get(key) is not None
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+        return True
+
+    def __len__(self):
+        return len(self._items)
+
+
+class MemorySessionInterface(CacheLibSessionInterface):
+    """Server-side sessions kept in an LRUCache.
+
+    If `legacy_dir` is given, a session ID that is not in memory is looked up
+    once in the old filesystem store and moved into memory, so users logged
+    in before switching backends stay logged in.
+    """
+
+    def __init__(self, client, legacy_dir=None, **kwargs):
+        super().__init__(client=client, **kwargs)
+        self.legacy = None
+        if legacy_dir and os.path.isdir(legacy_dir):
+            self.legacy = FileSystemCache(legacy_dir)
+        self.migrated = 0
+
+    def _retrieve_session_data(self, store_id):
+        data = self.cache.get(store_id)
+        if data is None and self.legacy is not None:
+            data = self.legacy.get(store_id)
+            if data is not None:
+                self.cache.set(store_id, data)
+                self.legacy.delete(store_id)
+                self.migrated += 1
+        return data
+
+
+def init_app(app):
+    """Install the session backend selected by app.config['SESSION_BACKEND'].
+
+    - 'memory': bounded in-process LRU store with TTL (SESSION_MAX_SESSIONS,
+      SESSION_TTL); sessions do not survive a restart.
+    - 'cookie': Flask's stateless signed cookie holding only the session keys
+      (user_id, username, ...); survives restarts as long as SECRET_KEY is stable.
+    - 'filesystem': the previous Flask-Session file store in SESSION_FILE_DIR.
+    """
+    backend = app.config.get('SESSION_BACKEND', 'memory')
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid session backend: {backend}")
+
+    if backend == 'cookie':
+        # Flask's default SecureCookieSessionInterface is already installed
+        print("Session backend: signed cookies")
+        return
+
+    if backend == 'filesystem':
+        app.config['SESSION_TYPE'] = 'filesystem'
+        os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
+        Session(app)
+        print(f"Session backend: filesystem ({app.config['SESSION_FILE_DIR']})")
+        return
+
+    cache = LRUCache(
+        max_entries=app.config.get('SESSION_MAX_SESSIONS', DEFAULT_MAX_SESSIONS),
+        default_timeout=app.config.get('SESSION_TTL', DEFAULT_TTL_S),
+    )
+    app.session_interface = MemorySessionInterface(
+        cache,
+        legacy_dir=app.config.get('SESSION_FILE_DIR'),
+        key_prefix=app.config.get('SESSION_KEY_PREFIX', 'session:'),
+        use_signer=app.config.get('SESSION_USE_SIGNER', True),
+        permanent=app.config.get('SESSION_PERMANENT', False),
+    )
+    print(f"Session backend: in-memory LRU ({cache.max_entries} sessions, "
+          f"TTL {cache.default_timeout} s)")
@@ -0,0 +1,218 @@
+# app/shared_state.py
+"""Latest ADC snapshot and output state in a shared-memory segment.
+
+The acquisition daemon (daemon.py) publishes every snapshot and every output
+change into one multiprocessing.shared_memory block; web workers map the same
+block and read it in place, without a round trip to the daemon. Layout
+(little endian, fixed size for the configured chips):
+
+    header    magic, pid of the publisher, number of values, outputs, PWM outputs
+    snapshot  counter, seq, timestamp (us), monotonic, scan duration, jitter,
+              acquisition rate, jitter mean/max (ms), window, overruns,
+              counts and engineering values (float64, NaN where unwired), crc
+    outputs   counter, version, on/off states, duty cycles, crc
+
+Each section is a seqlock: the publisher makes its counter odd, writes the
+section and makes it even again. A reader copies the section and keeps it
+only if the counter was even and unchanged around the copy and the CRC
+matches, otherwise it retries. Readers never block the publisher.
+"""
+import os
+import sys
+import time
+import zlib
+import struct
+import threading
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+from types import MappingProxyType
+
+from . import acquisition
+from . import channels
+
+DEFAULT_NAME = 'iati_gn_state'
+
+_MAGIC = b'IATISHM1'
+_CHIPS = tuple(chip.name for chip in channels.LAYOUT.chips)
+_VALUES = len(_CHIPS) * channels.CHANNELS_PER_CHIP
+_OUTPUTS = len(channels.LAYOUT.output_pins)
+_PWM = len(channels.LAYOUT.pwm_pins)
+
+_HEADER = struct.Struct('<8sQIII')
+_COUNTER = struct.Struct('<Q')
+_SNAPSHOT = struct.Struct(f'<QqddddddIQ{_VALUES}d{_VALUES}d')
+_OUTPUT_STATE = struct.Struct(f'<Q{_OUTPUTS}B{_PWM}B')
+_CRC = struct.Struct('<I')
+
+_SNAPSHOT_AT = _HEADER.size
+_SNAPSHOT_BODY = _SNAPSHOT_AT + _COUNTER.size
+_OUTPUTS_AT = _SNAPSHOT_BODY + _SNAPSHOT.size + _CRC.size
+_OUTPUTS_BODY = _OUTPUTS_AT + _COUNTER.size
+SIZE = _OUTPUTS_BODY + _OUTPUT_STATE.size + _CRC.size
+
+# Attempts before a reader gives up on a section being rewritten continuously
+READ_RETRIES = 100
+
+# Engineering value of an unwired channel (None in the snapshot)
+_UNWIRED = float('nan')
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class Publisher:
+    """Writing side, owned by the acquisition daemon."""
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        try:
+            # Left behind by a daemon that was killed
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = shared_memory.SharedMemory(name, create=True, size=SIZE)
+        self._buf = self._shm.buf
+        self._buf[:SIZE] = bytes(SIZE)
+        _HEADER.pack_into(self._buf, 0, _MAGIC, os.getpid(), _VALUES, _OUTPUTS, _PWM)
+        # Snapshots come from the acquisition thread, outputs from any request
+        self._snapshot_lock = threading.Lock()
+        self._outputs_lock = threading.Lock()
+        self._outputs_version = 0
+
+    def publish_snapshot(self, snapshot):
+        """Acquisition subscriber."""
+        engine = acquisition.engine
+        jitter = engine.jitter_stats()
+        values = [value for chip in _CHIPS for value in snapshot.values[chip]]
+        eu = [_UNWIRED if value is None else value for chip in _CHIPS for value in snapshot.eu[chip]]
+        body = _SNAPSHOT.pack(
+            snapshot.seq, (snapshot.timestamp - _EPOCH) // _MICROSECOND, snapshot.monotonic,
+            snapshot.scan_duration, snapshot.jitter, engine.rate_hz,
+            jitter['mean_ms'], jitter['max_ms'], jitter['window'], jitter['overruns'],
+            *values, *eu,
+        )
+        with self._snapshot_lock:
+            self._write(_SNAPSHOT_AT, body)
+
+    def publish_outputs(self, states):
+        """Output listener registered with pi_io."""
+        from . import pi_io
+        outputs, duties = pi_io.output_tuples()
+        with self._outputs_lock:
+            self._outputs_version += 1
+            self._write(_OUTPUTS_AT, _OUTPUT_STATE.pack(self._outputs_version, *outputs, *duties))
+
+    def _write(self, offset, body):
+        buf = self._buf
+        (counter,) = _COUNTER.unpack_from(buf, offset)
+        _COUNTER.pack_into(buf, offset, counter + 1)
+        start = offset + _COUNTER.size
+        buf[start:start + len(body)] = body
+        _CRC.pack_into(buf, start + len(body), zlib.crc32(body))
+        _COUNTER.pack_into(buf, offset, counter + 2)
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+class Reader:
+    """Reading side, used by web workers. Safe to share between threads."""
+
+    def __init__(self, name=DEFAULT_NAME):
+        self.name = name
+        self._shm = shared_memory.SharedMemory(name)
+        self._buf = self._shm.buf
+        magic, self.pid, values, outputs, pwm = _HEADER.unpack_from(self._buf, 0)
+        if sys.version_info < (3, 13) and self.pid != os.getpid():
+            # Before 3.13 attaching registers the block with this process's
+            # resource tracker, which would unlink it when this process exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        if magic != _MAGIC or (values, outputs, pwm) != (_VALUES, _OUTPUTS, _PWM):
+            self.close()
+            raise RuntimeError(f"Shared state {name!r} was published with a different I/O config")
+        self._cached = (0, None, None)  # seq, snapshot, acquisition stats
+
+    def _read(self, offset, size):
+        """Consistent copy of a section body, or None if it was never written."""
+        buf = self._buf
+        start = offset + _COUNTER.size
+        for _ in range(READ_RETRIES):
+            (before,) = _COUNTER.unpack_from(buf, offset)
+            if before == 0:
+                return None
+            if before & 1:
+                time.sleep(0)
+                continue
+            body = bytes(buf[start:start + size])
+            (crc,) = _CRC.unpack_from(buf, start + size)
+            (after,) = _COUNTER.unpack_from(buf, offset)
+            if before == after and zlib.crc32(body) == crc:
+                return body
+        raise RuntimeError("Shared state is being rewritten too fast to read")
+
+    def last_seq(self):
+        """Seq of the latest published snapshot, read without copying the section."""
+        return _COUNTER.unpack_from(self._buf, _SNAPSHOT_BODY)[0]
+
+    def _load(self):
+        seq, cached, stats = self._cached
+        if seq and self.last_seq() == seq:
+            return cached, stats
+        body = self._read(_SNAPSHOT_AT, _SNAPSHOT.size)
+        if body is None:
+            return None, None
+        (seq, timestamp, monotonic, scan_duration, jitter, rate_hz,
+         mean_ms, max_ms, window, overruns, *numbers) = _SNAPSHOT.unpack(body)
+        values, eu = {}, {}
+        for index, chip in enumerate(_CHIPS):
+            start = index * channels.CHANNELS_PER_CHIP
+            end = start + channels.CHANNELS_PER_CHIP
+            # Whole counts unless oversampling averaged them
+            values[chip] = tuple(int(n) if n.is_integer() else n for n in numbers[start:end])
+            # NaN never equals itself: it marks an unwired channel
+            eu[chip] = tuple(n if n == n else None for n in numbers[_VALUES + start:_VALUES + end])
+        snapshot = acquisition.Snapshot(
+            seq, _EPOCH + timestamp * _MICROSECOND, monotonic,
+            MappingProxyType(values), MappingProxyType(eu), scan_duration, jitter,
+        )
+        stats = {
+            'rate_hz': rate_hz,
+            'jitter': {"mean_ms": mean_ms, "max_ms": max_ms, "window": window, "overruns": overruns},
+        }
+        self._cached = (seq, snapshot, stats)
+        return snapshot, stats
+
+    def snapshot(self):
+        """Latest snapshot (the same object until a new one is published), or None."""
+        return self._load()[0]
+
+    def acquisition_stats(self):
+        """Acquisition rate and jitter stats published with the latest snapshot."""
+        return self._load()[1]
+
+    def outputs(self):
+        """(version, on/off states, duty cycles) of the outputs, or None if never published."""
+        body = self._read(_OUTPUTS_AT, _OUTPUT_STATE.size)
+        if body is None:
+            return None
+        state = _OUTPUT_STATE.unpack(body)
+        return (state[0], tuple(bool(s) for s in state[1:1 + _OUTPUTS]),
+                tuple(state[1 + _OUTPUTS:]))
+
+    def publisher_alive(self):
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
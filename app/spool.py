@@ -0,0 +1,404 @@
+# app/spool.py
+"""Crash-safe, append-only spool of logged scans in memory-mapped segment files.
+
+Producers (the recording subscriber on the acquisition thread, manual logs)
+append fixed-size binary records to a preallocated segment file through
+mmap, so logging never waits for DuckDB. The sensor writer reads the
+committed records back, bulk-loads them and deletes each segment once it
+has been read to the end. Appending and reading only share the files, so
+the two sides can live in different processes (see daemon.py).
+
+Record layout (little endian):
+
+    seq            uint64   1, 2, 3, ... across segments and restarts
+    kind           uint8    KIND_SCAN, or KIND_FINALIZE for the end of a recording
+    experiment_id  int64    -1 when the scan is not tied to an experiment
+    timestamp      int64    microseconds since 1970-01-01 (naive wall clock)
+    values         float32  CHANNELS_PER_CHIP per chip, in layout order
+    crc            uint32   CRC-32 of everything above
+
+A record is valid when its CRC matches and its seq is not 0, so a write cut
+short by a crash or power loss is recognized and everything before it is
+kept. Sequence numbers are reserved a segment at a time in the
+`reserved_seq` file, so they keep growing after a restart even when every
+segment has been deleted. The sequence number of the last ingested record
+is stored in SPOOL_TABLE in the same transaction as the scans, so segments
+found on startup are replayed exactly once.
+"""
+import os
+import mmap
+import glob
+import zlib
+import struct
+import threading
+from datetime import datetime, timedelta
+from types import MappingProxyType
+
+from . import channels
+
+SPOOL_TABLE = 'spool_state'
+SEGMENT_RECORDS = 4096
+MAX_SEGMENTS = 64
+
+KIND_SCAN = 0
+KIND_FINALIZE = 1
+
+_MAGIC = b'IATISPL2'
+_HEADER = struct.Struct('<8sII')  # magic, record size, records per segment
+_CHIPS = tuple(chip.name for chip in channels.LAYOUT.chips)
+_VALUES = len(_CHIPS) * channels.CHANNELS_PER_CHIP
+_BODY = struct.Struct(f'<QBqq{_VALUES}f')
+_CRC = struct.Struct('<I')
+_NO_VALUES = (0.0,) * _VALUES
+RECORD_SIZE = _BODY.size + _CRC.size
+RESERVED_FILE = 'reserved_seq'
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def default_directory(db_path):
+    """Spool directory kept next to the database it feeds."""
+    return os.path.abspath(db_path) + '.spool'
+
+
+def ensure_schema(conn):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {SPOOL_TABLE} (last_seq BIGINT NOT NULL)")
+    if conn.execute(f"SELECT count(*) FROM {SPOOL_TABLE}").fetchone()[0] == 0:
+        conn.execute(f"INSERT INTO {SPOOL_TABLE} VALUES (0)")
+
+
+def last_ingested(conn):
+    return conn.execute(f"SELECT max(last_seq) FROM {SPOOL_TABLE}").fetchone()[0] or 0
+
+
+def mark_ingested(conn, seq):
+    """Record `seq` as ingested; call inside the transaction that wrote it."""
+    conn.execute(f"UPDATE {SPOOL_TABLE} SET last_seq = greatest(last_seq, ?)", (seq,))
+
+
+class _Segment:
+    """One preallocated segment file, mapped into memory."""
+
+    def __init__(self, path, capacity=None):
+        self.path = path
+        self.number = _segment_number(path)
+        if capacity is not None:
+            size = _HEADER.size + capacity * RECORD_SIZE
+            with open(path, 'wb') as f:
+                f.truncate(size)
+                if hasattr(os, 'posix_fallocate'):
+                    os.posix_fallocate(f.fileno(), 0, size)
+        self._file = open(path, 'r+b')
+        self.mm = mmap.mmap(self._file.fileno(), 0)
+        if capacity is not None:
+            _HEADER.pack_into(self.mm, 0, _MAGIC, RECORD_SIZE, capacity)
+        self.capacity = capacity
+
+    @classmethod
+    def open_existing(cls, path):
+        """Map a segment written by any process, or return None if it is not usable."""
+        try:
+            with open(path, 'rb') as f:
+                magic, record_size, capacity = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC or record_size != RECORD_SIZE:
+                return None
+            if os.path.getsize(path) < _HEADER.size + capacity * RECORD_SIZE:
+                return None
+            segment = cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        segment.capacity = capacity
+        return segment
+
+    def read(self, slot):
+        """Unpack the record in `slot`, or None if it is empty or torn."""
+        offset = _HEADER.size + slot * RECORD_SIZE
+        mm = self.mm
+        (crc,) = _CRC.unpack_from(mm, offset + _BODY.size)
+        if zlib.crc32(mm[offset:offset + _BODY.size]) != crc:
+            return None
+        record = _BODY.unpack_from(mm, offset)
+        return record if record[0] else None
+
+    def last_seq(self):
+        """Seq of the last valid record (0 if there is none)."""
+        last = 0
+        for slot in range(self.capacity):
+            record = self.read(slot)
+            if record is None or record[0] <= last:
+                break
+            last = record[0]
+        return last
+
+    def close(self):
+        self.mm.close()
+        self._file.close()
+
+
+def _segment_number(path):
+    try:
+        return int(os.path.basename(path)[len('segment-'):-len('.spool')])
+    except ValueError:
+        return 0
+
+
+def _segment_paths(directory):
+    """Segment files in the order they were written."""
+    return sorted(glob.glob(os.path.join(directory, 'segment-*.spool')), key=_segment_number)
+
+
+def _read_reserved(directory):
+    try:
+        with open(os.path.join(directory, RESERVED_FILE), encoding='ascii') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_reserved(directory, seq):
+    path = os.path.join(directory, RESERVED_FILE)
+    with open(path + '.tmp', 'w', encoding='ascii') as f:
+        f.write(str(seq))
+    os.replace(path + '.tmp', path)
+
+
+class Appender:
+    """Writing side of a spool directory. `append()` may be called from any thread."""
+
+    def __init__(self, directory, capacity=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS):
+        self.directory = directory
+        self.capacity = int(capacity)
+        self.max_segments = int(max_segments)
+        self._lock = threading.Lock()
+        self._segment = None
+        self._count = 0       # Records in the current segment
+        self._number = 0      # Number of the newest segment file
+        self._seq = 0         # Last seq appended
+        self.start_seq = 0    # Seq before the first record of this run
+
+    def open(self, ingested_seq=0):
+        """Start a new segment after whatever an earlier run left behind.
+
+        Leftover segments are kept for the reader; only their numbers and
+        last sequence number matter here.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._seq = max(ingested_seq, _read_reserved(self.directory))
+        for path in _segment_paths(self.directory):
+            self._number = max(self._number, _segment_number(path))
+            segment = _Segment.open_existing(path)
+            if segment is not None:
+                self._seq = max(self._seq, segment.last_seq())
+                segment.close()
+        self.start_seq = self._seq
+        with self._lock:
+            # The first segment is created even over the limit: there is nowhere else to write
+            self._new_segment(force=True)
+
+    def close(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def _new_segment(self, force=False):
+        """Start the next segment file; False if the spool already holds max_segments."""
+        if not force and len(_segment_paths(self.directory)) >= self.max_segments:
+            return False
+        if self._segment is not None:
+            self._segment.close()
+        self._number += 1
+        _write_reserved(self.directory, self._seq + self.capacity)
+        path = os.path.join(self.directory, f'segment-{self._number:08d}.spool')
+        self._segment = _Segment(path, self.capacity)
+        self._count = 0
+        return True
+
+    def append(self, snapshot, experiment_id=None):
+        """Write one scan. Returns False if the spool is full (or closed)."""
+        values = snapshot.values
+        return self._append(
+            KIND_SCAN,
+            -1 if experiment_id is None else int(experiment_id),
+            (snapshot.timestamp - _EPOCH) // _MICROSECOND,
+            [v for chip in _CHIPS for v in values[chip]],
+        )
+
+    def append_finalize(self, experiment_id):
+        """Write a marker telling the reader that an experiment's recording has ended."""
+        return self._append(
+            KIND_FINALIZE, int(experiment_id), (datetime.now() - _EPOCH) // _MICROSECOND, _NO_VALUES
+        )
+
+    def _append(self, kind, experiment, timestamp, values):
+        with self._lock:
+            if self._segment is None:
+                return False  # Closed
+            if self._count == self.capacity and not self._new_segment():
+                return False
+            seq = self._seq + 1
+            body = _BODY.pack(seq, kind, experiment, timestamp, *values)
+            offset = _HEADER.size + self._count * RECORD_SIZE
+            mm = self._segment.mm
+            mm[offset:offset + _BODY.size] = body
+            _CRC.pack_into(mm, offset + _BODY.size, zlib.crc32(body))
+            self._count += 1
+            self._seq = seq
+        return True
+
+    def last_seq(self):
+        """Seq of the last record appended."""
+        return self._seq
+
+    def capacity_records(self):
+        return self.capacity * self.max_segments
+
+
+class Reader:
+    """Reading side of a spool directory, used by a single ingesting thread.
+
+    Records are found by their CRC rather than through the appender, so the
+    appender may be another process. A segment is finished when it has been
+    read to its capacity, or at its first invalid record once a newer
+    segment exists (it was abandoned by a crash). Finished segments are
+    deleted by `release()`, after their records have been committed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._segment = None
+        self._slot = 0
+        self._number = 0       # Last segment number opened
+        self._done = []        # Finished segments waiting for release()
+        self._read_seq = 0
+        self._leftover = 0     # Segments up to this number existed when the reader opened
+        self._skip_until = 0   # Records in those up to this seq are already in the database
+
+    def open(self, ingested_seq):
+        os.makedirs(self.directory, exist_ok=True)
+        self._skip_until = self._read_seq = ingested_seq
+        paths = _segment_paths(self.directory)
+        self._leftover = _segment_number(paths[-1]) if paths else 0
+        if _read_reserved(self.directory) < ingested_seq:
+            # The spool directory was emptied: keep new sequence numbers above the ingested ones
+            _write_reserved(self.directory, ingested_seq)
+
+    def pending_leftovers(self):
+        """Scans left by an earlier run that still have to be ingested."""
+        pending = 0
+        for path in _segment_paths(self.directory):
+            if _segment_number(path) > self._leftover:
+                break
+            segment = _Segment.open_existing(path)
+            if segment is None:
+                continue
+            for slot in range(segment.capacity):
+                record = segment.read(slot)
+                if record is None:
+                    break
+                pending += record[0] > self._skip_until and record[1] == KIND_SCAN
+            segment.close()
+        return pending
+
+    def close(self):
+        for segment in self._done + ([self._segment] if self._segment else []):
+            segment.close()
+        self._done = []
+        self._segment = None
+
+    def _next_segment(self):
+        """Map the oldest segment after the current one, if there is one."""
+        for path in _segment_paths(self.directory):
+            number = _segment_number(path)
+            if number <= self._number:
+                continue
+            self._number = number
+            segment = _Segment.open_existing(path)
+            if segment is None:
+                print(f"Spool: ignoring unreadable segment {path}")
+                continue
+            return segment
+        return None
+
+    def _newer_exists(self):
+        return any(_segment_number(path) > self._number for path in _segment_paths(self.directory))
+
+    def _finish(self):
+        self._done.append(self._segment)
+        self._segment = None
+
+    def read(self, limit):
+        """Up to `limit` records after the last one read, as (seq, kind, experiment_id, timestamp, values)."""
+        records = []
+        while len(records) < limit:
+            if self._segment is None:
+                self._segment = self._next_segment()
+                self._slot = 0
+                if self._segment is None:
+                    break
+            segment = self._segment
+            if self._slot >= segment.capacity:
+                self._finish()
+                continue
+            record = segment.read(self._slot)
+            if record is None:
+                # Not written yet, or abandoned by a crash if a newer segment exists
+                if self._newer_exists():
+                    self._finish()
+                    continue
+                break
+            self._slot += 1
+            seq = record[0]
+            self._read_seq = max(self._read_seq, seq)
+            if segment.number <= self._leftover and seq <= self._skip_until:
+                continue
+            values = {
+                chip: record[4 + i * channels.CHANNELS_PER_CHIP:4 + (i + 1) * channels.CHANNELS_PER_CHIP]
+                for i, chip in enumerate(_CHIPS)
+            }
+            experiment_id = None if record[2] < 0 else record[2]
+            records.append((seq, record[1], experiment_id, _EPOCH + record[3] * _MICROSECOND,
+                            MappingProxyType(values)))
+        return records
+
+    def read_seq(self):
+        """Seq of the last record read."""
+        return self._read_seq
+
+    def available(self):
+        """Records written but not read yet (scans the files, so not for hot paths)."""
+        count = 0
+        if self._segment is not None:
+            for slot in range(self._slot, self._segment.capacity):
+                if self._segment.read(slot) is None:
+                    break
+                count += 1
+        for path in _segment_paths(self.directory):
+            if _segment_number(path) <= self._number:
+                continue
+            segment = _Segment.open_existing(path)
+            if segment is None:
+                continue
+            for slot in range(segment.capacity):
+                if segment.read(slot) is None:
+                    break
+                count += 1
+            segment.close()
+        return count
+
+    def release(self):
+        """Delete the finished segments. Returns how many."""
+        done, self._done = self._done, []
+        for segment in done:
+            segment.close()
+            try:
+                os.remove(segment.path)
+            except FileNotFoundError:
+                pass
+        return len(done)
+
+    def sync(self):
+        """Flush the records of the segment being read to disk, so they survive a power loss."""
+        if self._segment is not None:
+            self._segment.mm.flush()
@@ -0,0 +1,102 @@
+# app/startup.py
+"""Startup phase timing and the deferred warm-up.
+
+create_app() only does what the first request needs (configuration,
+sessions, routes) and hands the database check, the sensor writer and the
+I/O backend to a warm-up thread, so the server can answer while the
+hardware comes up. Every phase is timed; report() is served by
+/api/startup-profile and printed once the warm-up is done.
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+# How long an /api request waits for the warm-up before it gives up
+READY_TIMEOUT = 30.0
+
+_started = time.perf_counter()
+_phases = []  # (name, start offset s, duration s, thread name)
+_ready = threading.Event()
+_ready_at = None
+_serving_at = None
+
+
+def begin():
+    """Start the clock (at the top of create_app)."""
+    global _started, _ready_at, _serving_at
+    _started = time.perf_counter()
+    _phases.clear()
+    _ready.clear()
+    _ready_at = _serving_at = None
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as one startup phase."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, started - _started, time.perf_counter() - started,
+                        threading.current_thread().name))
+
+
+def serving():
+    """Mark the end of create_app: the app can take requests from here."""
+    global _serving_at
+    _serving_at = time.perf_counter() - _started
+
+
+def _finish():
+    global _ready_at
+    _ready_at = time.perf_counter() - _started
+    _ready.set()
+    print_report()
+
+
+def warm_up(fn, deferred=True):
+    """Run `fn()` in the warm-up thread (or inline), then mark the app ready."""
+    def run():
+        try:
+            fn()
+        except Exception as e:
+            print(f"ERROR during warm-up: {e}")
+        finally:
+            _finish()
+
+    if not deferred:
+        run()
+        return None
+    thread = threading.Thread(target=run, name='startup-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_ready(timeout=None):
+    """Block until the warm-up is done; False if `timeout` elapsed first."""
+    return _ready.wait(timeout)
+
+
+def is_ready():
+    return _ready.is_set()
+
+
+def report():
+    return {
+        "ready": _ready.is_set(),
+        "serving_ms": None if _serving_at is None else round(_serving_at * 1000, 1),
+        "ready_ms": None if _ready_at is None else round(_ready_at * 1000, 1),
+        "phases": [
+            {"name": name, "start_ms": round(start * 1000, 1), "duration_ms": round(duration * 1000, 1),
+             "thread": thread}
+            for name, start, duration, thread in list(_phases)
+        ],
+    }
+
+
+def print_report():
+    profile = report()
+    print("Startup profile:")
+    for p in profile['phases']:
+        print(f"  {p['name']:<24} {p['duration_ms']:>8.1f} ms  (at {p['start_ms']:.1f} ms, {p['thread']})")
+    print(f"  serving after {profile['serving_ms']} ms, warm-up done after {profile['ready_ms']} ms")
@@ -1,188 +1,91 @@
 // app/static/js/io-test.js
 
-// Configuration for special ADC channel handling
-const adcChannelConfig = {
-    'mcp1-ch0': {
-        type: 'percentage-corrected',
-        targetElementId: 'mcp1-ch0'
-    },
-    'mcp1-ch1': {
-        type: 'status',
-        threshold: 2.5, // Voltage threshold for switching state
-        targetElementId: 'mcp1-ch1-status',
-        states: {
-            active: { text: 'Ligado', className: 'status-active' },
-            inactive: { text: 'Desligado', className: 'status-inactive' }
-        }
-    },
-    'mcp1-ch2': {
-        type: 'status',
-        threshold: 2.5, // Voltage threshold
-        targetElementId: 'mcp1-ch2-status',
-        states: {
-            active: { text: 'Aberto', className: 'status-active' },
-            inactive: { text: 'Fechado', className: 'status-inactive' }
-        }
-    },
-    'mcp1-ch3': {
-        type: 'status',
-        threshold: 2.5,
-        targetElementId: 'mcp1-ch3-status',
-        states: {
-            active: { text: 'Aberto', className: 'status-active' },
-            inactive: { text: 'Fechado', className: 'status-inactive' }
-        }
-    },
-    'mcp1-ch4': {
-        type: 'status',
-        threshold: 2.5,
-        targetElementId: 'mcp1-ch4-status',
-        states: {
-            active: { text: 'Ligado', className: 'status-active' },
-            inactive: { text: 'Desligado', className: 'status-inactive' }
-        }
-    },
-    'mcp1-ch5': {
-        type: 'status',
-        threshold: 2.5,
-        targetElementId: 'mcp1-ch5-status',
-        states: {
-            active: { text: 'Ligado', className: 'status-active' },
-            inactive: { text: 'Desligado', className: 'status-inactive' }
-        }
-    },
-    'mcp1-ch6': {
-        type: 'status',
-        threshold: 2.5,
-        targetElementId: 'mcp1-ch6-status',
-        states: {
-            active: { text: 'Aberto', className: 'status-active' },
-            inactive: { text: 'Fechado', className: 'status-inactive' }
-        }
-    },
-    'mcp1-ch7': {
-        type: 'percentage',
-        targetElementId: 'mcp1-ch7'
-    },
-        'mcp2-ch0': {
-        type: 'status',
-        threshold: 2.5,
-        targetElementId: 'mcp2-ch0-status',
-        states: {
-            active: { text: 'Aberto', className: 'status-active' },
-            inactive: { text: 'Fechado', className: 'status-inactive' }
-        }
-    }
-};
+// Calibration of every wired channel (type, unit, status labels) from /api/channels.
+// Conversion and status thresholds are applied by the server; this page only
+// formats the engineering values it receives.
+let channelConfig = [];
+
+// Latest known engineering values, patched by stream deltas
+const euState = {};
+
+function loadChannelConfig() {
+    return fetch('/api/channels')
+        .then(response => response.json())
+        .then(channels => {
+            channelConfig = channels;
+        })
+        .catch(error => {
+            console.error('Error fetching channel configuration:', error);
+        });
+}
 
 // Update ADC values
 function updateADCValues() {
     fetch('/api/adc-values')
         .then(response => response.json())
-        .then(data => {
-            // Update MCP1 values
-            for (let i = 0; i < 8; i++) {
-                const channelId = `mcp1-ch${i}`;
-                const config = adcChannelConfig[channelId];
-                const rawValue = data.mcp1[i];
-                const voltage = (rawValue / 1023) * 3.3;
-
-                if (config) {
-                    // Handle special channels based on the configuration object
-                    const element = document.getElementById(config.targetElementId);
-                    if (!element) continue;
-
-                    if (config.type === 'percentage') {
-                        const percentage = (rawValue / 1023 * 100).toFixed(1);
-                        element.textContent = percentage;
-                    } else if (config.type === 'percentage-corrected') {
-                        const percentage = (voltage * 100 - 50).toFixed(1);
-                        element.textContent = percentage;
-                    } else if (config.type === 'status') {
-                        const baseClass = 'channel-status';
-                        if (voltage >= config.threshold) {
-                            element.textContent = config.states.active.text;
-                            element.className = `${baseClass} ${config.states.active.className}`;
-                        } else {
-                            element.textContent = config.states.inactive.text;
-                            element.className = `${baseClass} ${config.states.inactive.className}`;
-                        }
-                    }
-                } else {
-                    // Default behavior: display voltage
-                    const element = document.getElementById(channelId);
-                    if (element) {
-                        element.textContent = voltage.toFixed(2);
-                    }
-                }
-            }
-            
-           // Update MCP2 values
-            for (let i = 0; i < 8; i++) {
-                const channelId = `mcp2-ch${i}`;
-                const config = adcChannelConfig[channelId];
-                const rawValue = data.mcp2[i];
-                const voltage = (rawValue / 1023) * 3.3;
-
-                if (config) {
-                    // Handle special channels based on the configuration object
-                    const element = document.getElementById(config.targetElementId);
-                    if (!element) continue;
-
-                    if (config.type === 'status') {
-                        const baseClass = 'channel-status';
-                        if (voltage >= config.threshold) {
-                            element.textContent = config.states.active.text;
-                            element.className = `${baseClass} ${config.states.active.className}`;
-                        } else {
-                            element.textContent = config.states.inactive.text;
-                            element.className = `${baseClass} ${config.states.inactive.className}`;
-                        }
-                    }
-                } else {
-                    // Default behavior: display voltage
-                    const element = document.getElementById(channelId);
-                    if (element) {
-                        element.textContent = voltage.toFixed(2);
-                    }
-                }
-            }
-        })
+        .then(data => renderADCValues(data.eu))
         .catch(error => {
             console.error('Error fetching ADC values:', error);
         });
 }
 
+// Render engineering values ({mcp1: [...], mcp2: [...]})
+function renderADCValues(eu) {
+    channelConfig.forEach(config => {
+        const chipValues = eu[config.chip];
+        if (!chipValues) return;
+        const value = chipValues[config.channel];
+        if (value === null || value === undefined) return;
+        const channelId = `${config.chip}-ch${config.channel}`;
+
+        if (config.type === 'status') {
+            const element = document.getElementById(`${channelId}-status`);
+            if (!element) return;
+            const active = value >= 0.5;
+            element.textContent = active ? config.states.active : config.states.inactive;
+            element.className = `channel-status ${active ? 'status-active' : 'status-inactive'}`;
+        } else {
+            const element = document.getElementById(channelId);
+            if (element) {
+                element.textContent = value.toFixed(config.unit === '%' ? 1 : 2);
+            }
+        }
+    });
+}
+
 // Update GPIO values
 function updateGPIOStates() {
     fetch('/api/gpio-states')
         .then(response => response.json())
-        .then(data => {
-            // Update GPIO checkboxes without triggering change events
-            Object.keys(data).forEach(gpio => {
-                const element = document.getElementById(`gpio${gpio}`);
-                if (element) {
-                    element.checked = data[gpio];
-                }
-            });
-            
-            // Update PWM sliders
-            if (data.pwm) {
-                Object.keys(data.pwm).forEach(gpio => {
-                    const element = document.getElementById(`pwm-gpio${gpio}`);
-                    const valueElement = document.getElementById(`pwm-gpio${gpio}-value`);
-                    if (element && valueElement) {
-                        element.value = data.pwm[gpio];
-                        valueElement.textContent = `${data.pwm[gpio]}%`;
-                    }
-                });
-            }
-        })
+        .then(data => renderGPIOStates(data))
         .catch(error => {
             console.error('Error fetching GPIO states:', error);
         });
 }
 
+// Render GPIO/PWM states; a partial object only updates the pins it contains
+function renderGPIOStates(data) {
+    // Update GPIO checkboxes without triggering change events
+    Object.keys(data).forEach(gpio => {
+        const element = document.getElementById(`gpio${gpio}`);
+        if (element) {
+            element.checked = data[gpio];
+        }
+    });
+    
+    // Update PWM sliders
+    if (data.pwm) {
+        Object.keys(data.pwm).forEach(gpio => {
+            const element = document.getElementById(`pwm-gpio${gpio}`);
+            const valueElement = document.getElementById(`pwm-gpio${gpio}-value`);
+            if (element && valueElement) {
+                element.value = data.pwm[gpio];
+                valueElement.textContent = `${data.pwm[gpio]}%`;
+            }
+        });
+    }
+}
+
 function setGpioState(gpio, state) {
     fetch('/api/set-gpio', {
         method: 'POST',
@@ -344,10 +247,52 @@ if (logDataButton) {
     });
 }
 
-// Initial update
-updateADCValues();
-updateGPIOStates();
+// Polling fallback for browsers without Server-Sent Events
+let pollingTimers = null;
 
-// Set up periodic updates
-setInterval(updateADCValues, 1000); // Update ADC values every second
-setInterval(updateGPIOStates, 5000); // Update GPIO states every 5 seconds
\ No newline at end of file
+function startPolling() {
+    if (pollingTimers) return;
+    updateADCValues();
+    updateGPIOStates();
+    pollingTimers = [
+        setInterval(updateADCValues, 1000), // Update ADC values every second
+        setInterval(updateGPIOStates, 5000) // Update GPIO states every 5 seconds
+    ];
+}
+
+// Live updates pushed by the server: ADC deltas and GPIO/PWM changes
+function startStream() {
+    const source = new EventSource('/api/stream?rate=1');
+
+    source.addEventListener('adc', event => {
+        const data = JSON.parse(event.data);
+        Object.keys(data.eu).forEach(chip => {
+            euState[chip] = euState[chip] || [];
+            Object.keys(data.eu[chip]).forEach(channel => {
+                euState[chip][channel] = data.eu[chip][channel];
+            });
+        });
+        renderADCValues(euState);
+    });
+
+    source.addEventListener('gpio', event => {
+        renderGPIOStates(JSON.parse(event.data));
+    });
+
+    source.onerror = () => {
+        // The browser reconnects on its own; only give up if the stream is closed for good
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling();
+        }
+    };
+}
+
+// The stream only sends changed values, so the channel configuration must be
+// known before the first event is rendered
+loadChannelConfig().then(() => {
+    if (window.EventSource) {
+        startStream();
+    } else {
+        startPolling();
+    }
+});
\ No newline at end of file
@@ -99,34 +99,87 @@ let engine_temp_timer = false
 // });
 
 
+// Test procedure steps run on the server (see app/sequencer.py), so their
+// timing does not depend on this tab staying open. A "mark" step toggles
+// the indicator with that id, or calls the matching function below.
+const SEQUENCE_POLL_MS = 200;
+
+const sequenceMarks = {
+    engine_temp_timer: function() {
+        engine_temp_timer = true;
+    }
+};
+
+function applyMark(name) {
+    if (sequenceMarks[name]) {
+        sequenceMarks[name]();
+    } else if (document.getElementById(name)) {
+        document.getElementById(name).classList.toggle('info-color');
+    }
+}
+
+function runSequence(name, steps) {
+    let applied = 0;
+
+    function follow(sequence) {
+        // Apply the marks logged since the last poll, in step order
+        sequence.log.slice(applied).forEach(function(entry) {
+            if (entry.action === 'mark') {
+                applyMark(entry.name);
+            }
+        });
+        applied = sequence.log.length;
+
+        if (sequence.state === 'running') {
+            setTimeout(function() {
+                fetch('/api/sequences/' + sequence.id)
+                    .then(response => response.json())
+                    .then(data => data.success ? follow(data.sequence) : console.error(data.error))
+                    .catch(error => console.error('Error following sequence:', error));
+            }, SEQUENCE_POLL_MS);
+        } else if (sequence.state !== 'completed') {
+            console.error('Sequence ' + name + ' ' + sequence.state + ': ' + sequence.error);
+        }
+    }
+
+    fetch('/api/sequences', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({name: name, steps: steps})
+    })
+        .then(response => response.json())
+        .then(data => data.success ? follow(data.sequence) : console.error(data.error))
+        .catch(error => console.error('Error starting sequence:', error));
+}
+
+function mark(name) {
+    return {action: 'mark', name: name};
+}
+
+function wait(seconds) {
+    return {action: 'wait', seconds: seconds};
+}
+
 // start_test button 
 document.getElementById('start_test_button').addEventListener('click', function() {
     if (document.getElementById('engine_temp').classList.contains('info-color') && engine_temp_timer){ 
         this.classList.toggle('button-clicked');
 
+        let steps = [];
         if (document.getElementById('ocb1').checked) { 
-            document.getElementById('retorno_ocb1').classList.toggle('info-color'); 
-            document.getElementById('injecao_ocb1').classList.toggle('info-color');
-    
+            steps.push(mark('retorno_ocb1'), mark('injecao_ocb1'));
         } else if (document.getElementById('oca1').checked){
-            document.getElementById('retorno_oca1').classList.toggle('info-color');
-            document.getElementById('injecao_oca1').classList.toggle('info-color');
+            steps.push(mark('retorno_oca1'), mark('injecao_oca1'));
         }
 
-        setTimeout(function() {
-            document.getElementById('injecao_diesel').classList.toggle('info-color');
-            document.getElementById('retorno_diesel').classList.toggle('info-color');
-
-            if (document.getElementById('hydrogen_eletrolisado').checked) { 
-                document.getElementById('h2_eletrolisado').classList.toggle('info-color');
-            } else if (document.getElementById('hydrogen_armazenado').checked){
-                document.getElementById('h2_armazenado').classList.toggle('info-color');
-                
-            }
-
-        }, 5000); // 
+        steps.push(wait(5), mark('injecao_diesel'), mark('retorno_diesel'));
+        if (document.getElementById('hydrogen_eletrolisado').checked) { 
+            steps.push(mark('h2_eletrolisado'));
+        } else if (document.getElementById('hydrogen_armazenado').checked){
+            steps.push(mark('h2_armazenado'));
+        }
 
-       
+        runSequence('start_test', steps);
     }
 });
 
@@ -137,15 +190,9 @@ document.getElementById('general_button').addEventListener('click', function() {
 
     this.classList.toggle('button-clicked');
     if (document.getElementById('ocb1').checked) { 
-        document.getElementById('aquecimento_ocb1').classList.toggle('info-color'); 
-        setTimeout(function() {
-            document.getElementById('densidade_ocb1').classList.toggle('info-color');
-        }, 5000); // 
+        runSequence('general', [mark('aquecimento_ocb1'), wait(5), mark('densidade_ocb1')]);
     } else if (document.getElementById('oca1').checked){
-        document.getElementById('aquecimento_oca1').classList.toggle('info-color');
-        setTimeout(function() {
-            document.getElementById('densidade_oca1').classList.toggle('info-color');
-        }, 5000); //
+        runSequence('general', [mark('aquecimento_oca1'), wait(5), mark('densidade_oca1')]);
     }
 });
 
@@ -154,19 +201,12 @@ document.getElementById('general_button').addEventListener('click', function() {
 document.getElementById('start_motor').addEventListener('click', function() {
     if (document.getElementById('densidade_ocb1').classList.contains('info-color') || document.getElementById('densidade_oca1').classList.contains('info-color')) { 
         this.classList.toggle('button-clicked');
-        
-        setTimeout(function() {
-            document.getElementById('injecao_diesel').classList.toggle('info-color');
-            document.getElementById('retorno_diesel').classList.toggle('info-color');
-            document.getElementById('motor_ativo').classList.toggle('info-color');
-        }, 1000);
-
-        setTimeout(function() {
-            document.getElementById('engine_temp').classList.toggle('info-color');
-            setTimeout(function() {
-                engine_temp_timer = true;
-            }, 5000); // 
-        }, 5000);
+
+        runSequence('start_motor', [
+            wait(1), mark('injecao_diesel'), mark('retorno_diesel'), mark('motor_ativo'),
+            wait(4), mark('engine_temp'),
+            wait(5), mark('engine_temp_timer')
+        ]);
     } 
 });
 
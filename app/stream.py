@@ -0,0 +1,137 @@
+# app/stream.py
+import json
+import time
+import threading
+
+DEFAULT_RATE_HZ = 1.0
+MAX_RATE_HZ = 20.0
+KEEPALIVE_S = 15.0
+
+
+class Broadcaster:
+    """Fans out ADC snapshots and output (GPIO/PWM) changes to SSE clients.
+
+    There is a single producer per event kind: the acquisition thread
+    publishes snapshots and pi_io publishes output states after a successful
+    set_gpio/set_pwm. Clients only wait on a condition variable and diff
+    against what they last sent, so adding a client never touches hardware.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._snapshot = None
+        self._outputs = None
+        self._outputs_version = 0
+        self.clients = 0
+
+    def publish_snapshot(self, snapshot):
+        """Acquisition subscriber."""
+        with self._cond:
+            self._snapshot = snapshot
+            self._cond.notify_all()
+
+    def publish_outputs(self, states):
+        """Output listener registered with pi_io."""
+        with self._cond:
+            self._outputs = states
+            self._outputs_version += 1
+            self._cond.notify_all()
+
+    def events(self, rate_hz=DEFAULT_RATE_HZ):
+        """Generator of SSE-formatted events for one client."""
+        period = 1.0 / rate_hz
+        sent_values = {}
+        sent_outputs = {}
+        outputs_version = -1
+        last_seq = None
+        next_adc = 0.0
+        last_write = time.monotonic()
+
+        with self._cond:
+            self.clients += 1
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                now = time.monotonic()
+                with self._cond:
+                    if self._outputs_version == outputs_version:
+                        if next_adc > now:
+                            # Rate limit: sleep until the next ADC slot (output changes wake us)
+                            timeout = min(next_adc - now, KEEPALIVE_S)
+                        elif self._snapshot is None or self._snapshot.seq == last_seq:
+                            timeout = KEEPALIVE_S
+                        else:
+                            timeout = 0
+                        if timeout:
+                            self._cond.wait(timeout)
+                    snapshot = self._snapshot
+                    outputs = self._outputs
+                    version = self._outputs_version
+
+                now = time.monotonic()
+                chunks = []
+
+                if version != outputs_version and outputs is not None:
+                    outputs_version = version
+                    changes = _diff_outputs(outputs, sent_outputs)
+                    if changes:
+                        chunks.append(_event('gpio', changes))
+
+                if snapshot is not None and snapshot.seq != last_seq and now >= next_adc:
+                    last_seq = snapshot.seq
+                    next_adc = now + period
+                    changes = _diff_values(snapshot.values, sent_values, 'raw')
+                    eu_changes = _diff_values(snapshot.eu, sent_values, 'eu')
+                    # Idle channels cost nothing: only changed values are sent
+                    if changes or eu_changes:
+                        chunks.append(_event('adc', {
+                            'seq': snapshot.seq,
+                            'timestamp': snapshot.timestamp.isoformat(),
+                            'changes': changes,
+                            'eu': eu_changes,
+                        }))
+
+                if chunks:
+                    last_write = now
+                    yield ''.join(chunks)
+                elif now - last_write >= KEEPALIVE_S:
+                    last_write = now
+                    yield ": keepalive\n\n"
+        finally:
+            with self._cond:
+                self.clients -= 1
+
+
+def _diff_values(values, sent, kind):
+    """Return {chip: {channel: value}} for the channels that changed since last sent."""
+    changes = {}
+    for chip, chip_values in values.items():
+        for channel, value in enumerate(chip_values):
+            key = (kind, chip, channel)
+            if sent.get(key) != value:
+                sent[key] = value
+                changes.setdefault(chip, {})[channel] = value
+    return changes
+
+
+def _diff_outputs(states, sent):
+    """Return the entries of a get_gpio_states() response that changed since last sent."""
+    changes = {}
+    for key, value in states.items():
+        if key == 'pwm':
+            pwm_changes = {pin: duty for pin, duty in value.items() if sent.get(('pwm', pin)) != duty}
+            if pwm_changes:
+                changes['pwm'] = pwm_changes
+                for pin, duty in pwm_changes.items():
+                    sent[('pwm', pin)] = duty
+        elif sent.get(key) != value:
+            changes[key] = value
+            sent[key] = value
+    return changes
+
+
+def _event(name, data):
+    return f"event: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,434 @@
+# app/writer.py
+import time
+import threading
+from collections import Counter
+from types import MappingProxyType
+
+from . import acquisition
+from . import calibration
+from . import channels
+from . import compression
+from . import db
+from . import metrics
+from . import rollups
+from . import spool
+
+DEFAULT_FLUSH_SCANS = 50
+DEFAULT_FLUSH_INTERVAL = 1.0
+ID_BLOCK_SIZE = 4096
+# Per-connection table batches go through when some channels are compressed
+STAGING_TABLE = 'scan_batch'
+# A batch that fails to commit is retried this many times, waiting
+# RETRY_BACKOFF_S doubled after every failure (at most RETRY_MAX_S), before
+# its scans are counted as lost
+FLUSH_RETRIES = 5
+RETRY_BACKOFF_S = 0.5
+RETRY_MAX_S = 30.0
+
+
+class SensorWriter:
+    """Write-behind logger for sensor_scans, fed through an on-disk spool.
+
+    Producers append whole acquisition snapshots to the spool (see
+    spool.py) and return immediately; nothing on that path touches the
+    database. A single writer thread reads the records back and inserts
+    each batch with one multi-row INSERT on its own cursor, one row per
+    scan, together with the spool position it reached. Row IDs come from
+    scan_id_seq in blocks of ID_BLOCK_SIZE instead of one nextval() round
+    trip per row. The experiment rollups are updated from each batch in
+    the same transaction, and finalized when the end-of-recording marker
+    is read. Records left in the spool by a crash are ingested when the
+    writer starts again. A batch that fails to commit stays in memory and
+    is retried with backoff; nothing after it is written, and no spool
+    segment is deleted, until it succeeds or its retries run out.
+
+    When channels are stored compressed (see compression.py), each batch
+    is first inserted into a staging table so the rollups still see every
+    sample; only the uncompressed columns are copied to sensor_scans, and
+    the points and events of the compressed channels are written alongside.
+    """
+
+    def __init__(self, spool_dir=None, flush_scans=DEFAULT_FLUSH_SCANS,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, max_segments=spool.MAX_SEGMENTS):
+        self.flush_scans = int(flush_scans)
+        self.flush_interval = float(flush_interval)
+        self.spool_dir = spool_dir or spool.default_directory(db.DB_PATH)
+        self._appender = spool.Appender(self.spool_dir, max_segments=max_segments)
+        self._reader = spool.Reader(self.spool_dir)
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._conn = None
+        self._ids = []
+        self._compression = compression.Pipeline()
+        # Highest seq fed to the compression pipeline, so a retried batch is not fed twice
+        self._compressed_seq = 0
+        # Points and events of a failed batch, written with its retry
+        self._carried = ([], [])
+        # Records read from the spool whose batch failed, retried from _retry_at
+        self._pending = []
+        self._attempts = 0
+        self._retry_at = 0.0
+        # Scans written per experiment ID (None for manual logs without one)
+        self._written = Counter()
+        self._stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'recovered': 0,
+            'rows_written': 0,
+            'rows_failed': 0,
+            'batches_failed': 0,
+            'points_written': 0,
+            'events_written': 0,
+            'batches': 0,
+            'last_batch_rows': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'max_queue_depth': 0,
+        }
+
+    def start(self):
+        if self.is_running():
+            return
+        db.ensure_ready()
+        conn = db.cursor()
+        try:
+            spool.ensure_schema(conn)
+            ingested = spool.last_ingested(conn)
+        finally:
+            db.close_cursor(conn)
+        self._reader.open(ingested)
+        self._stats['recovered'] = recovered = self._reader.pending_leftovers()
+        if recovered:
+            print(f"Spool: {recovered} scans left from the last run will be ingested")
+        self._appender.open(ingested)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='sensor-writer', daemon=True)
+        self._thread.start()
+        print(f"Sensor writer started (spool {self.spool_dir}, flush every "
+              f"{self.flush_scans} scans or {self.flush_interval:g} s)")
+
+    def stop(self, timeout=10.0):
+        """Ingest everything spooled so far and stop the writer thread."""
+        if not self.is_running():
+            return
+        self._appender.close()
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+        print(f"Sensor writer stopped ({self._stats['rows_written']} rows written)")
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, snapshot, experiment_id=None):
+        """Spool one snapshot for writing. Returns False if it had to be dropped."""
+        if not self.is_running():
+            return False
+        if not self._appender.append(snapshot, experiment_id):
+            self._stats['dropped'] += 1
+            return False
+        self._stats['enqueued'] += 1
+        depth = self._queue_depth()
+        if depth > self._stats['max_queue_depth']:
+            self._stats['max_queue_depth'] = depth
+        if depth == self.flush_scans:
+            self._wake.set()
+        return True
+
+    def finalize_experiment(self, experiment_id):
+        """Finalize an experiment's rollups once every scan spooled before this call is written."""
+        if not self.is_running():
+            return False
+        if not self._appender.append_finalize(experiment_id):
+            print(f"Error finalizing experiment {experiment_id}: the spool is full")
+            return False
+        self._wake.set()
+        return True
+
+    def get_written(self, experiment_id):
+        """Number of scans written so far for `experiment_id`."""
+        return self._written[experiment_id]
+
+    def _queue_depth(self):
+        """Records appended and not read yet."""
+        appender = self._appender
+        return appender.last_seq() - max(self._reader.read_seq(), appender.start_seq)
+
+    def get_metrics(self):
+        """Backpressure and throughput counters."""
+        metrics = dict(self._stats)
+        metrics['queue_depth'] = self._queue_depth()
+        metrics['queue_capacity'] = self._appender.capacity_records()
+        metrics['running'] = self.is_running()
+        return metrics
+
+    def _run(self):
+        self._conn = db.cursor()
+        self._conn.execute("CREATE SEQUENCE IF NOT EXISTS scan_id_seq")
+        if compression.COMPRESSED:
+            self._conn.execute(
+                f"CREATE OR REPLACE TEMP TABLE {STAGING_TABLE} AS "
+                f"SELECT * FROM {db.SCAN_TABLE} LIMIT 0"
+            )
+
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            stopping = self._stopping
+            self._ingest(force=stopping)
+            if stopping:
+                break
+        # Store the last pending point of every compressed channel
+        self._compression.finish_all()
+        self._write_compressed()
+
+        db.close_cursor(self._conn)
+        self._conn = None
+        self._reader.close()
+
+    def _ingest(self, force=False):
+        """Write every record spooled so far, in batches of at most flush_scans.
+
+        With `force`, a failed batch is retried without waiting for its backoff.
+        """
+        self._reader.sync()
+        while True:
+            if self._pending:
+                if not force and time.monotonic() < self._retry_at:
+                    return
+                records, self._pending = self._pending, []
+            else:
+                records = self._reader.read(self.flush_scans)
+            if not self._write(records):
+                # The failed records are still in the spool segments: keep them
+                return
+            self._reader.release()
+            if not records:
+                break
+
+    def _write(self, records):
+        """Write spooled records in order. Returns False if a batch failed (see _keep)."""
+        start = 0
+        for index, record in enumerate(records):
+            if record[1] == spool.KIND_FINALIZE:
+                # Every scan of the recording comes before its marker
+                if index > start and not self._flush(records[start:index]):
+                    return self._keep(records[start:])
+                self._finalize(record[2])
+                start = index + 1
+        if start < len(records) and not self._flush(records[start:]):
+            return self._keep(records[start:])
+        self._attempts = 0
+        return True
+
+    def _keep(self, records):
+        """Hold the failed batch at the head of `records`, and the records after it, for a retry."""
+        failed = next((i for i, r in enumerate(records) if r[1] == spool.KIND_FINALIZE), len(records))
+        self._attempts += 1
+        if self._attempts > FLUSH_RETRIES:
+            print(f"Giving up on {failed} sensor scans after {FLUSH_RETRIES} retries")
+            self._stats['rows_failed'] += failed
+            self._carried = ([], [])
+            records = records[failed:]
+            self._attempts = 0
+            self._retry_at = 0.0
+        else:
+            delay = min(RETRY_MAX_S, RETRY_BACKOFF_S * 2 ** (self._attempts - 1))
+            print(f"Retrying {failed} sensor scans in {delay:g} s (attempt {self._attempts} of {FLUSH_RETRIES})")
+            self._retry_at = time.monotonic() + delay
+        self._pending = records
+        return False
+
+    def _next_ids(self, n):
+        """Take `n` scan IDs, fetching a new block from the sequence when needed."""
+        if len(self._ids) < n:
+            block = max(ID_BLOCK_SIZE, n - len(self._ids))
+            rows = self._conn.execute(
+                "SELECT nextval('scan_id_seq') FROM range(?)", (block,)
+            ).fetchall()
+            self._ids.extend(row[0] for row in rows)
+        ids, self._ids = self._ids[:n], self._ids[n:]
+        return ids
+
+    def _flush(self, records):
+        """Insert one batch of scans in a transaction. Returns False if it was rolled back."""
+        started = time.perf_counter()
+        columns = db.scan_columns()
+        batch = [
+            (acquisition.Snapshot(seq, timestamp, 0.0, values,
+                                  MappingProxyType(calibration.convert(values)), 0.0, 0.0),
+             experiment_id)
+            for seq, _, experiment_id, timestamp, values in records
+        ]
+        rows = []
+        for snapshot, experiment_id in batch:
+            experiment = 'NULL' if experiment_id is None else str(int(experiment_id))
+            values = ",".join(
+                str(int(round(snapshot.values[chip][channel])))
+                for chip, channel, _, _ in columns
+            )
+            eu = ",".join(repr(snapshot.eu[chip][channel]) for chip, channel, _, _ in columns)
+            rows.append(f"{experiment},'{snapshot.timestamp.isoformat(sep=' ')}',{values},{eu}")
+            if compression.COMPRESSED and snapshot.seq > self._compressed_seq:
+                self._compression.add(snapshot, experiment_id)
+                self._compressed_seq = snapshot.seq
+        points, events = self._compression.take()
+        carried_points, carried_events = self._carried
+        points, events = carried_points + points, carried_events + events
+        self._carried = ([], [])
+        target = STAGING_TABLE if compression.COMPRESSED else db.SCAN_TABLE
+
+        try:
+            ids = self._next_ids(len(rows))
+            # Every value is generated here (numbers and ISO timestamps), so it
+            # is inlined: binding thousands of parameters is far slower.
+            column_list = ",".join(
+                [f'"{column}"' for _, _, _, column in columns]
+                + [f'"{column}{channels.EU_SUFFIX}"' for _, _, _, column in columns]
+            )
+            self._conn.execute("BEGIN TRANSACTION")
+            self._conn.execute(
+                f"INSERT INTO {target} (id, experiment_id, timestamp, {column_list}) VALUES "
+                + ",".join(f"({row_id},{row})" for row_id, row in zip(ids, rows))
+            )
+            if any(experiment_id is not None for _, experiment_id in batch):
+                for first_id, last_id in _id_ranges(ids):
+                    rollups.update(self._conn, first_id, last_id, target)
+            if target == STAGING_TABLE:
+                kept = ",".join(
+                    ['id', 'experiment_id', 'timestamp']
+                    + [f'"{column}"' for column in _UNCOMPRESSED_COLUMNS]
+                )
+                self._conn.execute(
+                    f"INSERT INTO {db.SCAN_TABLE} ({kept}) SELECT {kept} FROM {STAGING_TABLE}"
+                )
+                self._conn.execute(f"DELETE FROM {STAGING_TABLE}")
+                compression.insert(self._conn, points, events)
+            spool.mark_ingested(self._conn, records[-1][0])
+            self._conn.execute("COMMIT")
+        except Exception as e:
+            self._rollback()
+            print(f"Error writing sensor batch ({len(rows)} scans): {e}")
+            self._stats['batches_failed'] += 1
+            self._carried = (points, events)
+            return False
+
+        elapsed = time.perf_counter() - started
+        elapsed_ms = elapsed * 1000
+        metrics.DB_BATCH_ROWS.observe(len(rows))
+        metrics.DB_BATCH_SECONDS.observe(elapsed)
+        self._written.update(experiment_id for _, experiment_id in batch)
+        self._stats['rows_written'] += len(rows)
+        self._stats['points_written'] += len(points)
+        self._stats['events_written'] += len(events)
+        self._stats['batches'] += 1
+        self._stats['last_batch_rows'] = len(rows)
+        self._stats['last_flush_ms'] = round(elapsed_ms, 3)
+        self._stats['max_flush_ms'] = round(max(self._stats['max_flush_ms'], elapsed_ms), 3)
+        return True
+
+    def _finalize(self, experiment_id):
+        self._compression.finish(experiment_id)
+        self._write_compressed()
+        try:
+            rollups.finalize(self._conn, experiment_id)
+        except Exception as e:
+            print(f"Error finalizing rollups for experiment {experiment_id}: {e}")
+
+    def _write_compressed(self):
+        """Insert the points and events collected outside of a batch."""
+        points, events = self._compression.take()
+        if not points and not events:
+            return
+        try:
+            compression.insert(self._conn, points, events)
+        except Exception as e:
+            print(f"Error writing compressed sensor points: {e}")
+            return
+        self._stats['points_written'] += len(points)
+        self._stats['events_written'] += len(events)
+
+    def _rollback(self):
+        try:
+            self._conn.execute("ROLLBACK")
+        except Exception:
+            pass  # No transaction was open
+
+
+# sensor_scans columns still written for every scan
+_UNCOMPRESSED_COLUMNS = [
+    column
+    for c in channels.LAYOUT.channels if c.compression == 'none'
+    for column in (c.column, c.eu_column)
+]
+
+
+def _id_ranges(ids):
+    """Split ascending IDs into (first, last) runs of consecutive values."""
+    ranges = []
+    first = last = ids[0]
+    for row_id in ids[1:]:
+        if row_id != last + 1:
+            ranges.append((first, last))
+            first = row_id
+        last = row_id
+    ranges.append((first, last))
+    return ranges
+
+
+writer = None
+
+
+def start(spool_dir=None, flush_scans=DEFAULT_FLUSH_SCANS,
+          flush_interval=DEFAULT_FLUSH_INTERVAL, max_segments=spool.MAX_SEGMENTS):
+    """Create and start the shared sensor writer."""
+    global writer
+    if writer is not None and writer.is_running():
+        return writer
+    writer = SensorWriter(spool_dir, flush_scans, flush_interval, max_segments)
+    writer.start()
+    return writer
+
+
+def stop():
+    if writer is not None:
+        writer.stop()
+
+
+def submit(snapshot, experiment_id=None):
+    return writer is not None and writer.submit(snapshot, experiment_id)
+
+
+def finalize_experiment(experiment_id):
+    return writer is not None and writer.finalize_experiment(experiment_id)
+
+
+def get_written(experiment_id):
+    return writer.get_written(experiment_id) if writer is not None else 0
+
+
+def get_metrics():
+    return writer.get_metrics() if writer is not None else {'running': False}
+
+
+@metrics.register_collector
+def _collect_metrics():
+    # A web worker's proxy (IO_MODE=client): the daemon reports its writer
+    if not isinstance(writer, SensorWriter):
+        return []
+    stats = writer.get_metrics()
+    return [
+        ('db_writer_queue_depth', 'gauge', 'Scans in the spool waiting to be written.', stats['queue_depth']),
+        ('db_writer_rows_written_total', 'counter', 'Scans written to the database.', stats['rows_written']),
+        ('db_writer_rows_failed_total', 'counter', 'Scans lost after a batch ran out of retries.',
+         stats['rows_failed']),
+        ('db_writer_batches_failed_total', 'counter', 'Batch commits that failed and were retried.',
+         stats['batches_failed']),
+        ('db_writer_dropped_total', 'counter', 'Scans dropped because the spool was full.', stats['dropped']),
+        ('db_writer_points_written_total', 'counter', 'Points stored for compressed channels.',
+         stats['points_written']),
+        ('db_writer_events_written_total', 'counter', 'State transitions stored for edge channels.',
+         stats['events_written']),
+    ]
@@ -0,0 +1,181 @@
+# benchmarks/bench_compression.py
+"""Storage saved by per-channel compression, and the error of the rebuilt series.
+
+Usage: python benchmarks/bench_compression.py [hours] [deviation]
+
+Generates `hours` of synthetic 10 Hz scans for the configured channels:
+status inputs that switch every few minutes and analog inputs that drift
+slowly with +-1 count of noise and occasional steps. The same scans are
+written twice to scratch databases: uncompressed, and with status channels
+as edge events and analog channels as swinging-door points within
+`deviation` counts. Both files are checkpointed and their sizes compared;
+the compressed run is then read back through sensor_scans_full and compared
+with the original samples.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+from types import MappingProxyType
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), '..', 'app', 'io_config.json')
+RATE_HZ = 10
+BATCH_SCANS = 5000
+
+
+def write_config(directory, deviation):
+    """Copy of the I/O config with every channel compressed."""
+    # Not through app.channels: importing it would load the layout before IO_CONFIG is set
+    with open(DEFAULT_CONFIG, encoding='utf-8') as f:
+        config = json.load(f)
+    for chip in config['chips']:
+        for wired in chip['channels']:
+            if wired.get('type') == 'status':
+                wired['compression'] = 'edge'
+            else:
+                wired['compression'] = 'swinging-door'
+                wired['deviation'] = deviation
+    path = os.path.join(directory, 'io_config.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    return path
+
+
+def scans(hours, layout, seed=1):
+    """Yield (timestamp, {chip: counts}) for a synthetic run."""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    status = {(c.chip, c.channel): rng.random() < 0.5 for c in layout.channels if c.type == 'status'}
+    level = {(c.chip, c.channel): rng.uniform(200, 800) for c in layout.channels}
+    for i in range(int(hours * 3600 * RATE_HZ)):
+        t = i / RATE_HZ
+        values = {chip.name: [0] * 8 for chip in layout.chips}
+        for c in layout.channels:
+            key = (c.chip, c.channel)
+            if key in status:
+                if rng.random() < 1 / (180 * RATE_HZ):  # One switch every ~3 minutes
+                    status[key] = not status[key]
+                counts = 900 if status[key] else 30
+            else:
+                if rng.random() < 1 / (600 * RATE_HZ):  # A step every ~10 minutes
+                    level[key] = rng.uniform(200, 800)
+                counts = level[key] + 40 * math.sin(t / (300 + 20 * c.channel))
+            values[c.chip][c.channel] = max(0, min(1023, int(round(counts + rng.randint(-1, 1)))))
+        yield start + timedelta(seconds=t), values
+
+
+def file_size(conn, path):
+    conn.execute("CHECKPOINT")
+    return os.path.getsize(path)
+
+
+def main():
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else 8.0
+    deviation = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+
+    directory = tempfile.mkdtemp(prefix='bench_compression_')
+    os.environ['IO_CONFIG'] = write_config(directory, deviation)
+
+    import duckdb
+    from app import acquisition, calibration, channels, compression, db
+
+    layout = channels.LAYOUT
+    columns = db.scan_columns()
+    names = [column for _, _, _, column in columns] + [column + channels.EU_SUFFIX for _, _, _, column in columns]
+    paths = {name: os.path.join(directory, f'{name}.duckdb') for name in ('plain', 'compressed')}
+    conns = {name: duckdb.connect(path) for name, path in paths.items()}
+    for conn in conns.values():
+        db.ensure_scan_schema(conn, warn_legacy=False)
+
+    pipeline = compression.Pipeline()
+    rows = {'plain': [], 'compressed': []}
+    compressed_columns = {c.column for c in compression.COMPRESSED} | {c.eu_column for c in compression.COMPRESSED}
+
+    def flush():
+        for name, conn in conns.items():
+            if rows[name]:
+                column_list = ",".join(['id', 'experiment_id', 'timestamp'] + [f'"{n}"' for n in names])
+                conn.execute(f"INSERT INTO {db.SCAN_TABLE} ({column_list}) VALUES " + ",".join(rows[name]))
+                rows[name] = []
+        points, events = pipeline.take()
+        compression.insert(conns['compressed'], points, events)
+
+    print(f"{hours:g} h at {RATE_HZ} Hz, {len(columns)} channels, swinging-door deviation {deviation:g} counts")
+    started = time.perf_counter()
+    count = 0
+    for scan_id, (timestamp, values) in enumerate(scans(hours, layout)):
+        eu = calibration.convert(values)
+        snapshot = acquisition.Snapshot(scan_id, timestamp, 0.0, MappingProxyType(values),
+                                        MappingProxyType(eu), 0.0, 0.0)
+        pipeline.add(snapshot, 1)
+        raw = [str(values[chip][channel]) for chip, channel, _, _ in columns]
+        converted = [repr(eu[chip][channel]) for chip, channel, _, _ in columns]
+        prefix = f"{scan_id},1,'{timestamp.isoformat(sep=' ')}'"
+        rows['plain'].append(f"({prefix},{','.join(raw + converted)})")
+        kept = ['NULL' if name in compressed_columns else value for name, value in zip(names, raw + converted)]
+        rows['compressed'].append(f"({prefix},{','.join(kept)})")
+        count += 1
+        if count % BATCH_SCANS == 0:
+            flush()
+    pipeline.finish_all()
+    flush()
+    elapsed = time.perf_counter() - started
+
+    sizes = {name: file_size(conn, paths[name]) for name, conn in conns.items()}
+    compressed = conns['compressed']
+    points = compressed.execute(f"SELECT count(*) FROM {compression.POINTS_TABLE}").fetchone()[0]
+    events = compressed.execute(f"SELECT count(*) FROM {compression.EVENTS_TABLE}").fetchone()[0]
+    print(f"{count} scans generated and written in {elapsed:.1f} s")
+    print(f"stored: {points} swinging-door points, {events} edge events "
+          f"({(points + events) / (count * len(columns)) * 100:.3f}% of the samples)")
+    print(f"{'database':<12} {'KiB':>10} {'bytes/scan':>11}")
+    for name, size in sizes.items():
+        print(f"{name:<12} {size / 1024:>10.0f} {size / count:>11.1f}")
+
+    # Rebuilt series against the originals
+    conns['plain'].close()
+    compressed.execute(f"ATTACH '{paths['plain']}' AS plain (READ_ONLY)")
+    started = time.perf_counter()
+    errors = compressed.execute(
+        "SELECT " + ", ".join(
+            f'max(abs(f."{column}" - p."{column}")), max(abs(f."{column}{channels.EU_SUFFIX}" - p."{column}{channels.EU_SUFFIX}")), '
+            f'count(f."{column}")'
+            for _, _, _, column in columns
+        )
+        + f" FROM {compression.FULL_VIEW} f JOIN plain.{db.SCAN_TABLE} p USING (id)"
+    ).fetchone()
+    rebuild_s = time.perf_counter() - started
+    print(f"rebuilt {count} scans through {compression.FULL_VIEW} in {rebuild_s:.2f} s")
+    print(f"{'channel':<24} {'compression':<14} {'counts error':>12} {'eu error':>9} {'rebuilt':>8}")
+    failures = []
+    for index, (chip, channel, tag, _) in enumerate(columns):
+        error, eu_error, rebuilt = errors[3 * index:3 * index + 3]
+        c = layout.by_tag[tag]
+        print(f"{tag:<24} {c.compression:<14} {error:>12} {eu_error:>9.4f} {rebuilt:>8}")
+        if rebuilt != count:
+            failures.append(f"{tag}: {count - rebuilt} scans not rebuilt")
+        if c.compression == 'edge':
+            # Only transitions are kept: the state must be exact, the counts
+            # in between read back as the value at the transition
+            if eu_error:
+                failures.append(f"{tag}: state differs from the original")
+        elif c.compression != 'none' and error > c.deviation + 0.5:
+            # Rounding the interpolated value to whole counts can add half a count
+            failures.append(f"{tag}: off by {error} counts, deviation is {c.deviation:g}")
+    compressed.close()
+
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("OK: states are exact and every analog sample is within the configured deviation")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# benchmarks/bench_contention.py
+"""set_gpio latency while many threads poll the ADC and output state.
+
+Usage: python benchmarks/bench_contention.py [pollers] [seconds] [bound_ms] [latency_us]
+
+Pollers alternate full ADC scans (read_all_adc, 16 simulated SPI transfers
+of `latency_us` each) with get_gpio_states(), like dashboards polling
+without the acquisition thread. Meanwhile the main thread toggles an
+output every few milliseconds and times each set_gpio call.
+
+It runs twice: with the current locks, then with set_gpio forced behind
+spi_lock as it was when one io_lock guarded everything. The script exits
+with status 1 if the current worst case exceeds `bound_ms`.
+"""
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import backends
+from app import pi_io
+
+TOGGLE_PIN = 17
+TOGGLE_INTERVAL_S = 0.005
+
+
+def poller(stop, counts, index):
+    while not stop.is_set():
+        pi_io.read_all_adc()
+        pi_io.get_gpio_states()
+        counts[index] += 1
+
+
+def run(pollers, seconds, single_lock):
+    stop = threading.Event()
+    counts = [0] * pollers
+    threads = [threading.Thread(target=poller, args=(stop, counts, i), daemon=True) for i in range(pollers)]
+    for thread in threads:
+        thread.start()
+
+    latencies = []
+    state = False
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        state = not state
+        started = time.perf_counter()
+        if single_lock:
+            with pi_io.spi_lock:
+                result = pi_io.set_gpio(TOGGLE_PIN, state)
+        else:
+            result = pi_io.set_gpio(TOGGLE_PIN, state)
+        latencies.append(time.perf_counter() - started)
+        assert result['success'], result
+        time.sleep(TOGGLE_INTERVAL_S)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        'calls': n,
+        'p50_ms': latencies[n // 2] * 1000,
+        'p99_ms': latencies[min(n - 1, int(n * 0.99))] * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'polls_per_s': sum(counts) / seconds,
+    }
+
+
+def main():
+    pollers = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    bound_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 2.0
+    latency_us = float(sys.argv[4]) if len(sys.argv) > 4 else 80.0
+
+    # Simulated SPI devices and outputs, also when run on the Pi
+    backends.SimulatedSpiDev.latency = latency_us / 1e6
+    pi_io.init_hardware(backends.SimulationBackend())
+    # Waiting for the GIL is part of the measured latency, so report the switch interval
+    print(f"{pollers} pollers, {seconds:g} s, {latency_us:g} us per SPI transfer, "
+          f"GIL switch interval {sys.getswitchinterval() * 1000:g} ms")
+
+    print(f"{'locking':<14} {'calls':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'polls/s':>9}")
+    results = {}
+    for name, single_lock in (('split', False), ('single lock', True)):
+        results[name] = result = run(pollers, seconds, single_lock)
+        print(f"{name:<14} {result['calls']:>6} {result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+              f"{result['max_ms']:>8.3f} {result['polls_per_s']:>9.0f}")
+
+    worst = results['split']['max_ms']
+    if worst > bound_ms:
+        print(f"FAIL: set_gpio took up to {worst:.3f} ms, bound is {bound_ms:g} ms")
+        return 1
+    print(f"OK: set_gpio stayed under {bound_ms:g} ms with {pollers} concurrent pollers")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# benchmarks/bench_serialization.py
+"""Per-request CPU cost of the hot API payloads: jsonify on dicts vs msgspec.
+
+Usage: python benchmarks/bench_serialization.py [iterations]
+
+"encode" rows time building and serializing the body alone; "request" rows
+time a full authenticated request through the Flask test client, with the
+previous dict + jsonify handlers mounted next to the current ones. Times
+are CPU time of the calling thread (the acquisition and writer threads are
+excluded), so run it on the Pi for representative numbers.
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import msgspec
+from flask import jsonify
+
+from app import create_app
+from app import acquisition
+from app import db
+from app import pi_io
+from app import schemas
+from app import startup
+from app.auth import login_required
+
+
+def legacy_snapshot_dict(snapshot):
+    """The /api/adc-values body as it was built before the msgspec schemas."""
+    data = {chip: list(counts) for chip, counts in snapshot.values.items()}
+    data['seq'] = snapshot.seq
+    data['timestamp'] = snapshot.timestamp.isoformat()
+    data['scan_duration_ms'] = round(snapshot.scan_duration * 1000, 3)
+    data['jitter_ms'] = round(snapshot.jitter * 1000, 3)
+    data['rate_hz'] = acquisition.engine.rate_hz
+    data['jitter'] = acquisition.engine.jitter_stats()
+    return data
+
+
+def legacy_gpio_states():
+    """get_gpio_states() as it was: a str-keyed dict rebuilt into the response shape."""
+    states = {}
+    with pi_io.gpio_lock:
+        for pin_number in pi_io.GPIO_PINS:
+            if pin_number in pi_io.PWM_PINS:
+                states[str(pin_number)] = pi_io.gpio_states.get(f"pwm_{pin_number}", 0)
+            else:
+                states[str(pin_number)] = pi_io.gpio_states.get(pin_number, False)
+    response = {}
+    for pin, state in states.items():
+        pin_number = int(pin)
+        if pin_number in pi_io.PWM_PINS:
+            response.setdefault('pwm', {})[str(pin_number)] = state
+        else:
+            response[str(pin_number)] = state
+    return response
+
+
+def cpu_us(fn, iterations):
+    fn()  # Warm up caches and lazy imports
+    started = time.thread_time()
+    for _ in range(iterations):
+        fn()
+    return (time.thread_time() - started) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    # Scratch database with only the default admin user
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix='bench_serialization_'), 'bench.duckdb')
+    app = create_app()
+    startup.wait_ready()
+
+    @app.route('/legacy/adc-values')
+    @login_required
+    def legacy_adc_values():
+        return jsonify(legacy_snapshot_dict(acquisition.get_snapshot()))
+
+    @app.route('/legacy/gpio-states')
+    @login_required
+    def legacy_gpio():
+        return jsonify(legacy_gpio_states())
+
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin'})
+    json_encoder = schemas.ENCODERS[schemas.JSON_MIMETYPE]
+    msgpack_encoder = schemas.ENCODERS[schemas.MSGPACK_MIMETYPE]
+
+    with app.app_context():
+        rows = [
+            ('encode adc-values', 'jsonify(dict)',
+             lambda: jsonify(legacy_snapshot_dict(acquisition.get_snapshot()))),
+            ('encode adc-values', 'msgspec json',
+             lambda: json_encoder.encode(acquisition.snapshot_to_struct(acquisition.get_snapshot()))),
+            ('encode adc-values', 'msgspec msgpack',
+             lambda: msgpack_encoder.encode(acquisition.snapshot_to_struct(acquisition.get_snapshot()))),
+            ('encode gpio-states', 'jsonify(dict)', lambda: jsonify(legacy_gpio_states())),
+            ('encode gpio-states', 'msgspec json', lambda: json_encoder.encode(pi_io.read_gpio_states())),
+            ('encode gpio-states', 'msgspec msgpack', lambda: msgpack_encoder.encode(pi_io.read_gpio_states())),
+        ]
+        results = [(name, variant, cpu_us(fn, iterations)) for name, variant, fn in rows]
+
+    msgpack = {'Accept': schemas.MSGPACK_MIMETYPE}
+    requests = [
+        ('request adc-values', 'jsonify(dict)', lambda: client.get('/legacy/adc-values')),
+        ('request adc-values', 'msgspec json', lambda: client.get('/api/adc-values')),
+        ('request adc-values', 'msgspec msgpack', lambda: client.get('/api/adc-values', headers=msgpack)),
+        ('request gpio-states', 'jsonify(dict)', lambda: client.get('/legacy/gpio-states')),
+        ('request gpio-states', 'msgspec json', lambda: client.get('/api/gpio-states')),
+        ('request gpio-states', 'msgspec msgpack', lambda: client.get('/api/gpio-states', headers=msgpack)),
+    ]
+    request_iterations = max(1, iterations // 10)
+    results += [(name, variant, cpu_us(fn, request_iterations)) for name, variant, fn in requests]
+
+    # The new handlers must serve exactly what the old ones did
+    assert client.get('/api/gpio-states').get_json() == client.get('/legacy/gpio-states').get_json()
+    assert set(msgspec.json.decode(client.get('/api/adc-values').data)) == \
+        set(client.get('/legacy/adc-values').get_json())
+
+    print(f"{'payload':<22} {'variant':<16} {'cpu us':>9} {'vs jsonify':>11}")
+    baseline = {}
+    for name, variant, us in results:
+        baseline.setdefault(name, us)
+        print(f"{name:<22} {variant:<16} {us:>9.1f} {baseline[name] / us:>10.2f}x")
+
+    acquisition.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_sessions.py
+"""Per-request latency of the session backends.
+
+Usage: python benchmarks/bench_sessions.py [requests]
+
+Each backend serves a minimal authenticated route through the Flask test
+client, so the numbers isolate session load/save cost. Run it on the Pi to
+include SD-card latency for the filesystem backend.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask, session
+
+from app import sessions
+
+
+def make_app(backend, session_dir):
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'bench'
+    app.config['SESSION_BACKEND'] = backend
+    app.config['SESSION_PERMANENT'] = False
+    app.config['SESSION_USE_SIGNER'] = True
+    app.config['SESSION_FILE_DIR'] = session_dir
+    sessions.init_app(app)
+
+    @app.route('/login')
+    def login():
+        session['user_id'] = 1
+        session['username'] = 'admin'
+        return 'ok'
+
+    @app.route('/poll')
+    def poll():
+        # Same access pattern as load_logged_in_user + login_required
+        return 'ok' if session.get('user_id') is not None else ('no session', 401)
+
+    return app
+
+
+def bench(backend, session_dir, requests):
+    app = make_app(backend, session_dir)
+    client = app.test_client()
+    client.get('/login')
+
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get('/poll')
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, f"{backend}: lost the session"
+
+    latencies.sort()
+    return {
+        'mean_us': sum(latencies) / len(latencies) * 1e6,
+        'p50_us': latencies[len(latencies) // 2] * 1e6,
+        'p99_us': latencies[int(len(latencies) * 0.99)] * 1e6,
+    }
+
+
+def check_migration(session_dir):
+    """A user logged in with the filesystem backend stays logged in after switching."""
+    old_client = make_app('filesystem', session_dir).test_client()
+    old_client.get('/login')
+    cookie = old_client.get_cookie('session')
+
+    new_client = make_app('memory', session_dir).test_client()
+    new_client.set_cookie('session', cookie.value)
+    return new_client.get('/poll').status_code == 200
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    session_dir = tempfile.mkdtemp(prefix='bench_sessions_')
+    try:
+        print(f"{'backend':<12} {'mean us':>9} {'p50 us':>9} {'p99 us':>9}")
+        for backend in sessions.BACKENDS:
+            result = bench(backend, session_dir, requests)
+            print(f"{backend:<12} {result['mean_us']:>9.1f} {result['p50_us']:>9.1f} {result['p99_us']:>9.1f}")
+        print(f"filesystem -> memory migration keeps users logged in: {check_migration(session_dir)}")
+    finally:
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# benchmarks/bench_spi.py
+"""Compare MCP3008 scan strategies using the simulated SPI devices.
+
+Usage: python benchmarks/bench_spi.py [latency_us] [scans]
+
+`latency_us` is the simulated cost of one SPI ioctl; on a Pi 4 a small xfer2
+costs roughly 50-100 us including the Python call overhead.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import backends
+from app import pi_io
+
+
+def run(mode, oversample, scans):
+    pi_io.configure_adc(mode=mode, oversample=oversample)
+    for spi in pi_io.spi_devices.values():
+        spi.reset_counters()
+
+    started = time.perf_counter()
+    for _ in range(scans):
+        pi_io.read_all_adc()
+    elapsed = time.perf_counter() - started
+
+    transfers = sum(spi.transfer_count for spi in pi_io.spi_devices.values())
+    return elapsed / scans, transfers / scans
+
+
+def main():
+    latency_us = float(sys.argv[1]) if len(sys.argv) > 1 else 80.0
+    scans = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    # Simulated SPI devices, also when run on the Pi
+    backends.SimulatedSpiDev.latency = latency_us / 1e6
+    pi_io.init_hardware(backends.SimulationBackend())
+
+    print(f"Simulated SPI latency: {latency_us:g} us per transfer, {scans} scans")
+    print(f"{'mode':<12} {'oversample':>10} {'ms/scan':>10} {'xfers/scan':>11}")
+    for mode in pi_io.SCAN_MODES:
+        for oversample in (1, 4, 8):
+            per_scan, transfers = run(mode, oversample, scans)
+            print(f"{mode:<12} {oversample:>10} {per_scan * 1000:>10.3f} {transfers:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
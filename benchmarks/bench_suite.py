@@ -0,0 +1,440 @@
+# benchmarks/bench_suite.py
+"""Benchmark suite for the acquisition, logging and API hot paths.
+
+Usage:
+    python benchmarks/bench_suite.py run [--output results.json] [--latency-us 80] [--quick]
+    python benchmarks/bench_suite.py compare baseline.json candidate.json [--threshold 15]
+
+`run` starts the app in simulation mode on a scratch database and times:
+read_all_adc with a simulated SPI latency per transfer, get_gpio_states,
+log_sensor_data throughput (rows/s until the writer has committed them),
+authenticate_user, reading a snapshot from the daemon's shared memory and a
+daemon command round trip (IO_MODE=client), the lateness of sequence
+steps with many sequences running at once, and one authenticated
+test-client request per /api route. It also starts the server twice in a
+subprocess, on a new database and again on the same one, and records the
+time to the first answered request and to the end of the warm-up, with the
+startup profile of each run.
+Results (with machine and commit info) go to a JSON file.
+
+`compare` matches two result files by benchmark name and flags every metric
+that got worse by more than the threshold percentage. It exits with status 1
+if anything regressed, so it can gate a deploy to the Pi.
+"""
+import io
+import os
+import sys
+import json
+import time
+import socket
+import urllib.parse
+import urllib.request
+import http.cookiejar
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app
+from app import acquisition
+from app import backends
+from app import db
+from app import ipc
+from app import pi_io
+from app import sequencer
+from app import shared_state
+from app import startup
+from app import writer
+
+DEFAULT_LATENCY_US = 80.0
+DEFAULT_THRESHOLD_PCT = 15.0
+
+# Metric compared between runs for each kind of result, and which way is better
+PRIMARY_METRICS = {
+    'latency': ('p50_us', 'lower'),
+    'throughput': ('rows_per_s', 'higher'),
+    'startup': ('first_request_ms', 'lower'),
+}
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Server started by bench_startup, like run.py but without the debugger
+SERVER_SCRIPT = (
+    "import sys; sys.path.insert(0, sys.argv[1]); from app import create_app; "
+    "create_app().run(host='127.0.0.1', port=int(sys.argv[2]))"
+)
+STARTUP_TIMEOUT_S = 120
+
+# (method, path, JSON body) per /api route; {experiment_id} is filled in at run time
+API_REQUESTS = [
+    ('GET', '/api/adc-values', None),
+    ('GET', '/api/adc-history?since=0&limit=100', None),
+    ('GET', '/api/channels', None),
+    ('GET', '/api/gpio-states', None),
+    ('POST', '/api/set-gpio', {'gpio': 17, 'state': True}),
+    ('POST', '/api/set-pwm', {'gpio': 12, 'value': 50}),
+    ('POST', '/api/io-batch', {'operations': [{'gpio': 17, 'state': False}, {'gpio': 12, 'value': 25}]}),
+    ('POST', '/api/log-sensor-data', {}),
+    ('GET', '/api/writer-metrics', None),
+    ('GET', '/api/experiments', None),
+    ('GET', '/api/experiments/{experiment_id}/summary', None),
+    ('GET', '/api/experiments/{experiment_id}/readings', None),
+    ('GET', '/api/experiments/{experiment_id}/export?format=csv', None),
+    ('GET', '/api/recording/status', None),
+    ('GET', '/api/sequences', None),
+    ('GET', '/api/metrics', None),
+    ('GET', '/api/io-backend', None),
+    ('GET', '/api/db-health', None),
+    ('GET', '/api/startup-profile', None),
+]
+
+# Routes deliberately left out, with the reason; any other unlisted route is reported
+SKIPPED_ROUTES = {
+    '/api/stream': 'long-lived SSE response',
+    '/api/experiments/<int:experiment_id>/recording/start': 'changes the acquisition rate',
+    '/api/recording/stop': 'only meaningful after recording/start',
+    '/api/sequences/<int:sequence_id>': 'covered by bench_sequencer',
+    '/api/sequences/<int:sequence_id>/cancel': 'covered by bench_sequencer',
+}
+
+
+def latency_stats(samples):
+    """Summary of per-call latencies given in seconds."""
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        'kind': 'latency',
+        'n': n,
+        'mean_us': round(sum(samples) / n * 1e6, 2),
+        'min_us': round(samples[0] * 1e6, 2),
+        'p50_us': round(samples[n // 2] * 1e6, 2),
+        'p95_us': round(samples[min(n - 1, int(n * 0.95))] * 1e6, 2),
+        'p99_us': round(samples[min(n - 1, int(n * 0.99))] * 1e6, 2),
+    }
+
+
+def measure(fn, iterations, warmup=10):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return latency_stats(samples)
+
+
+def bench_read_all_adc(iterations, latency_us):
+    backends.SimulatedSpiDev.latency = latency_us / 1e6
+    for spi in pi_io.spi_devices.values():
+        spi.reset_counters()
+    result = measure(pi_io.read_all_adc, iterations)
+    result['latency_us_per_transfer'] = latency_us
+    result['transfers_per_call'] = round(
+        sum(spi.transfer_count for spi in pi_io.spi_devices.values()) / (iterations + 10), 2
+    )
+    return result
+
+
+def bench_log_sensor_data(rows, experiment_id):
+    """Rows per second from log_sensor_data() until the writer has committed them."""
+    written_before = writer.get_written(experiment_id)
+    started = time.perf_counter()
+    submitted = sum(1 for _ in range(rows) if pi_io.log_sensor_data(experiment_id))
+    submit_s = time.perf_counter() - started
+
+    deadline = time.monotonic() + 120
+    while writer.get_written(experiment_id) - written_before < submitted:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Sensor writer did not drain within 120 s")
+        time.sleep(0.005)
+    total_s = time.perf_counter() - started
+
+    return {
+        'kind': 'throughput',
+        'rows': submitted,
+        'dropped': rows - submitted,
+        'rows_per_s': round(submitted / total_s, 1),
+        'submit_us_per_row': round(submit_s / max(1, submitted) * 1e6, 2),
+    }
+
+
+def bench_authenticate_user(app, iterations):
+    with app.app_context():
+        assert db.authenticate_user('admin', 'admin') is not None
+        return measure(lambda: db.authenticate_user('admin', 'admin'), iterations, warmup=2)
+
+
+def bench_shared_state(directory, iterations):
+    """What a web worker pays in IO_MODE=client instead of in-process calls."""
+    name = f'bench_suite_{os.getpid()}'
+    publisher = shared_state.Publisher(name)
+    reader = shared_state.Reader(name)
+    server = ipc.Server(os.path.join(directory, 'bench.sock'), 'bench', {'ping': os.getpid})
+    server.start()
+    client = ipc.Client(server.address, 'bench')
+    try:
+        snapshot = acquisition.get_snapshot()
+        publisher.publish_snapshot(snapshot)
+        results = {'shared_state snapshot (unchanged)': measure(reader.snapshot, iterations)}
+
+        seqs = iter(range(snapshot.seq + 1, snapshot.seq + iterations + 100))
+
+        def read_new():
+            # A new seq every time, so the snapshot is decoded from the mapping
+            publisher.publish_snapshot(snapshot._replace(seq=next(seqs)))
+            reader.snapshot()
+
+        results['shared_state publish + snapshot'] = measure(read_new, iterations)
+        results['ipc round trip'] = measure(lambda: client.call('ping'), iterations)
+    finally:
+        client.close()
+        server.close()
+        reader.close()
+        publisher.close()
+    return results
+
+
+def bench_sequencer(count):
+    """Lateness of timed sequence steps with `count` sequences running at once."""
+    steps = [{'action': 'wait', 'seconds': 0.1}, {'action': 'mark', 'name': 'a'}] * 5
+    with contextlib.redirect_stdout(io.StringIO()):
+        ids = [sequencer.start(steps, f'bench {i}')['sequence']['id'] for i in range(count)]
+        deadline = time.monotonic() + 30
+        while sequencer.scheduler.active():
+            if time.monotonic() > deadline:
+                raise RuntimeError("Sequences did not finish within 30 s")
+            time.sleep(0.05)
+        # Also exercise the routes the API benchmark skips
+        assert not sequencer.cancel(ids[0])['success']
+    late = [entry['late_ms'] / 1000 for i in ids for entry in sequencer.status(i)['sequence']['log']]
+    result = latency_stats([max(0.0, value) for value in late])
+    result['sequences'] = count
+    return result
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(directory):
+    """Time to the first answered request of a new server process, and its startup profile."""
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    env = dict(os.environ, IO_BACKEND='simulation', IO_MODE='local', STARTUP_WARMUP='deferred')
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-c', SERVER_SCRIPT, ROOT, str(port)], cwd=directory,
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited with status {server.returncode}")
+            if time.perf_counter() - started > STARTUP_TIMEOUT_S:
+                raise RuntimeError(f"Server did not answer within {STARTUP_TIMEOUT_S} s")
+            try:
+                with urllib.request.urlopen(base + '/login', timeout=1) as response:
+                    response.read()
+                break
+            except OSError:
+                time.sleep(0.01)
+        first_request = time.perf_counter() - started
+
+        # /api requests wait for the warm-up, so this answers once it is done
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        form = urllib.parse.urlencode({'username': 'admin', 'password': 'admin'}).encode()
+        opener.open(base + '/login', form, timeout=STARTUP_TIMEOUT_S).read()
+        with opener.open(base + '/api/startup-profile', timeout=STARTUP_TIMEOUT_S) as response:
+            profile = json.load(response)
+        ready = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(30)
+    return {
+        'kind': 'startup',
+        'first_request_ms': round(first_request * 1000, 1),
+        'ready_ms': round(ready * 1000, 1),
+        'create_app_ms': profile['serving_ms'],
+        'warm_up_ms': round(profile['ready_ms'] - profile['serving_ms'], 1),
+        'phases_ms': {phase['name']: phase['duration_ms'] for phase in profile['phases']},
+    }
+
+
+def bench_startup():
+    """Server start on a new database (schema and admin user created) and on an existing one."""
+    directory = tempfile.mkdtemp(prefix='bench_startup_')
+    return {
+        'startup new database': _start_server(directory),
+        'startup existing database': _start_server(directory),
+    }
+
+
+def bench_api(app, experiment_id, iterations):
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin'})
+    results = {}
+    for method, path, body in API_REQUESTS:
+        path = path.format(experiment_id=experiment_id)
+
+        def request():
+            response = client.open(path, method=method, json=body)
+            response.close()  # Runs the streaming export's cleanup
+            assert response.status_code == 200, f"{method} {path}: {response.status_code}"
+
+        results[f"api {method} {path.split('?')[0].replace(str(experiment_id), '<id>')}"] = \
+            measure(request, iterations)
+    return results
+
+
+def uncovered_routes(app):
+    covered = {path.split('?')[0] for _, path, _ in API_REQUESTS}
+    routes = set()
+    for rule in app.url_map.iter_rules():
+        if rule.rule.startswith('/api/') and rule.rule not in SKIPPED_ROUTES:
+            routes.add(rule.rule.replace('<int:experiment_id>', '{experiment_id}'))
+    return sorted(routes - covered)
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'raspberry_pi': backends.is_raspberry_pi(),
+    }
+
+
+def run(args):
+    scale = 0.1 if args.quick else 1.0
+    iterations = lambda n: max(20, int(n * scale))
+
+    # Simulated devices (also on the Pi) and a scratch database, so the
+    # suite never drives real outputs or touches experiment data
+    os.environ['IO_BACKEND'] = 'simulation'
+    db.DB_PATH = os.path.join(tempfile.mkdtemp(prefix='bench_suite_'), 'bench.duckdb')
+    print("startup ...")
+    results = bench_startup()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = create_app()
+        startup.wait_ready()
+        # Benchmarks call the I/O functions directly; a background scan loop
+        # would compete for spi_lock and add noise
+        acquisition.stop()
+
+    with app.app_context():
+        conn = db.get_db()
+        experiment_id = conn.execute(
+            "INSERT INTO experiments (id, user_id, fuel_type, test_duration) "
+            "VALUES (nextval('experiment_id_seq'), 1, 'benchmark', 1) RETURNING id"
+        ).fetchone()[0]
+
+    print("read_all_adc ...")
+    results['read_all_adc'] = bench_read_all_adc(iterations(500), args.latency_us)
+    backends.SimulatedSpiDev.latency = 0.0
+    print("get_gpio_states ...")
+    results['get_gpio_states'] = measure(pi_io.get_gpio_states, iterations(5000))
+    print("log_sensor_data ...")
+    results['log_sensor_data'] = bench_log_sensor_data(iterations(5000), experiment_id)
+    print("authenticate_user ...")
+    results['authenticate_user'] = bench_authenticate_user(app, iterations(50))
+    print("shared state and ipc ...")
+    results.update(bench_shared_state(os.path.dirname(db.DB_PATH), iterations(5000)))
+    print("sequencer ...")
+    results['sequencer step lateness'] = bench_sequencer(max(10, int(100 * scale)))
+    print("api routes ...")
+    results.update(bench_api(app, experiment_id, iterations(300)))
+
+    missing = uncovered_routes(app)
+    report = {'environment': environment(), 'latency_us': args.latency_us,
+              'quick': args.quick, 'uncovered_routes': missing, 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_results(results)
+    if missing:
+        print(f"Routes without a benchmark: {', '.join(missing)}")
+    print(f"Saved {len(results)} results to {args.output}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        pi_io.cleanup()
+    return 0
+
+
+def print_results(results):
+    print(f"{'benchmark':<48} {'p50 us':>10} {'p95 us':>10} {'rows/s':>10}")
+    for name, result in results.items():
+        if result['kind'] == 'latency':
+            print(f"{name:<48} {result['p50_us']:>10.1f} {result['p95_us']:>10.1f} {'':>10}")
+        elif result['kind'] == 'startup':
+            print(f"{name:<48} first request {result['first_request_ms']:.0f} ms, "
+                  f"ready {result['ready_ms']:.0f} ms")
+        else:
+            print(f"{name:<48} {'':>10} {'':>10} {result['rows_per_s']:>10.0f}")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    if baseline.get('quick') != candidate.get('quick') or baseline.get('latency_us') != candidate.get('latency_us'):
+        print("WARNING: the runs used different settings (--quick or --latency-us)")
+
+    regressions = 0
+    print(f"{'benchmark':<48} {'metric':<11} {'baseline':>11} {'candidate':>11} {'change':>8}")
+    for name, base in baseline['results'].items():
+        new = candidate['results'].get(name)
+        if new is None:
+            print(f"{name:<48} missing from candidate")
+            continue
+        metric, better = PRIMARY_METRICS[base['kind']]
+        change = (new[metric] - base[metric]) / base[metric] * 100 if base[metric] else 0.0
+        worse = change > args.threshold if better == 'lower' else change < -args.threshold
+        improved = change < -args.threshold if better == 'lower' else change > args.threshold
+        flag = 'REGRESSION' if worse else ('improved' if improved else '')
+        regressions += worse
+        print(f"{name:<48} {metric:<11} {base[metric]:>11.1f} {new[metric]:>11.1f} {change:>+7.1f}% {flag}")
+
+    for name in candidate['results'].keys() - baseline['results'].keys():
+        print(f"{name:<48} new in candidate")
+
+    print(f"{regressions} regression(s) beyond {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the suite and save the results')
+    run_parser.add_argument('--output', '-o', default='bench_results.json')
+    run_parser.add_argument('--latency-us', type=float, default=DEFAULT_LATENCY_US,
+                            help='simulated cost of one SPI transfer')
+    run_parser.add_argument('--quick', action='store_true', help='10%% of the iterations')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions between two runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD_PCT,
+                                help='percent change treated as a regression')
+
+    args = parser.parse_args(argv)
+    return run(args) if args.command == 'run' else compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
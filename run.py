@@ -1,11 +1,8 @@
 # run.py
 from app import create_app
-import os
-
-# Create directory for Flask session files if it doesn't exist
-os.makedirs('flask_session', exist_ok=True)
 
 app = create_app()
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5002)
\ No newline at end of file
+    # The reloader would run create_app, and claim the hardware, in a second process
+    app.run(debug=True, host='0.0.0.0', port=5002, use_reloader=False)
\ No newline at end of file
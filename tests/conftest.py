@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+from app import db
+
+
+@pytest.fixture
+def scratch_db(tmp_path, monkeypatch):
+    """Point the app at an empty database file in a temporary directory."""
+    db.close_connection()
+    monkeypatch.setattr(db, 'DB_PATH', os.path.join(tmp_path, 'test.duckdb'))
+    monkeypatch.setattr(db, '_ready', False)
+    yield db.DB_PATH
+    db.close_connection()
@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+from app import acquisition
+from app import pi_io
+
+
+def _slow_scan(calls):
+    def scan():
+        calls.append(threading.current_thread().name)
+        time.sleep(0.02)
+        return {chip.name: [0] * 8 for chip in pi_io.CHIPS}
+    return scan
+
+
+def _run_together(fn, threads=8):
+    results = []
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        results.append(fn())
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for worker_thread in workers:
+        worker_thread.start()
+    for worker_thread in workers:
+        worker_thread.join()
+    return results
+
+
+def test_concurrent_first_requests_share_one_scan():
+    calls = []
+    engine = acquisition.AcquisitionEngine(scan=_slow_scan(calls))
+    snapshots = _run_together(engine.get_or_scan)
+    assert len(calls) == 1
+    assert {snapshot.seq for snapshot in snapshots} == {1}
+
+
+def test_concurrent_scans_get_distinct_seqs():
+    engine = acquisition.AcquisitionEngine(scan=_slow_scan([]))
+    snapshots = _run_together(engine.scan_once)
+    assert sorted(snapshot.seq for snapshot in snapshots) == list(range(1, 9))
+    assert engine.get_snapshot().seq == 8
+
+
+def test_no_snapshot_without_a_backend(monkeypatch):
+    calls = []
+    monkeypatch.setattr(acquisition, 'engine', acquisition.AcquisitionEngine(scan=_slow_scan(calls)))
+    monkeypatch.setattr(pi_io, 'backend', None)
+    assert acquisition.get_snapshot() is None
+    assert calls == []
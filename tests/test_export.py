@@ -0,0 +1,36 @@
+import tempfile
+
+import pytest
+
+from app import db
+from app import export
+
+
+@pytest.fixture
+def experiment_id(scratch_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path / 'exports'))
+    (tmp_path / 'exports').mkdir()
+    db.ensure_ready()
+    cur = db.cursor()
+    try:
+        cur.execute("INSERT INTO experiments (id, user_id, fuel_type, test_duration) VALUES (7, 1, 'diesel', 5)")
+    finally:
+        db.close_cursor(cur)
+    return 7
+
+
+def test_export_leaves_no_file_behind(experiment_id, tmp_path):
+    f, size, mimetype, filename = export.export_experiment(experiment_id, 'csv')
+    # Deleted before the response is built: nothing to clean up if it is never streamed
+    assert list((tmp_path / 'exports').iterdir()) == []
+    body = b''.join(export.stream_file(f))
+    assert f.closed
+    assert len(body) == size
+    assert body.startswith(b'experiment_id,fuel_type')
+    assert (mimetype, filename) == ('text/csv', 'experiment_7.csv')
+
+
+def test_unknown_experiment_leaves_no_file_behind(experiment_id, tmp_path):
+    with pytest.raises(LookupError):
+        export.export_experiment(99, 'parquet')
+    assert list((tmp_path / 'exports').iterdir()) == []
@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from app import acquisition
+from app import history
+
+
+def _buffer(seqs, capacity=8):
+    buffer = history.RingBuffer(capacity, {'mcp1': 2})
+    for seq in seqs:
+        buffer.append(acquisition.Snapshot(seq, datetime.now(), 0.0, {'mcp1': (seq, 0)}, None, 0.0, 0.0))
+    return buffer
+
+
+def test_pages_follow_the_cursor():
+    buffer = _buffer(range(1, 6))
+    page = buffer.since(0, limit=3)
+    assert page['seq'] == [1, 2, 3]
+    assert page['more'] and not page['truncated'] and not page['reset']
+    page = buffer.since(page['last_seq'], limit=3)
+    assert page['seq'] == [4, 5]
+    assert page['mcp1'][0] == [4.0, 5.0]
+    assert not page['more']
+    assert buffer.since(5)['seq'] == []
+    assert buffer.since(5)['last_seq'] == 5
+
+
+def test_overwritten_samples_are_reported_as_truncated():
+    page = _buffer(range(1, 13), capacity=8).since(2)
+    assert page['seq'] == list(range(5, 13))
+    assert page['truncated'] and not page['reset']
+
+
+def test_cursor_ahead_of_the_buffer_starts_again_from_the_oldest_sample():
+    # The client polled seq 500 before a restart numbered scans from 1 again
+    buffer = _buffer(range(1, 13), capacity=8)
+    page = buffer.since(500)
+    assert page['seq'] == list(range(5, 13))
+    assert page['truncated'] and page['reset']
+    assert page['last_seq'] == 12
+    assert not buffer.since(page['last_seq'])['reset']
+
+
+def test_cursor_ahead_of_an_empty_buffer_is_reset_to_zero():
+    page = _buffer([]).since(500)
+    assert page['seq'] == []
+    assert page['reset'] and page['last_seq'] == 0
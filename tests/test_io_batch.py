@@ -0,0 +1,37 @@
+import pytest
+
+from app import backends
+from app import pi_io
+
+
+@pytest.fixture
+def simulated_io(monkeypatch):
+    monkeypatch.setattr(pi_io, 'backend', None)
+    pi_io.init_hardware(backends.SimulationBackend())
+    yield pi_io.backend
+    pi_io.backend.close()
+
+
+def test_operation_with_both_state_and_value_is_rejected(simulated_io):
+    before = pi_io.get_gpio_states()
+    result = pi_io.set_outputs([
+        {'gpio': 2, 'state': True},
+        {'gpio': 12, 'state': True, 'value': 40},
+    ])
+    assert not result['success']
+    assert result['results'] == [
+        {'success': False, 'error': 'Not applied'},
+        {'success': False, 'error': 'Operation on GPIO 12 has both a state and a value'},
+    ]
+    assert pi_io.get_gpio_states() == before
+
+
+def test_valid_batch_is_applied(simulated_io):
+    result = pi_io.set_outputs([
+        {'gpio': 2, 'state': True, 'value': None},
+        {'gpio': 12, 'state': None, 'value': 40},
+    ])
+    assert result['success']
+    states = pi_io.get_gpio_states()
+    assert states['2'] is True
+    assert states['pwm']['12'] == 40
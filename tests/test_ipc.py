@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from multiprocessing.connection import Listener
+
+import pytest
+
+from app import ipc
+
+SECRET = 'test-secret'
+
+
+@pytest.fixture
+def address(tmp_path):
+    return os.path.join(tmp_path, 'daemon.sock')
+
+
+def test_slow_command_does_not_hold_up_other_threads(address):
+    release = threading.Event()
+    server = ipc.Server(address, SECRET, {'slow': lambda: release.wait(5), 'fast': lambda: 'done'})
+    server.start()
+    client = ipc.Client(address, SECRET)
+    try:
+        slow = threading.Thread(target=client.call, args=('slow',))
+        slow.start()
+        time.sleep(0.1)
+        started = time.monotonic()
+        assert client.call('fast') == 'done'
+        assert time.monotonic() - started < 1.0
+        release.set()
+        slow.join(5)
+    finally:
+        release.set()
+        client.close()
+        server.close()
+
+
+def test_errors_are_raised(address):
+    server = ipc.Server(address, SECRET, {'fail': lambda: 1 / 0})
+    server.start()
+    client = ipc.Client(address, SECRET)
+    try:
+        with pytest.raises(RuntimeError, match='division'):
+            client.call('fail')
+        with pytest.raises(RuntimeError, match='Unknown daemon command'):
+            client.call('missing')
+    finally:
+        client.close()
+        server.close()
+
+
+def _serve(listener, handle):
+    """Accept connections until the listener is closed."""
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError:
+            return
+        handle(conn)
+
+
+def test_command_is_not_run_twice_when_the_daemon_drops_the_reply(address):
+    listener = Listener(address, family='AF_UNIX', authkey=SECRET.encode())
+    received = []
+
+    def handle(conn):
+        # The command runs, then the daemon goes away before replying
+        received.append(conn.recv())
+        conn.close()
+
+    thread = threading.Thread(target=_serve, args=(listener, handle), daemon=True)
+    thread.start()
+    client = ipc.Client(address, SECRET)
+    try:
+        with pytest.raises(RuntimeError, match='Lost the acquisition daemon'):
+            client.call('sequence_start', [], 'once')
+        time.sleep(0.1)
+        assert received == [('sequence_start', ([], 'once'), {})]
+    finally:
+        client.close()
+        listener.close()
+
+
+def test_reconnects_after_the_daemon_closed_an_idle_connection(address):
+    listener = Listener(address, family='AF_UNIX', authkey=SECRET.encode())
+    calls = []
+
+    def handle(conn):
+        # Answer one call per connection, as if the daemon restarted in between
+        name, args, kwargs = conn.recv()
+        calls.append(name)
+        conn.send(('ok', len(calls)))
+        conn.close()
+
+    thread = threading.Thread(target=_serve, args=(listener, handle), daemon=True)
+    thread.start()
+    client = ipc.Client(address, SECRET)
+    try:
+        assert client.call('ping') == 1
+        time.sleep(0.1)
+        assert client.call('ping') == 2
+        assert calls == ['ping', 'ping']
+    finally:
+        client.close()
+        listener.close()
@@ -0,0 +1,114 @@
+import threading
+from bisect import bisect_left
+
+import pytest
+
+from app import backends
+from app import metrics
+from app import pi_io
+
+ITERATIONS = 300
+# No writer may wait longer than this for an output lock
+MAX_LOCK_WAIT_S = 0.1
+# Pins always written together, so every published snapshot has them equal
+PAIRS = ((3, 23), (27, 22))
+
+
+class RecordingBackend(backends.SimulationBackend):
+    """Simulation backend that remembers the last value written to each output."""
+
+    def __init__(self):
+        super().__init__()
+        self.written = {}
+
+    def write_output(self, pin, state):
+        self.written[pin] = state
+
+    def write_pwm(self, pin, duty_cycle):
+        self.written[f"pwm_{pin}"] = duty_cycle
+
+
+@pytest.fixture
+def simulated_io(monkeypatch):
+    monkeypatch.setattr(pi_io, 'backend', None)
+    pi_io.init_hardware(RecordingBackend())
+    yield pi_io.backend
+    pi_io.backend.close()
+
+
+def _slow_waits(lock):
+    """Waits for `lock` recorded above MAX_LOCK_WAIT_S so far."""
+    child = metrics.LOCK_WAIT_SECONDS.labels(lock)
+    return sum(child.counts[bisect_left(metrics.LOCK_WAIT_SECONDS.buckets, MAX_LOCK_WAIT_S) + 1:])
+
+
+def test_concurrent_output_writes_keep_snapshots_consistent(simulated_io):
+    index = {pin: i for i, pin in enumerate(pi_io.OUTPUT_PINS)}
+    stop = threading.Event()
+    errors = []
+    slow_before = {lock: _slow_waits(lock) for lock in ('gpio', 'pwm')}
+
+    def toggle_gpio():
+        for i in range(ITERATIONS):
+            assert pi_io.set_gpio(2, i % 2 == 0)['success']
+        pi_io.set_gpio(2, True)
+
+    def sweep_pwm():
+        for i in range(ITERATIONS):
+            assert pi_io.set_pwm(12, i % 101)['success']
+        pi_io.set_pwm(12, 77)
+
+    def apply_pairs():
+        for i in range(ITERATIONS):
+            state = i % 2 == 0
+            errors_by_key, _ = pi_io.apply_outputs({3: state, 23: state}, {12: i % 101})
+            assert not errors_by_key
+        pi_io.apply_outputs({3: True, 23: True}, {})
+
+    def batch_pairs():
+        for i in range(ITERATIONS):
+            state = i % 3 == 0
+            result = pi_io.set_outputs([{'gpio': 27, 'state': state}, {'gpio': 22, 'state': state}])
+            assert result['success']
+        pi_io.set_outputs([{'gpio': 27, 'state': False}, {'gpio': 22, 'state': False}])
+
+    def read():
+        while not stop.is_set():
+            outputs, duties = pi_io.output_tuples()
+            if len(outputs) != len(pi_io.OUTPUT_PINS) or len(duties) != len(pi_io.PWM_PINS):
+                errors.append(f"snapshot of the wrong size: {outputs} {duties}")
+            for a, b in PAIRS:
+                if outputs[index[a]] != outputs[index[b]]:
+                    errors.append(f"GPIO {a} and {b} published apart: {outputs}")
+            states = pi_io.read_gpio_states()
+            if not 0 <= states.pwm.gpio12 <= 100:
+                errors.append(f"duty cycle out of range: {states.pwm.gpio12}")
+
+    def run(fn):
+        try:
+            fn()
+        except Exception as e:
+            errors.append(f"{fn.__name__}: {e!r}")
+
+    readers = [threading.Thread(target=run, args=(read,)) for _ in range(2)]
+    writers = [threading.Thread(target=run, args=(fn,)) for fn in (toggle_gpio, sweep_pwm, apply_pairs, batch_pairs)]
+    for thread in readers + writers:
+        thread.start()
+    for thread in writers:
+        thread.join(60)
+    stop.set()
+    for thread in readers:
+        thread.join(10)
+
+    assert errors == []
+    outputs, duties = pi_io.output_tuples()
+    expected = {2: True, 3: True, 23: True, 27: False, 22: False}
+    for pin, state in expected.items():
+        assert outputs[index[pin]] is state
+        assert pi_io.gpio_states[pin] is state
+        assert simulated_io.written[pin] is state
+    # The last PWM write is one of the two writers' final values
+    assert duties[0] in (77, (ITERATIONS - 1) % 101)
+    assert pi_io.gpio_states['pwm_12'] == simulated_io.written['pwm_12'] == duties[0]
+    for lock, before in slow_before.items():
+        assert _slow_waits(lock) == before, f"{lock} lock waits exceeded {MAX_LOCK_WAIT_S} s"
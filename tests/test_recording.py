@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from app import acquisition
+from app import recording
+from app import writer
+
+
+class FakeEngine:
+    """Stands in for acquisition.engine; the test feeds the snapshots itself."""
+
+    def __init__(self, rate_hz):
+        self.rate_hz = rate_hz
+        self.subscribers = []
+
+    @property
+    def period(self):
+        return 1.0 / self.rate_hz
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def set_rate(self, rate_hz):
+        self.rate_hz = float(rate_hz)
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = FakeEngine(50.0)
+    monkeypatch.setattr(acquisition, 'engine', engine)
+    submitted = []
+    monkeypatch.setattr(writer, 'submit', lambda snapshot, experiment_id=None: submitted.append(snapshot) or True)
+    monkeypatch.setattr(writer, 'finalize_experiment', lambda experiment_id: True)
+    monkeypatch.setattr(writer, 'get_written', lambda experiment_id: len(submitted))
+    engine.submitted = submitted
+    return engine
+
+
+def _feed(recorder, engine, seconds, jitter=0.0):
+    """Deliver `seconds` worth of scans at the engine rate, starting now."""
+    started = time.monotonic()
+    for i in range(int(seconds * engine.rate_hz)):
+        offset = jitter if i % 2 else -jitter
+        snapshot = acquisition.Snapshot(i + 1, None, started + i * engine.period + offset, {}, {}, 0.0, 0.0)
+        recorder._on_snapshot(snapshot)
+
+
+@pytest.mark.parametrize('rate_hz', [30.0, 20.0, 7.0, 50.0])
+def test_records_at_the_requested_rate(engine, rate_hz):
+    recorder = recording.Recorder()
+    assert recorder.start(1, rate_hz, 60)['success']
+    _feed(recorder, engine, 10, jitter=0.002)
+    recorder.stop()
+    assert len(engine.submitted) == pytest.approx(rate_hz * 10, abs=1)
+
+
+def test_restores_only_its_own_rate_change(engine):
+    recorder = recording.Recorder()
+    recorder.start(1, 100.0, 60)
+    assert engine.rate_hz == 100.0
+    recorder.stop()
+    assert engine.rate_hz == 50.0
+
+    recorder.start(2, 100.0, 60)
+    engine.set_rate(200.0)  # Changed by someone else during the recording
+    recorder.stop()
+    assert engine.rate_hz == 200.0
+
+
+def test_missed_scans_count_as_dropped(engine):
+    recorder = recording.Recorder()
+    recorder.start(1, 10.0, 60)
+    started = time.monotonic()
+    for t in (0.0, 0.1, 0.5, 0.6):  # Nothing arrived for 0.2 .. 0.4
+        recorder._on_snapshot(acquisition.Snapshot(1, None, started + t, {}, {}, 0.0, 0.0))
+    status = recorder.status()
+    recorder.stop()
+    assert len(engine.submitted) == 4
+    assert status['dropped_missed_scans'] == 3
+
+
+def test_stops_at_the_deadline_without_scans(engine):
+    # Acquisition stalled: no snapshot ever arrives
+    recorder = recording.Recorder()
+    recorder.start(1, 100.0, 0.2)
+    assert engine.rate_hz == 100.0
+    time.sleep(0.4)
+    status = recorder.status()
+    assert not status['active']
+    assert status['stop_reason'] == 'completed'
+    assert engine.rate_hz == 50.0
+    assert engine.subscribers == []
+
+
+def test_records_until_stopped_without_a_duration(engine):
+    recorder = recording.Recorder()
+    result = recorder.start(1, 10.0)
+    assert result['success']
+    assert result['status']['duration_s'] is None
+    assert result['status']['remaining_s'] is None
+    _feed(recorder, engine, 1)
+    assert recorder.status()['active']
+    recorder.stop()
+    assert len(engine.submitted) == 10
+
+
+def test_deadline_of_a_finished_recording_leaves_the_next_one_alone(engine):
+    recorder = recording.Recorder()
+    recorder.start(1, 10.0, 60)
+    first = recorder._state
+    recorder.stop()
+    recorder.start(2, 10.0, 60)
+    assert not recorder.stop('completed', first)['success']
+    assert recorder.status()['active']
+    recorder.stop()
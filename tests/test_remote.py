@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from app import daemon
+from app import db
+from app import ipc
+from app import remote
+
+SECRET = 'test-secret'
+
+
+@pytest.fixture
+def client(scratch_db, tmp_path):
+    db.ensure_ready()
+    server = ipc.Server(os.path.join(tmp_path, 'daemon.sock'), SECRET, {'db_execute': daemon._db_execute})
+    server.start()
+    client = ipc.Client(server.address, SECRET)
+    yield client
+    client.close()
+    server.close()
+
+
+def test_queries_run_in_the_daemon(client):
+    cur = remote.RemoteCursor(client)
+    cur.execute("INSERT INTO experiments (id, user_id, fuel_type, test_duration) VALUES (?, 1, ?, 5)",
+                (41, 'diesel'))
+    rows = cur.execute("SELECT id, fuel_type FROM experiments WHERE id >= ? ORDER BY id", (41,)).fetchall()
+    assert rows == [(41, 'diesel')]
+
+    cur.execute("SELECT username FROM users ORDER BY id")
+    assert cur.fetchone() == ('admin',)
+    assert cur.fetchone() is None
+    assert cur.fetchall() == []
+
+
+def test_query_errors_are_raised(client):
+    with pytest.raises(RuntimeError, match='no_such_table'):
+        remote.RemoteCursor(client).execute("SELECT * FROM no_such_table")
@@ -0,0 +1,208 @@
+import time
+from datetime import datetime
+from types import MappingProxyType
+
+import pytest
+
+from app import acquisition
+from app import backends
+from app import channels
+from app import pi_io
+from app import sequencer
+
+MOTOR = channels.LAYOUT.by_tag['MOTOR_ATIVO']
+
+
+class FakeEngine:
+    """Stands in for acquisition.engine; the test hands snapshots to the scheduler itself."""
+    rate_hz = 10.0
+    period = 0.1
+
+    def __init__(self):
+        self.snapshot = None
+
+    def subscribe(self, callback):
+        pass
+
+    def unsubscribe(self, callback):
+        pass
+
+    def get_snapshot(self):
+        return self.snapshot
+
+
+class SlowBackend(backends.SimulationBackend):
+    """Every output write takes `delay` seconds, or fails if `fail` is set."""
+
+    def __init__(self, delay=0.0, fail=False):
+        super().__init__()
+        self.delay = delay
+        self.fail = fail
+
+    def write_output(self, pin, state):
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("relay board not answering")
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = FakeEngine()
+    monkeypatch.setattr(acquisition, 'engine', engine)
+    return engine
+
+
+@pytest.fixture
+def install_backend(monkeypatch):
+    monkeypatch.setattr(pi_io, 'backend', None)
+
+    def install(backend):
+        pi_io.init_hardware(backend)
+        return backend
+
+    yield install
+    pi_io.backend.close()
+
+
+@pytest.fixture
+def scheduler(engine):
+    scheduler = sequencer.Scheduler()
+    yield scheduler
+    scheduler.stop()
+
+
+def _snapshot(motor_value):
+    eu = {chip.name: (0.0,) * channels.CHANNELS_PER_CHIP for chip in channels.LAYOUT.chips}
+    eu[MOTOR.chip] = tuple(motor_value if i == MOTOR.channel else 0.0 for i in range(channels.CHANNELS_PER_CHIP))
+    values = {chip: (0,) * channels.CHANNELS_PER_CHIP for chip in eu}
+    return acquisition.Snapshot(1, datetime.now(), time.monotonic(), MappingProxyType(values),
+                                MappingProxyType(eu), 0.0, 0.0)
+
+
+def _wait_done(scheduler, sequence_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        sequence = scheduler.status(sequence_id)['sequence']
+        if sequence['state'] != 'running':
+            return sequence
+        assert time.monotonic() < deadline, f"sequence still running: {sequence}"
+        time.sleep(0.01)
+
+
+def _seconds(entry, key):
+    return datetime.fromisoformat(entry[key]).timestamp()
+
+
+def test_steps_are_planned_from_the_plan(scheduler, install_backend):
+    # Each set step takes 30 ms; the waits still start from the planned time
+    install_backend(SlowBackend(delay=0.03))
+    steps = []
+    for i in range(5):
+        steps += [{'action': 'set', 'outputs': [{'gpio': 17, 'state': i % 2 == 0}]},
+                  {'action': 'wait', 'seconds': 0.05}]
+    result = scheduler.start(steps + [{'action': 'mark', 'name': 'end'}], 'drift')
+    assert result['success']
+
+    sequence = _wait_done(scheduler, result['sequence']['id'])
+    assert sequence['state'] == 'completed'
+    log = sequence['log']
+    assert [entry['index'] for entry in log] == list(range(11))
+    first, last = log[0], log[-1]
+    assert _seconds(last, 'planned_at') - _seconds(first, 'planned_at') == pytest.approx(0.25, abs=1e-3)
+    # Lateness of the last step is its own, not the sum of five slow writes
+    assert last['late_ms'] < 25
+    for entry in log:
+        assert entry['success']
+        assert entry['late_ms'] >= 0
+
+
+def test_wait_until_is_met_by_a_snapshot(scheduler, engine):
+    result = scheduler.start([
+        {'action': 'wait_until', 'channel': 'MOTOR_ATIVO', 'op': '>=', 'value': 50, 'timeout_s': 5},
+        {'action': 'mark', 'name': 'running'},
+    ])
+    sequence_id = result['sequence']['id']
+    time.sleep(0.05)
+    scheduler._on_snapshot(_snapshot(10.0))
+    time.sleep(0.05)
+    assert scheduler.status(sequence_id)['sequence']['state'] == 'running'
+
+    scheduler._on_snapshot(_snapshot(80.0))
+    sequence = _wait_done(scheduler, sequence_id)
+    assert sequence['state'] == 'completed'
+    assert sequence['log'][0]['value'] == 80.0
+    assert [entry['action'] for entry in sequence['log']] == ['wait_until', 'mark']
+
+
+def test_wait_until_times_out(scheduler, engine):
+    engine.snapshot = _snapshot(10.0)
+    started = time.monotonic()
+    result = scheduler.start([
+        {'action': 'wait_until', 'channel': 'MOTOR_ATIVO', 'op': '>', 'value': 90, 'timeout_s': 0.1},
+        {'action': 'mark', 'name': 'never'},
+    ])
+    sequence = _wait_done(scheduler, result['sequence']['id'])
+    assert time.monotonic() - started >= 0.1
+    assert sequence['state'] == 'failed'
+    assert 'not met within 0.1 s' in sequence['error']
+    assert [entry['action'] for entry in sequence['log']] == ['wait_until']
+    assert not sequence['log'][0]['success']
+
+
+def test_cancel_stops_the_remaining_steps(scheduler):
+    result = scheduler.start([{'action': 'wait', 'seconds': 0.2}, {'action': 'mark', 'name': 'late'}])
+    sequence_id = result['sequence']['id']
+    cancelled = scheduler.cancel(sequence_id)
+    assert cancelled['success']
+    assert cancelled['sequence']['state'] == 'cancelled'
+
+    time.sleep(0.3)
+    sequence = scheduler.status(sequence_id)['sequence']
+    assert sequence['state'] == 'cancelled'
+    assert 'late' not in [entry.get('name') for entry in sequence['log']]
+    assert not scheduler.cancel(sequence_id)['success']
+
+
+@pytest.mark.parametrize('fail', [False, True])
+def test_cancel_during_a_set_step_is_final(scheduler, install_backend, fail):
+    install_backend(SlowBackend(delay=0.3, fail=fail))
+    result = scheduler.start([
+        {'action': 'set', 'outputs': [{'gpio': 17, 'state': True}]},
+        {'action': 'mark', 'name': 'after'},
+    ])
+    sequence_id = result['sequence']['id']
+    time.sleep(0.1)
+    # Waits for the write in progress; nothing runs after it
+    cancelled = scheduler.cancel(sequence_id)
+    assert cancelled['success']
+    assert cancelled['sequence']['state'] == 'cancelled'
+
+    time.sleep(0.1)
+    sequence = scheduler.status(sequence_id)['sequence']
+    assert sequence['state'] == 'cancelled'
+    assert sequence['error'] is None
+    assert [entry['action'] for entry in sequence['log']] == ['set']
+    assert sequence['log'][0]['success'] is not fail
+
+
+def test_failed_set_step_fails_the_sequence(scheduler, install_backend):
+    install_backend(SlowBackend(fail=True))
+    result = scheduler.start([
+        {'action': 'set', 'outputs': [{'gpio': 17, 'state': True}]},
+        {'action': 'mark', 'name': 'after'},
+    ])
+    sequence = _wait_done(scheduler, result['sequence']['id'])
+    assert sequence['state'] == 'failed'
+    assert 'Step 0' in sequence['error']
+    assert len(sequence['log']) == 1
+    entry = sequence['log'][0]
+    assert entry['action'] == 'set' and not entry['success']
+    assert entry['results'] == [{'success': False, 'error': 'relay board not answering'}]
+    assert pi_io.output_tuples()[0][pi_io.OUTPUT_PINS.index(17)] is False
+
+
+def test_invalid_sequences_are_rejected(scheduler):
+    assert not scheduler.start([])['success']
+    assert 'Unknown channel' in scheduler.start(
+        [{'action': 'wait_until', 'channel': 'NOPE', 'op': '>', 'value': 1}])['error']
+    assert not scheduler.start([{'action': 'jump'}])['success']
@@ -0,0 +1,44 @@
+import os
+from datetime import datetime
+from types import MappingProxyType
+
+import pytest
+
+from app import acquisition
+from app import channels
+from app import shared_state
+
+
+@pytest.fixture
+def shm():
+    name = f'test_shared_state_{os.getpid()}'
+    publisher = shared_state.Publisher(name)
+    reader = shared_state.Reader(name)
+    yield publisher, reader
+    reader.close()
+    publisher.close()
+
+
+def test_unwired_channels_round_trip_as_none(shm):
+    publisher, reader = shm
+    chips = [chip.name for chip in channels.LAYOUT.chips]
+    values = {chip: tuple(range(channels.CHANNELS_PER_CHIP)) for chip in chips}
+    eu = {chip: (1.5,) + (None,) * (channels.CHANNELS_PER_CHIP - 1) for chip in chips}
+    snapshot = acquisition.Snapshot(
+        7, datetime(2026, 1, 2, 3, 4, 5, 678000), 12.5,
+        MappingProxyType(values), MappingProxyType(eu), 0.001, 0.0002,
+    )
+
+    publisher.publish_snapshot(snapshot)
+    read = reader.snapshot()
+
+    assert read.seq == 7
+    assert read.timestamp == snapshot.timestamp
+    assert dict(read.values) == values
+    assert dict(read.eu) == eu
+
+
+def test_nothing_published(shm):
+    _, reader = shm
+    assert reader.snapshot() is None
+    assert reader.outputs() is None
@@ -0,0 +1,105 @@
+import os
+import time
+from datetime import datetime
+from types import MappingProxyType
+
+import pytest
+
+from app import acquisition
+from app import channels
+from app import db
+from app import spool
+from app import writer as writer_module
+
+
+def _snapshot(seq):
+    values = {chip.name: (seq % 1024,) * channels.CHANNELS_PER_CHIP for chip in channels.LAYOUT.chips}
+    return acquisition.Snapshot(seq, datetime.now(), time.monotonic(), MappingProxyType(values), None, 0.0, 0.0)
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _scan_count():
+    conn = db.cursor()
+    try:
+        return conn.execute(f"SELECT count(*) FROM {db.SCAN_TABLE}").fetchone()[0]
+    finally:
+        db.close_cursor(conn)
+
+
+@pytest.fixture
+def failing_commits(monkeypatch):
+    """Make the next `failures[0]` batch commits fail (spool.mark_ingested runs in the transaction)."""
+    failures = [0]
+    mark_ingested = spool.mark_ingested
+
+    def flaky(conn, seq):
+        if failures[0] > 0:
+            failures[0] -= 1
+            raise RuntimeError("simulated database error")
+        mark_ingested(conn, seq)
+
+    monkeypatch.setattr(spool, 'mark_ingested', flaky)
+    monkeypatch.setattr(writer_module, 'RETRY_BACKOFF_S', 0.01)
+    return failures
+
+
+@pytest.fixture
+def sensor_writer(scratch_db):
+    sensor_writer = writer_module.SensorWriter(
+        spool_dir=os.path.join(os.path.dirname(scratch_db), 'spool'), flush_scans=10, flush_interval=0.02,
+    )
+    sensor_writer.start()
+    yield sensor_writer
+    sensor_writer.stop()
+
+
+def test_failed_batch_is_retried_without_losing_scans(sensor_writer, failing_commits):
+    failing_commits[0] = 3
+    for seq in range(1, 26):
+        assert sensor_writer.submit(_snapshot(seq))
+
+    _wait_for(lambda: sensor_writer.get_metrics()['rows_written'] == 25)
+    stats = sensor_writer.get_metrics()
+    assert stats['batches_failed'] == 3
+    assert stats['rows_failed'] == 0
+    assert _scan_count() == 25
+
+
+def test_scans_are_lost_only_after_retries_run_out(sensor_writer, failing_commits, monkeypatch):
+    monkeypatch.setattr(writer_module, 'FLUSH_RETRIES', 2)
+    failing_commits[0] = 3  # The first attempt and both retries
+    for seq in range(1, 6):
+        assert sensor_writer.submit(_snapshot(seq))
+    _wait_for(lambda: sensor_writer.get_metrics()['rows_failed'] == 5)
+
+    for seq in range(6, 11):
+        assert sensor_writer.submit(_snapshot(seq))
+    _wait_for(lambda: sensor_writer.get_metrics()['rows_written'] == 5)
+    assert _scan_count() == 5
+
+
+def test_unwritten_scans_stay_in_the_spool_for_the_next_start(scratch_db, failing_commits):
+    spool_dir = os.path.join(os.path.dirname(scratch_db), 'spool')
+    sensor_writer = writer_module.SensorWriter(spool_dir=spool_dir, flush_scans=10, flush_interval=0.02)
+    sensor_writer.start()
+    failing_commits[0] = 10 ** 6
+    for seq in range(1, 8):
+        assert sensor_writer.submit(_snapshot(seq))
+    _wait_for(lambda: sensor_writer.get_metrics()['batches_failed'] >= 1)
+    sensor_writer.stop()
+    assert _scan_count() == 0
+
+    failing_commits[0] = 0
+    restarted = writer_module.SensorWriter(spool_dir=spool_dir, flush_scans=10, flush_interval=0.02)
+    restarted.start()
+    try:
+        _wait_for(lambda: restarted.get_metrics()['rows_written'] == 7)
+    finally:
+        restarted.stop()
+    assert _scan_count() == 7